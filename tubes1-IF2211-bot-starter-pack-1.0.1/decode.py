@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 
 def _unpack(data):
@@ -7,6 +8,7 @@ def _unpack(data):
     return data
 
 
+@lru_cache(maxsize=1024)
 def _snake_case(value):
     """
     Convert camel case string to snake case
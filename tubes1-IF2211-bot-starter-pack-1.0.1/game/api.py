@@ -1,37 +1,103 @@
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from time import perf_counter, sleep
 from typing import List, Optional, Tuple, Union
 
 import requests
-from colorama import Back, Fore, Style, init
-from dacite import from_dict
+from dacite import from_dict as _from_dict
 from decode import decode
+from game.log import PER_TICK, current_bot, get_logger
+from game.metrics import metrics
 from game.models import Board, Bot
+from game.ratelimit import PRIORITY_BOARD, PRIORITY_MOVE, PRIORITY_OTHER, RequestScheduler
+from game.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
 from requests import Response
 
+log = get_logger("api")
+
+
+def from_dict(data_class, data):
+    with metrics.timer("from_dict"):
+        return _from_dict(data_class, data)
+
 
 @dataclass
 class Api:
     url: str
+    timeout: float = 5.0
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    # Connections kept open per host, shared by every thread using this Api
+    pool_size: int = 10
+    session: requests.Session = field(default_factory=requests.Session, repr=False)
+    # Requests-per-second budget shared by the bots using this Api, if any
+    limiter: Optional[RequestScheduler] = None
+
+    def __post_init__(self) -> None:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def _get_url(self, endpoint: str) -> str:
         return "{}{}".format(self.url, endpoint)
 
-    def _req(self, endpoint: str, method: str, body: dict) -> Response:
-        print(
-            ">>> {} {} {}".format(
-                Style.BRIGHT + method.upper() + Style.RESET_ALL,
-                Fore.GREEN + endpoint + Style.RESET_ALL,
-                body,
-            )
-        )
-        func = getattr(requests, method)
+    def _send(self, endpoint: str, method: str, body: dict) -> Response:
         headers = {"Content-Type": "application/json"}
-        res = func(self._get_url(endpoint), headers=headers, data=json.dumps(body))
+        start = perf_counter()
+        try:
+            return self.session.request(
+                method,
+                self._get_url(endpoint),
+                headers=headers,
+                data=json.dumps(body),
+                timeout=self.timeout,
+            )
+        finally:
+            metrics.observe("http", perf_counter() - start)
+
+    def _req(
+        self, endpoint: str, method: str, body: dict, priority: int = PRIORITY_OTHER
+    ) -> Response:
+        log.debug(">>> %s %s %s", method.upper(), endpoint, body, extra=PER_TICK)
+        if not self.breaker.allow():
+            raise CircuitOpenError("{} {}".format(method.upper(), endpoint))
+
+        # A GET can always be repeated. A POST (e.g. a move) is only repeated when
+        # the connection failed, so the server cannot have acted on it yet.
+        idempotent = method == "get"
+        retryable = requests.RequestException if idempotent else requests.ConnectionError
+        delays = self.retry.delays()
+        while True:
+            if self.limiter:
+                # Retries are requests too and queue again
+                self.limiter.acquire(priority, current_bot())
+            try:
+                res = self._send(endpoint, method, body)
+            except retryable as e:
+                delay = next(delays, None)
+                if delay is None:
+                    self.breaker.record_failure()
+                    raise
+                log.warning("%s %s: %s, retrying", method.upper(), endpoint, type(e).__name__)
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+            else:
+                if res.status_code < 500:
+                    self.breaker.record_success()
+                    break
+                delay = next(delays, None) if idempotent else None
+                if delay is None:
+                    self.breaker.record_failure()
+                    break
+                log.warning("%s %s: %s, retrying", method.upper(), endpoint, res.status_code)
+            metrics.observe("retry", delay)
+            sleep(delay)
+
         if res.status_code == 200:
-            print("<<< {} OK".format(res.status_code))
+            log.debug("<<< %s OK", res.status_code, extra=PER_TICK)
         else:
-            print("<<< {} {}".format(res.status_code, res.text))
+            log.info("<<< %s %s %s: %s", method.upper(), endpoint, res.status_code, res.text)
         return res
 
     def bots_get(self, bot_token: str) -> Optional[Bot]:
@@ -55,7 +121,7 @@ class Api:
         return None
 
     def boards_list(self) -> Optional[List[Board]]:
-        response = self._req("/boards", "get", {})
+        response = self._req("/boards", "get", {}, PRIORITY_BOARD)
         resp, status = self._return_response_and_status(response)
         if status == 200:
             return [from_dict(Board, board) for board in resp]
@@ -72,7 +138,7 @@ class Api:
         return False
 
     def boards_get(self, board_id: str) -> Optional[Board]:
-        response = self._req("/boards/{}".format(board_id), "get", {})
+        response = self._req("/boards/{}".format(board_id), "get", {}, PRIORITY_BOARD)
         resp, status = self._return_response_and_status(response)
         if status == 200:
             return from_dict(Board, resp)
@@ -83,6 +149,7 @@ class Api:
             "/bots/{}/move".format(bot_token),
             "post",
             {"direction": direction},
+            PRIORITY_MOVE,
         )
         resp, status = self._return_response_and_status(response)
         if status == 200:
@@ -104,10 +171,13 @@ class Api:
     def _return_response_and_status(
         self, response: Response
     ) -> Tuple[Union[dict, List], int]:
-        resp = response.json()
+        with metrics.timer("json"):
+            resp = response.json()
 
         response_data = resp.get("data") if isinstance(resp, dict) else resp
         if not response_data:
             response_data = resp
 
-        return decode(response_data), response.status_code
+        with metrics.timer("decode"):
+            response_data = decode(response_data)
+        return response_data, response.status_code
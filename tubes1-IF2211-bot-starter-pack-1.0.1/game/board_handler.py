@@ -1,14 +1,28 @@
 from dataclasses import dataclass
-from typing import Union, List
+from typing import Union, List, Optional
 from game.api import Api
 from game.models import Board
+from game.snapshot import BoardSnapshots
 
 @dataclass
 class BoardHandler:
     api: Api
+    snapshots: Optional[BoardSnapshots] = None
 
     def list_boards(self) -> List[Board]:
         return self.api.boards_list()
 
     def get_board(self, board_id: int) -> Board:
-        return self.api.boards_get(board_id)
+        if self.snapshots and self.snapshots.board_id == board_id:
+            board = self.snapshots.get()
+            if board:
+                return board
+        board = self.api.boards_get(board_id)
+        if board:
+            self.share_board(board)
+        return board
+
+    def share_board(self, board: Board) -> None:
+        """Share a board this bot received, e.g. with its move, with the other bots on this host"""
+        if self.snapshots and self.snapshots.board_id == board.id:
+            self.snapshots.publish(board)
@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+from game.models import Board, Position
+
+# DiamondProvider defaults of the game engine, for boards that omit them
+DEFAULT_GENERATION_RATIO = 0.1
+DEFAULT_MIN_RATIO_FOR_GENERATION = 0.01
+DEFAULT_RED_RATIO = 0.2
+
+
+@dataclass(frozen=True)
+class GenerationConfig:
+    width: int
+    height: int
+    generation_ratio: float = DEFAULT_GENERATION_RATIO
+    min_ratio_for_generation: float = DEFAULT_MIN_RATIO_FOR_GENERATION
+    red_ratio: float = DEFAULT_RED_RATIO
+
+    @classmethod
+    def from_board(cls, board: Board) -> "GenerationConfig":
+        for feature in board.features or []:
+            if feature.name == "DiamondProvider" and feature.config:
+                config = feature.config
+                return cls(
+                    board.width,
+                    board.height,
+                    _or(config.generation_ratio, DEFAULT_GENERATION_RATIO),
+                    _or(config.min_ratio_for_generation, DEFAULT_MIN_RATIO_FOR_GENERATION),
+                    _or(config.red_ratio, DEFAULT_RED_RATIO),
+                )
+        return cls(board.width, board.height)
+
+    @property
+    def generated_count(self) -> int:
+        return int(self.width * self.height * self.generation_ratio)
+
+    @property
+    def regeneration_threshold(self) -> float:
+        return max(1, self.width * self.height * self.min_ratio_for_generation)
+
+    @property
+    def mean_points(self) -> float:
+        # Red diamonds are worth 2, the others 1
+        return 1 + self.red_ratio
+
+
+@dataclass(frozen=True)
+class ButtonEstimate:
+    # Expected points gained by pressing: those of the nearest regenerated
+    # diamond, minus what the current diamonds yield over the same walk
+    points: float
+    # Expected steps from the button to the nearest regenerated diamond
+    distance: float
+
+
+def _or(value, default):
+    return default if value is None else value
+
+
+def _ring_sizes(width: int, height: int, x: int, y: int) -> List[int]:
+    """Number of cells at each Manhattan distance from (x, y) on the board"""
+    sizes = [0] * (width + height - 1)
+    for cell_x in range(width):
+        dx = abs(cell_x - x)
+        for cell_y in range(height):
+            sizes[dx + abs(cell_y - y)] += 1
+    return sizes
+
+
+@lru_cache(maxsize=4096)
+def expected_nearest_distance(width: int, height: int, count: int, x: int, y: int) -> float:
+    """
+    Expected distance from (x, y) to the nearest of count diamonds placed on
+    distinct random cells other than (x, y) itself. Exact: the nearest is
+    further than r when all of them miss the m cells within r, which happens
+    with probability C(free - m, count) / C(free, count).
+    """
+    free = width * height - 1
+    count = min(count, free)
+    if count <= 0:
+        return float(width + height)
+
+    # P(D > 0) is 1 since the bot's own cell stays free
+    expected = 1.0
+    within = 0
+    for size in _ring_sizes(width, height, x, y)[1:]:
+        within += size
+        miss = 1.0
+        for i in range(count):
+            miss *= (free - within - i) / (free - i)
+            if miss <= 0:
+                break
+        if miss <= 0:
+            break
+        expected += miss
+    return expected
+
+
+def button_gain(
+    config: GenerationConfig, count: int, current_points: float, x: int, y: int
+) -> Optional[ButtonEstimate]:
+    """
+    Value of pressing the button at (x, y) while count diamonds worth
+    current_points on average are on the board. None when pressing gains
+    nothing: the game regenerates the diamonds by itself once they run low,
+    and a layout as rich as a regenerated one is not worth replacing.
+    """
+    if count <= config.regeneration_threshold:
+        return None
+    distance = expected_nearest_distance(config.width, config.height, config.generated_count, x, y)
+    current_distance = expected_nearest_distance(config.width, config.height, count, x, y)
+    points = config.mean_points - current_points * distance / current_distance
+    if points <= 0:
+        return None
+    return ButtonEstimate(points=points, distance=distance)
+
+
+def estimate_button(board: Board, button: Position) -> Optional[ButtonEstimate]:
+    """
+    Value of pressing the button at the given position, in the terms the
+    logics score diamonds with, or None when pressing gains nothing
+    """
+    diamonds = board.diamonds
+    if not diamonds:
+        return None
+    current_points = sum(gem.properties.points for gem in diamonds) / len(diamonds)
+    return button_gain(
+        GenerationConfig.from_board(board), len(diamonds), current_points, button.x, button.y
+    )
@@ -0,0 +1,116 @@
+from collections import deque
+from time import monotonic, sleep
+from typing import Deque, Optional, Tuple
+
+from game.metrics import metrics
+from game.models import GameObject
+
+# Smallest safety margin on the server's rate limit, in seconds
+MIN_MARGIN = 0.005
+
+
+class ServerClock:
+    """
+    The server's game clock and the network delay, estimated NTP style from
+    request timing.
+
+    A response's milliseconds_left was read by the server somewhere between
+    sending the request and receiving the response. Taking the midpoint is
+    off by at most half the round trip, so of the last `window` samples the
+    one with the shortest round trip is trusted: queueing delays only ever
+    add to a round trip. All times are local monotonic seconds.
+    """
+
+    def __init__(self, window: int = 16) -> None:
+        # (round trip, local time the game ends) per exchange
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=window)
+
+    def observe(self, sent: float, received: float, milliseconds_left: Optional[int]) -> None:
+        if milliseconds_left is None or received < sent:
+            return
+        round_trip = received - sent
+        self.samples.append((round_trip, (sent + received) / 2 + milliseconds_left / 1000))
+
+    @property
+    def round_trip(self) -> float:
+        """Shortest round trip seen lately, 0 before any"""
+        return min(self.samples)[0] if self.samples else 0.0
+
+    @property
+    def latency(self) -> float:
+        """One-way network delay, half the shortest round trip"""
+        return self.round_trip / 2
+
+    def game_end(self) -> Optional[float]:
+        """Local time at which the server ends the game"""
+        return min(self.samples)[1] if self.samples else None
+
+    def milliseconds_left(self, now: Optional[float] = None) -> Optional[int]:
+        end = self.game_end()
+        if end is None:
+            return None
+        return max(0, int((end - (monotonic() if now is None else now)) * 1000))
+
+
+class MoveTimer:
+    """
+    Sends each move so it reaches the server just after the server's rate
+    limit, minimum_delay_between_moves since our previous move, lets it
+    through.
+
+    A move that came back reached the server at the latest one latency
+    before its response arrived; the next one reaches the server at the
+    earliest one latency after it leaves. So it leaves the minimum delay
+    minus the shortest round trip after the previous response, plus a
+    margin. The margin doubles on every rejected move and shrinks back
+    towards MIN_MARGIN while moves get through.
+    """
+
+    def __init__(self, minimum_delay: float, factor: int = 1, clock: Optional[ServerClock] = None) -> None:
+        self.minimum_delay = minimum_delay * max(1, factor)
+        self.clock = clock or ServerClock()
+        self.margin = MIN_MARGIN
+        self.send_at = 0.0
+        # Seconds between two moves, averaged; what one move costs in game time
+        self.period: Optional[float] = None
+        self._last_sent: Optional[float] = None
+
+    def refresh(self, board_bot: GameObject) -> None:
+        """Bring the bot's milliseconds_left up to now, the board may be a sleep old"""
+        milliseconds_left = self.clock.milliseconds_left()
+        if milliseconds_left is not None and board_bot.properties:
+            board_bot.properties.milliseconds_left = milliseconds_left
+
+    def tick_milliseconds(self, default: int) -> int:
+        return max(1, round(self.period * 1000)) if self.period else default
+
+    def wait(self) -> None:
+        """Hold the move until it may leave"""
+        delay = self.send_at - monotonic()
+        if delay > 0:
+            with metrics.timer("sleep"):
+                sleep(delay)
+
+    def record(
+        self, sent: float, received: float, board_bot: Optional[GameObject], accepted: bool
+    ) -> None:
+        """
+        Take in the timing of a move request
+        :param board_bot: our bot on the board the response carried, if any
+        :param accepted: whether the server made the move
+        """
+        if board_bot and board_bot.properties:
+            self.clock.observe(sent, received, board_bot.properties.milliseconds_left)
+        if self._last_sent is not None:
+            interval = sent - self._last_sent
+            self.period = interval if self.period is None else 0.8 * self.period + 0.2 * interval
+        self._last_sent = sent
+        if accepted:
+            self.margin = max(MIN_MARGIN, self.margin * 0.9)
+        else:
+            self.margin = min(self.minimum_delay, self.margin * 2)
+        self.send_at = received + self.minimum_delay - self.clock.round_trip + self.margin
+
+    def delay(self, lead: float = 0.0) -> float:
+        """Seconds until the next move should start being decided, lead seconds before it leaves"""
+        return max(0.0, self.send_at - lead - monotonic())
@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from game.models import Board, GameObject, Position
+from game.team import teleporter_pairs, travel_distance
+from game.util import fallback_move, legal_moves
+
+Cell = Tuple[int, int]
+
+# Game time per move, matching the one second between moves in game/runner.py
+TICK_MILLISECONDS = 1000
+# Moves left at which the logics switch to the solver
+ENDGAME_STEPS = 20
+
+
+def steps_left(milliseconds_left: Optional[int], tick_milliseconds: int = TICK_MILLISECONDS) -> int:
+    """Moves the bot still gets before the game ends"""
+    return max(0, (milliseconds_left or 0) // tick_milliseconds)
+
+
+class _Timeout(Exception):
+    pass
+
+
+@dataclass
+class EndgamePlan:
+    # Points banked by the deadline when following the route
+    value: int
+    # Diamonds and base visits in order
+    route: List[Cell]
+    # Cell to head for this tick: the first stop, or the teleporter on the way to it
+    waypoint: Optional[Cell]
+
+
+def waypoint(start: Cell, goal: Cell, pairs: Sequence[Tuple[Cell, Cell]]) -> Cell:
+    """Teleporter entrance to walk to when it is the shorter way to goal, else goal"""
+    best, best_distance = goal, abs(start[0] - goal[0]) + abs(start[1] - goal[1])
+    for first, second in pairs:
+        for entrance, exit_ in ((first, second), (second, first)):
+            distance = (
+                abs(start[0] - entrance[0]) + abs(start[1] - entrance[1])
+                + abs(exit_[0] - goal[0]) + abs(exit_[1] - goal[1])
+            )
+            if distance < best_distance:
+                best, best_distance = entrance, distance
+    return best
+
+
+def step_towards(board: Board, position: Position, goal: Cell, avoid: Sequence[Cell] = ()) -> Tuple[int, int]:
+    """
+    Legal move that gets closer to goal, preferring one that does not enter
+    a cell in avoid (a teleporter that is not the goal, say)
+    """
+    distance = abs(position.x - goal[0]) + abs(position.y - goal[1])
+    closer = []
+    for move in legal_moves(board, position):
+        cell = (position.x + move[0], position.y + move[1])
+        if abs(cell[0] - goal[0]) + abs(cell[1] - goal[1]) < distance:
+            if cell == goal or cell not in avoid:
+                return move
+            closer.append(move)
+    if closer:
+        return closer[0]
+    return fallback_move(board, position)
+
+
+class EndgameSolver:
+    """
+    Exact plan for the last moves of a game: the order of diamonds and base
+    visits that banks the most points before time runs out.
+
+    The board has no walls, so the shortest walk between two cells is known
+    in closed form (see travel_distance) and the search only needs the
+    diamonds as stops. Memoized over (stop, diamonds taken, carried, steps
+    left), which is the DP over position, inventory and remaining steps
+    restricted to the cells that matter. Only diamonds that can still be
+    banked in time take part, the closest max_diamonds of them. A search
+    that runs past its time budget gives up and returns None, so the caller
+    falls back to its usual heuristics within the tick.
+    """
+
+    def __init__(self, max_diamonds: int = 8, budget: float = 0.05) -> None:
+        self.max_diamonds = max_diamonds
+        self.budget = budget
+
+    def solve(self, board: Board, bot: GameObject, steps: int) -> Optional[EndgamePlan]:
+        props = bot.properties
+        if props.base is None:
+            return None
+        deadline = perf_counter() + self.budget
+        pairs = teleporter_pairs(board)
+        start = (bot.position.x, bot.position.y)
+        base = (props.base.x, props.base.y)
+        inventory_size = props.inventory_size or 5
+        carried = props.diamonds or 0
+
+        candidates = []
+        for gem in board.diamonds:
+            cell = (gem.position.x, gem.position.y)
+            round_trip = travel_distance(start, cell, pairs) + travel_distance(cell, base, pairs)
+            if round_trip <= steps and gem.properties.points <= inventory_size:
+                candidates.append((round_trip, cell, gem.properties.points))
+        candidates.sort()
+        candidates = candidates[: self.max_diamonds]
+
+        # Stop 0 is the base, then the diamonds, then the start
+        cells = [base] + [cell for _, cell, _ in candidates] + [start]
+        points = [0] + [value for _, _, value in candidates]
+        count = len(candidates)
+        distance = [[travel_distance(a, b, pairs) for b in cells] for a in cells]
+        memo: Dict[Tuple[int, int, int, int], Tuple[int, int]] = {}
+
+        def best(stop: int, taken: int, carrying: int, left: int) -> Tuple[int, int]:
+            """Most points still bankable, and the next stop (-1 to stay put)"""
+            key = (stop, taken, carrying, left)
+            if key in memo:
+                return memo[key]
+            if perf_counter() > deadline:
+                raise _Timeout()
+            result = (0, -1)
+            row = distance[stop]
+            if carrying and row[0] <= left:
+                value = carrying + best(0, taken, 0, left - row[0])[0]
+                result = max(result, (value, 0))
+            for index in range(1, count + 1):
+                if taken & (1 << index) or row[index] > left:
+                    continue
+                if carrying + points[index] > inventory_size:
+                    continue
+                value = best(index, taken | (1 << index), carrying + points[index], left - row[index])[0]
+                if value > result[0]:
+                    result = (value, index)
+            memo[key] = result
+            return result
+
+        try:
+            value, _ = best(count + 1, 0, carried, steps)
+            route = []
+            stop, taken, carrying, left = count + 1, 0, carried, steps
+            while True:
+                _, following = best(stop, taken, carrying, left)
+                if following < 0:
+                    break
+                route.append(cells[following])
+                left -= distance[stop][following]
+                if following == 0:
+                    carrying = 0
+                else:
+                    taken |= 1 << following
+                    carrying += points[following]
+                stop = following
+        except _Timeout:
+            return None
+        return EndgamePlan(
+            value=value,
+            route=route,
+            waypoint=waypoint(start, route[0], pairs) if route else None,
+        )
@@ -0,0 +1,145 @@
+import atexit
+import contextvars
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+LOGGER_NAME = "diamonds"
+
+# Pass as extra= on messages logged every tick, so they can be sampled
+PER_TICK = {"sampled": True}
+
+# Body fields never written to the log
+SECRET_KEYS = frozenset({"password", "token", "botToken"})
+REDACTED = "***"
+
+DEFAULT_FORMAT = "%(asctime)s %(levelname)-7s [%(bot)s] %(name)s: %(message)s"
+
+_bot = contextvars.ContextVar("bot", default="-")
+# Values such as the bot token, which also show up inside request paths
+_secrets = set()
+
+# Library code stays silent until the application sets logging up
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger("{}.{}".format(LOGGER_NAME, name))
+
+
+def add_secret(value: Optional[str]) -> None:
+    """Mask value wherever it appears in a logged argument"""
+    if value:
+        _secrets.add(str(value))
+
+
+def set_bot(name: Optional[str]) -> None:
+    """Tag the messages logged from this thread or task with a bot name"""
+    _bot.set(name or "-")
+
+
+def current_bot() -> str:
+    """Bot name set for this thread or task, "-" when none"""
+    return _bot.get()
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the bot of the logging thread, before they are queued"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.bot = _bot.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through one in every `every` per-tick records of each message"""
+
+    def __init__(self, every: int = 1) -> None:
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: Dict[Tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every == 1 or not getattr(record, "sampled", False):
+            return True
+        key = (record.name, str(record.msg))
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        return seen % self.every == 0
+
+
+def redact(value):
+    """Copy of value with secret dict fields and registered secrets masked"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in SECRET_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        for secret in _secrets:
+            value = value.replace(secret, REDACTED)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    """Masks secrets in record arguments; runs on the listener thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener. The stock one
+    formats the message in the logging thread, which is the work we want
+    off the hot path; the arguments are queued as they are instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    sample_every: int = 1,
+    stream=None,
+    fmt: str = DEFAULT_FORMAT,
+) -> QueueListener:
+    """
+    Send the game's log records through a queue to a listener thread that
+    redacts, formats and writes them
+    :param level: lowest level logged, DEBUG includes every request
+    :param sample_every: keep one in this many of each per-tick message
+    :param stream: where to write, stderr by default
+    :return: the started listener, stopped at exit
+    """
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(fmt))
+    output.addFilter(RedactingFilter())
+    listener = QueueListener(records, output, respect_handler_level=True)
+
+    handler = _DeferredQueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(sample_every))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    listener.start()
+    atexit.register(_stop, listener)
+    return listener
+
+
+def _stop(listener: QueueListener) -> None:
+    # Flush what is still queued, unless the caller stopped it already
+    if listener._thread is not None:
+        listener.stop()
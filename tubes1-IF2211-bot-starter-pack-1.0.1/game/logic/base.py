@@ -1,9 +1,31 @@
 from abc import ABC
-from typing import Tuple
+from typing import FrozenSet, Optional, Tuple
 
-from game.models import Board, GameObject
+from game.endgame import TICK_MILLISECONDS
+from game.models import Board, GameObject, Position
+from game.spawns import SpawnModel
 
 
 class BaseLogic(ABC):
+    # Whether the logic honours the team targets below; only such bots join a team
+    team_aware: bool = False
+    # Set before next_move when the bot plays in a team (see game/team.py):
+    # the diamond assigned to this bot and the (x, y) cells teammates claimed
+    assigned_target: Optional[Position] = None
+    reserved_targets: FrozenSet[Tuple[int, int]] = frozenset()
+    # Names of the other team members, which are no opponents
+    teammates: FrozenSet[str] = frozenset()
+    # Game time one move of this bot takes; lower when the runner paces
+    # moves by the server's rate limit (see game/clock.py)
+    tick_milliseconds: int = TICK_MILLISECONDS
+    # Diamond spawns the logic learns from (see game/spawns.py). Logics start
+    # with one of their own in memory; main.py and the simulator replace it
+    # with the model their bots share
+    spawns: SpawnModel
+
     def next_move(self, board_bot: GameObject, board: Board) -> Tuple[int, int]:
         raise NotImplementedError()
+
+    def current_target(self) -> Optional[Position]:
+        """Cell the logic is heading for, for logics that keep one between ticks"""
+        return None
@@ -0,0 +1,98 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict
+
+from game.log import get_logger
+
+PARAMS_FILE = os.environ.get("DIAMONDS_PARAMS_FILE", "params.json")
+
+log = get_logger("params")
+
+
+@dataclass
+class TwParams:
+    # calculate_urgency_threshold
+    base_threshold: float = 8000
+    diamond_multiplier: float = 0.3
+    # should_return_early
+    safety_factor: float = 1.2
+    safety_factor_per_diamond: float = 0.1
+    # calculate_time_weighted_score
+    early_game_ratio: float = 0.7
+    end_game_ratio: float = 0.3
+    # find_closest_diamond_direct_time_weighted, for the team-assigned diamond
+    assigned_target_bonus: float = 2.0
+    # is_diamond_collectible: skip diamonds an opponent reaches this many ticks sooner
+    contested_margin: int = 1
+    # plan_move: tackle when it yields this many times our own collection rate
+    tackle_margin: float = 3.0
+    tackle_horizon: int = 6
+    # plan_move: solve the rest of the game exactly once this few moves are left
+    endgame_steps: int = 20
+
+
+@dataclass
+class RaParams:
+    # harus_kembali_ke_base
+    ambang_batas: Dict[int, float] = field(
+        default_factory=lambda: {1: 0.8, 2: 0.7, 3: 0.6, 4: 0.5}
+    )
+    ambang_batas_default: float = 0.4
+    # Kembali darurat jika risiko melewati batas ini
+    risiko_darurat: float = 0.7
+    # Portal dipakai jika jaraknya kurang dari faktor ini dikali jarak langsung
+    faktor_portal: float = 0.8
+
+
+LOGIC_PARAMS = {
+    "tw": TwParams,
+    "ra": RaParams,
+}
+
+
+def params_from_dict(logic: str, data: dict):
+    params_class = LOGIC_PARAMS[logic]
+    known = {f.name for f in fields(params_class)}
+    values = {key: value for key, value in data.items() if key in known}
+    if "ambang_batas" in values:
+        values["ambang_batas"] = {
+            int(key): value for key, value in values["ambang_batas"].items()
+        }
+    return params_class(**values)
+
+
+def load_params(logic: str, path: str = PARAMS_FILE):
+    """
+    Load the parameters of a logic from the tuned parameter file, falling back
+    to the defaults when the file or the logic's entry does not exist or
+    cannot be read
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    except ValueError as e:
+        log.warning("Ignoring unreadable parameter file %s: %s", path, e)
+        data = {}
+    try:
+        return params_from_dict(logic, data.get(logic, {}))
+    except (AttributeError, TypeError, ValueError) as e:
+        log.warning("Ignoring the %s parameters in %s: %s", logic, path, e)
+        return LOGIC_PARAMS[logic]()
+
+
+def save_params(logic: str, params, path: str = PARAMS_FILE) -> None:
+    """Store the parameters of one logic, keeping the entries of the others"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    data[logic] = asdict(params)
+    # Write atomically, so an interrupted run never leaves half a file
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
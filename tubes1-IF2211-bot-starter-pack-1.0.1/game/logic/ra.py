@@ -1,7 +1,11 @@
 from typing import Optional
 from game.logic.base import BaseLogic
+from game.button import estimate_button
+from game.logic.params import RaParams, load_params
 from game.models import Board, GameObject, Position
-from game.util import get_direction
+from game.spatial import MAX_POINTS, DiamondIndex
+from game.spawns import SpawnModel
+from game.util import MAX_REPLANS, fallback_move, get_direction, is_legal_move, legal_moves
 import math
 
 
@@ -11,16 +15,41 @@ class GreedyDiamondLogic(BaseLogic):
     target_perantara_bersama : Position = None
     kembali_via_portal_bersama : bool = False
 
-    def __init__(self) -> None:
+    def __init__(self, params: Optional[RaParams] = None) -> None:
+        self.params = params or load_params("ra")
         self.vektor_gerakan = [(1, 0), (0, 1), (-1, 0), (0, -1)]
         self.lokasi_target: Optional[Position] = None
         self.arah_sekarang = 0
+        self.indeks_diamond = DiamondIndex()
+        self.spawns = SpawnModel()
 
     def next_move(self, player_bot: GameObject, game_board: Board):
+        # Rencanakan ulang dengan target kosong jika gerakan tidak legal, lalu
+        # ambil gerakan legal pertama supaya setiap tick selesai dalam waktu terbatas
+        self.grid_kemunculan = self.spawns.observe(game_board)
+        for _ in range(MAX_REPLANS):
+            gerak_x, gerak_y = self.rencanakan_gerakan(player_bot, game_board)
+            if is_legal_move(game_board, player_bot.position, gerak_x, gerak_y):
+                return gerak_x, gerak_y
+            self.reset_target()
+        return fallback_move(game_board, player_bot.position)
+
+    def reset_target(self):
+        self.target_bersama = []
+        self.kembali_via_portal_bersama = False
+        self.target_portal_bersama = None
+        self.target_perantara_bersama = None
+        self.lokasi_target = None
+
+    def current_target(self) -> Optional[Position]:
+        return self.lokasi_target
+
+    def rencanakan_gerakan(self, player_bot: GameObject, game_board: Board):
         stats_bot = player_bot.properties
         self.papan_game = game_board
         self.bot_pemain = player_bot
         self.diamond_tersedia = game_board.diamonds
+        self.indeks_diamond.update(game_board)
         self.semua_bot = game_board.bots
         self.objek_portal = [obj for obj in self.papan_game.game_objects if obj.type == "TeleportGameObject"]
         self.tombol_khusus = [obj for obj in self.papan_game.game_objects if obj.type == "DiamondButtonGameObject"]
@@ -55,10 +84,17 @@ class GreedyDiamondLogic(BaseLogic):
         else:
             if (len(self.target_bersama) == 0):
                 self.cari_diamond_terbaik()
-            self.lokasi_target = self.target_bersama[0]
+            if self.target_bersama:
+                self.lokasi_target = self.target_bersama[0]
+            elif stats_bot.diamonds > 0:
+                # Tidak ada yang bisa diambil, setor yang sudah dibawa
+                self.lokasi_target = self.dapatkan_rute_base()
+            else:
+                # Tanpa target, bergerak acak dengan aman
+                self.lokasi_target = None
 
         # Kembali darurat jika terlalu berisiko
-        if (tingkat_risiko > 0.7 and stats_bot.diamonds > 0):
+        if (tingkat_risiko > self.params.risiko_darurat and stats_bot.diamonds > 0):
             self.lokasi_target = self.dapatkan_rute_base()
             if not self.kembali_via_portal_bersama:
                 self.target_bersama = []
@@ -84,16 +120,6 @@ class GreedyDiamondLogic(BaseLogic):
             gerakan = self.dapatkan_gerakan_acak_aman()
             gerak_x, gerak_y = gerakan[0], gerakan[1]
 
-        if (gerak_x == 0 and gerak_y == 0):
-            # Reset dan coba lagi
-            self.target_bersama = []
-            self.kembali_via_portal_bersama = False
-            self.target_portal_bersama = None
-            self.target_perantara_bersama = None
-            self.lokasi_target = None
-            gerakan_rekursif = self.next_move(player_bot, game_board)
-            gerak_x, gerak_y = gerakan_rekursif[0], gerakan_rekursif[1]
-
         return gerak_x, gerak_y
 
     def nilai_tingkat_risiko(self):
@@ -127,8 +153,7 @@ class GreedyDiamondLogic(BaseLogic):
             return False
         
         # Ambang batas sederhana berdasarkan diamond yang dibawa
-        ambang_batas = {1: 0.8, 2: 0.7, 3: 0.6, 4: 0.5}
-        batas = ambang_batas.get(stats_bot.diamonds, 0.4)
+        batas = self.params.ambang_batas.get(stats_bot.diamonds, self.params.ambang_batas_default)
         
         return level_risiko > batas
 
@@ -150,7 +175,7 @@ class GreedyDiamondLogic(BaseLogic):
                            abs(base_rumah.y - pos_portal_jauh.y))
             
             # Gunakan portal jika jauh lebih pendek
-            if jarak_portal < jarak_langsung * 0.8:
+            if jarak_portal < jarak_langsung * self.params.faktor_portal:
                 self.kembali_via_portal_bersama = True
                 self.target_portal_bersama = obj_portal_terdekat
                 self.target_bersama = [pos_portal_terdekat, base_rumah]
@@ -194,22 +219,25 @@ class GreedyDiamondLogic(BaseLogic):
     def cari_diamond_terbaik_langsung(self):
         """Cari diamond terbaik via rute langsung"""
         posisi_bot = self.bot_pemain.position
-        skor_terbaik = 0
-        diamond_terbaik = None
-        
-        for permata in self.diamond_tersedia:
-            # Lewati red diamond jika membawa 4 diamond
-            if permata.properties.points == 2 and self.bot_pemain.properties.diamonds == 4:
-                continue
-                
-            jarak = abs(permata.position.x - posisi_bot.x) + abs(permata.position.y - posisi_bot.y)
-            skor = self.hitung_skor_diamond(permata.properties.points, jarak, permata.position)
-            
-            if skor > skor_terbaik:
-                skor_terbaik = skor
-                diamond_terbaik = permata.position
-                
-        return skor_terbaik, diamond_terbaik
+        skor_terbaik, permata = self.indeks_diamond.best(
+            (posisi_bot.x, posisi_bot.y),
+            self.skor_permata,
+            self.batas_skor,
+        )
+        return skor_terbaik, permata.position if permata else None
+
+    def skor_permata(self, jarak, permata, jarak_tambahan=0):
+        """Skor diamond pada jarak tertentu, None jika tidak bisa diambil"""
+        # Lewati red diamond jika membawa 4 diamond
+        if permata.properties.points == 2 and self.bot_pemain.properties.diamonds == 4:
+            return None
+        return self.hitung_skor_diamond(permata.properties.points, jarak + jarak_tambahan, permata.position)
+
+    def batas_skor(self, jarak):
+        """Skor tertinggi yang mungkin pada jarak tertentu, untuk menghentikan pencarian"""
+        if jarak == 0:
+            return float("inf")
+        return max(0.1, MAX_POINTS / jarak)
 
     def cari_diamond_terbaik_via_portal(self):
         """Cari diamond terbaik via rute portal"""
@@ -219,24 +247,16 @@ class GreedyDiamondLogic(BaseLogic):
         if not all([pos_portal_terdekat, pos_portal_jauh, portal_terdekat]):
             return 0, None, None
     
-        skor_terbaik = 0
-        jalur_diamond_terbaik = None
-
-        for permata in self.diamond_tersedia:
-            if permata.properties.points == 2 and self.bot_pemain.properties.diamonds == 4:
-                continue
-                
-            portal_ke_diamond = abs(permata.position.x - pos_portal_jauh.x) + abs(permata.position.y - pos_portal_jauh.y)
-            bot_ke_portal = abs(pos_portal_terdekat.x - posisi_bot.x) + abs(pos_portal_terdekat.y - posisi_bot.y)
-            total_jarak = portal_ke_diamond + bot_ke_portal
-            
-            skor = self.hitung_skor_diamond(permata.properties.points, total_jarak, permata.position)
-            
-            if skor > skor_terbaik:
-                skor_terbaik = skor
-                jalur_diamond_terbaik = [pos_portal_terdekat, permata.position]
-                
-        return skor_terbaik, jalur_diamond_terbaik, portal_terdekat
+        # Cari dari portal pasangan, ditambah jarak bot ke portal terdekat
+        bot_ke_portal = abs(pos_portal_terdekat.x - posisi_bot.x) + abs(pos_portal_terdekat.y - posisi_bot.y)
+        skor_terbaik, permata = self.indeks_diamond.best(
+            (pos_portal_jauh.x, pos_portal_jauh.y),
+            lambda jarak, permata: self.skor_permata(jarak, permata, bot_ke_portal),
+            lambda jarak: self.batas_skor(jarak + bot_ke_portal),
+        )
+        if permata is None:
+            return 0, None, portal_terdekat
+        return skor_terbaik, [pos_portal_terdekat, permata.position], portal_terdekat
 
     def cari_tombol_khusus_terbaik(self):
         """Cari tombol khusus terbaik"""
@@ -247,16 +267,28 @@ class GreedyDiamondLogic(BaseLogic):
         tombol = self.tombol_khusus[0]
         jarak = abs(tombol.position.x - posisi_bot.x) + abs(tombol.position.y - posisi_bot.y)
         
-        skor = self.hitung_skor_diamond(3, jarak, tombol.position)  # Asumsikan tombol bernilai 3 poin
+        # Nilai harapan menekan tombol: diamond terdekat setelah semua diamond dibuat ulang
+        estimasi = estimate_button(self.papan_game, tombol.position)
+        if estimasi is None:
+            return 0, None
+        skor = self.hitung_skor_diamond(estimasi.points, jarak + estimasi.distance, tombol.position)
         return skor, tombol.position
 
     def dapatkan_gerakan_acak_aman(self):
-        """Dapatkan gerakan acak yang lebih aman"""
+        """Dapatkan gerakan menuju daerah ramai diamond, atau gerakan acak yang lebih aman"""
         posisi_bot = self.bot_pemain.position
+        langkah_legal = legal_moves(self.papan_game, posisi_bot)
+
+        # Menuju daerah tempat diamond paling sering muncul
+        target_tunggu = self.grid_kemunculan.idle_target(posisi_bot)
+        if target_tunggu and target_tunggu != posisi_bot:
+            return get_direction(posisi_bot.x, posisi_bot.y, target_tunggu.x, target_tunggu.y)
         gerakan_teraman = self.vektor_gerakan[self.arah_sekarang]
+        if langkah_legal and gerakan_teraman not in langkah_legal:
+            gerakan_teraman = langkah_legal[0]
         
         # Coba hindari lawan
-        for gerakan in self.vektor_gerakan:
+        for gerakan in langkah_legal:
             posisi_selanjutnya = Position(posisi_bot.y + gerakan[1], posisi_bot.x + gerakan[0])
             aman = True
             
@@ -3,7 +3,7 @@ from typing import Optional
 
 from game.logic.base import BaseLogic
 from game.models import GameObject, Board, Position
-from ..util import get_direction
+from ..util import fallback_move, get_direction, is_legal_move, legal_moves
 
 
 class RandomLogic(BaseLogic):
@@ -33,12 +33,17 @@ class RandomLogic(BaseLogic):
                 self.goal_position.y,
             )
         else:
-            # Roam around
+            # Roam around, turning away from the edge of the board
+            valid_moves = legal_moves(board, current_position)
             delta = self.directions[self.current_direction]
+            if valid_moves and delta not in valid_moves:
+                delta = valid_moves[0]
             delta_x = delta[0]
             delta_y = delta[1]
             if random.random() > 0.6:
                 self.current_direction = (self.current_direction + 1) % len(
                     self.directions
                 )
+        if not is_legal_move(board, current_position, delta_x, delta_y):
+            return fallback_move(board, current_position)
         return delta_x, delta_y
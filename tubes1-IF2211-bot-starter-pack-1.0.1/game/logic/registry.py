@@ -0,0 +1,49 @@
+from importlib import import_module
+from typing import Dict, List, Type
+
+from game.logic.base import BaseLogic
+
+# Bundled controllers, as "module:attribute" so nothing is imported until used
+CONTROLLERS: Dict[str, str] = {
+    "Random": "game.logic.random:RandomLogic",
+    "cep": "game.logic.cep:GreedyDiamondLogic",
+    "vtd": "game.logic.vtd:GreedyDiamondLogic",
+    "tw": "game.logic.tw:GreedyDiamondLogic",
+    "ra": "game.logic.ra:GreedyDiamondLogic",
+}
+
+# Installed packages can add controllers without editing CONTROLLERS, e.g.
+#   [project.entry-points."diamonds.logic"]
+#   mybot = "mypackage.logic:MyLogic"
+ENTRY_POINT_GROUP = "diamonds.logic"
+
+
+def _entry_points():
+    from importlib.metadata import entry_points
+
+    return entry_points(group=ENTRY_POINT_GROUP)
+
+
+def controller_names() -> List[str]:
+    """Bundled controllers followed by those registered through entry points"""
+    names = list(CONTROLLERS)
+    names.extend(ep.name for ep in _entry_points() if ep.name not in CONTROLLERS)
+    return names
+
+
+def resolve(name: str) -> Type[BaseLogic]:
+    """
+    Import and return the logic class registered under name
+    :param name: controller name
+    :return: logic class
+    :raises KeyError: when no controller has that name
+    """
+    target = CONTROLLERS.get(name)
+    if target is not None:
+        module_name, attribute = target.split(":")
+        return getattr(import_module(module_name), attribute)
+
+    for ep in _entry_points():
+        if ep.name == name:
+            return ep.load()
+    raise KeyError(name)
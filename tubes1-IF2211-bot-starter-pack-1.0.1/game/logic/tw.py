@@ -1,32 +1,90 @@
 from typing import Optional
 from game.logic.base import BaseLogic
+from game.button import estimate_button
+from game.endgame import EndgameSolver, step_towards, steps_left
+from game.logic.params import TwParams, load_params
 from game.models import Board, GameObject, Position
-from game.util import get_direction
+from game.plan import Plan
+from game.spatial import MAX_POINTS, DiamondIndex
+from game.spawns import SpawnModel
+from game.opponents import OpponentTracker
+from game.tackle import TacklePlanner
+from game.util import MAX_REPLANS, fallback_move, get_direction, is_legal_move, legal_moves
 
 
 class GreedyDiamondLogic(BaseLogic):
+    team_aware = True
     shared_targets : list[Position] = []
     shared_portal_target : GameObject = None
     shared_intermediate_target : Position = None
     shared_return_via_portal : bool = False
 
-    def __init__(self) -> None:
+    def __init__(self, params: Optional[TwParams] = None) -> None:
+        self.params = params or load_params("tw")
         self.movement_vectors = [(1, 0), (0, 1), (-1, 0), (0, -1)]
         self.target_location: Optional[Position] = None
+        self.plan: Optional[Plan] = None
         self.current_heading = 0
         self.calculated_distance = 0
+        self.diamond_index = DiamondIndex()
+        self.spawns = SpawnModel()
+        self.opponents = OpponentTracker()
+        self.tackles = TacklePlanner(horizon=self.params.tackle_horizon)
+        self.endgame = EndgameSolver()
 
     def next_move(self, player_bot: GameObject, game_board: Board):
+        self.spawn_grid = self.spawns.observe(game_board)
+        self.opponents.update(game_board, player_bot.id, self.teammates)
+        self.tackles.observe(player_bot)
+        # Lanjutkan rencana jalan selama papan di sekitarnya, target tim dan
+        # keputusan pulang tidak berubah
+        if self.plan and steps_left(player_bot.properties.milliseconds_left, self.tick_milliseconds) > self.params.endgame_steps:
+            step = self.plan.next_step(game_board, player_bot, self.plan_conditions(player_bot, game_board))
+            if step and is_legal_move(game_board, player_bot.position, *step):
+                return step
+        self.plan = None
+        # Rencanakan ulang dengan target kosong jika langkah tidak legal, lalu
+        # ambil langkah legal pertama supaya setiap tick selesai dalam waktu terbatas
+        for _ in range(MAX_REPLANS):
+            move_x, move_y = self.plan_move(player_bot, game_board)
+            if is_legal_move(game_board, player_bot.position, move_x, move_y):
+                return move_x, move_y
+            self.reset_targets()
+        return fallback_move(game_board, player_bot.position)
+
+    def reset_targets(self):
+        self.shared_targets = []
+        self.shared_return_via_portal = False
+        self.shared_portal_target = None
+        self.shared_intermediate_target = None
+        self.target_location = None
+        self.plan = None
+
+    def current_target(self) -> Optional[Position]:
+        return self.target_location
+
+    def plan_move(self, player_bot: GameObject, game_board: Board):
         bot_stats = player_bot.properties
         self.game_board = game_board
         self.player_bot = player_bot
         self.available_diamonds = game_board.diamonds
+        self.diamond_index.update(game_board)
         self.all_bots = game_board.bots
         self.portal_objects = [obj for obj in self.game_board.game_objects if obj.type == "TeleportGameObject"]
         self.special_buttons = [obj for obj in self.game_board.game_objects if obj.type == "DiamondButtonGameObject"]
         self.opponent_bots = [bot for bot in self.all_bots if bot.id != self.player_bot.id]
         self.opponent_diamonds = [bot.properties.diamonds for bot in self.opponent_bots]
 
+        # Mode akhir permainan: ikuti rute diamond dan base yang paling banyak
+        # menyetor poin sebelum waktu habis
+        steps = steps_left(bot_stats.milliseconds_left, self.tick_milliseconds)
+        if steps <= self.params.endgame_steps:
+            plan = self.endgame.solve(game_board, player_bot, steps)
+            if plan and plan.waypoint:
+                self.reset_targets()
+                avoid = [(obj.position.x, obj.position.y) for obj in self.portal_objects + self.special_buttons]
+                return step_towards(game_board, player_bot.position, plan.waypoint, avoid)
+
         # HAPUS SEMUA DATA STATIS KETIKA DI BASE
         if (self.player_bot.position == self.player_bot.properties.base):
             self.shared_targets = []
@@ -45,6 +103,12 @@ class GreedyDiamondLogic(BaseLogic):
         if (self.player_bot.position == self.shared_intermediate_target):
             self.shared_intermediate_target = None
 
+        # Lepas diamond yang sudah dibagikan ke rekan setim
+        if (self.shared_targets and not self.shared_return_via_portal and
+            (self.shared_targets[-1].x, self.shared_targets[-1].y) in self.reserved_targets):
+            self.shared_targets = []
+            self.shared_portal_target = None
+
         # TIME-WEIGHTED DECISION MAKING
         time_left_ratio = bot_stats.milliseconds_left / 30000.0  # Normalize to 0-1
         urgency_threshold = self.calculate_urgency_threshold(time_left_ratio, bot_stats.diamonds)
@@ -61,7 +125,14 @@ class GreedyDiamondLogic(BaseLogic):
         else:
             if (len(self.shared_targets) == 0):
                 self.locate_closest_diamond_time_weighted()
-            self.target_location = self.shared_targets[0]
+            if self.shared_targets:
+                self.target_location = self.shared_targets[0]
+            elif bot_stats.diamonds > 0:
+                # Tidak ada yang bisa diambil, setor yang sudah dibawa
+                self.target_location = self.determine_optimal_base_route()
+            else:
+                # Tanpa target, plan_move menunggu di daerah spawn atau berkeliaran
+                self.target_location = None
 
         # Evaluasi kedekatan base dengan time factor
         if (self.evaluate_base_proximity_time_weighted(time_left_ratio) and bot_stats.diamonds > 1):
@@ -73,8 +144,24 @@ class GreedyDiamondLogic(BaseLogic):
         if self.shared_intermediate_target: # Jika ada target sementara, gunakan itu
             self.target_location = self.shared_intermediate_target
 
+        # Cegat lawan yang membawa diamond jika lebih menguntungkan daripada mengumpulkan sendiri,
+        # tapi jangan saat sedang pulang membawa diamond
+        home_base = bot_stats.base
+        heading_home = self.shared_return_via_portal or (
+            self.target_location is not None
+            and self.target_location.x == home_base.x
+            and self.target_location.y == home_base.y
+        )
+        tackle = None if heading_home else self.tackles.best(
+            player_bot, game_board, self.opponents, self.params.tackle_margin
+        )
+        if tackle:
+            self.target_location = Position(tackle.intercept[1], tackle.intercept[0])
+            self.shared_intermediate_target = None
+
         # Hitung langkah selanjutnya
         bot_position = player_bot.position
+        idle_target = None if self.target_location else self.spawn_grid.idle_target(bot_position)
         if self.target_location:
             # Periksa apakah ada teleporter di jalur
             if (not self.shared_intermediate_target):
@@ -103,33 +190,54 @@ class GreedyDiamondLogic(BaseLogic):
                 self.target_location.x,
                 self.target_location.y,
             )
+            # Simpan sisa jalan ke target sebagai rencana untuk tick berikutnya
+            self.plan = None if tackle else Plan.toward(
+                game_board, player_bot, self.target_location, self.plan_conditions(player_bot, game_board)
+            )
+        elif idle_target and idle_target != bot_position:
+            # Tidak ada target, tunggu di daerah tempat diamond paling sering muncul
+            move_x, move_y = get_direction(
+                bot_position.x,
+                bot_position.y,
+                idle_target.x,
+                idle_target.y,
+            )
         else:
-            # Berkeliaran
+            # Berkeliaran, lewati arah yang keluar dari papan
+            valid_moves = legal_moves(game_board, bot_position)
             movement = self.movement_vectors[self.current_heading]
+            if valid_moves and movement not in valid_moves:
+                movement = valid_moves[0]
             move_x = movement[0]
             move_y = movement[1]
             self.current_heading = (self.current_heading + 1) % len(
                 self.movement_vectors
             )
 
-        if (move_x == 0 and move_y == 0):
-            # Reset target
-            self.shared_targets = []
-            self.shared_return_via_portal = False
-            self.shared_portal_target = None
-            self.shared_intermediate_target = None
-            self.target_location = None
-            recursive_move = self.next_move(player_bot, game_board)
-            move_x, move_y = recursive_move[0], recursive_move[1]
-
         return move_x, move_y
 
+    def plan_conditions(self, player_bot: GameObject, game_board: Board):
+        """Keputusan di luar papan yang mendasari rencana jalan: target tim dan apakah saatnya pulang"""
+        self.player_bot = player_bot
+        self.game_board = game_board
+        self.portal_objects = [obj for obj in game_board.game_objects if obj.type == "TeleportGameObject"]
+        bot_stats = player_bot.properties
+        time_left_ratio = bot_stats.milliseconds_left / 30000.0
+        urgency_threshold = self.calculate_urgency_threshold(time_left_ratio, bot_stats.diamonds)
+        heading_home = (
+            bot_stats.diamonds == 5
+            or (bot_stats.milliseconds_left < urgency_threshold and bot_stats.diamonds > 0)
+            or self.should_return_early(bot_stats, time_left_ratio)
+            or (self.evaluate_base_proximity_time_weighted(time_left_ratio) and bot_stats.diamonds > 1)
+        )
+        return heading_home, self.assigned_target, self.reserved_targets
+
     def calculate_urgency_threshold(self, time_ratio, diamonds_count):
         """Hitung threshold waktu untuk kembali ke base berdasarkan jumlah diamond"""
-        base_threshold = 8000  # 8 detik base threshold
+        base_threshold = self.params.base_threshold  # 8 detik base threshold
         
         # Semakin banyak diamond, semakin early return
-        diamond_multiplier = 1.0 + (diamonds_count * 0.3)
+        diamond_multiplier = 1.0 + (diamonds_count * self.params.diamond_multiplier)
         
         # Semakin sedikit waktu, threshold semakin tinggi (lebih konservatif)
         time_multiplier = 1.0 + (1.0 - time_ratio) * 0.5
@@ -146,13 +254,13 @@ class GreedyDiamondLogic(BaseLogic):
         time_left_ms = bot_stats.milliseconds_left
         
         # Faktor safety berdasarkan jumlah diamond (semakin banyak semakin konservatif)
-        safety_factor = 1.2 + (bot_stats.diamonds * 0.1)
+        safety_factor = self.params.safety_factor + (bot_stats.diamonds * self.params.safety_factor_per_diamond)
         
         # Return early jika waktu tersisa kurang dari waktu kembali + safety margin
-        return time_left_ms < (min_return_time * 1000 * safety_factor)
+        return time_left_ms < (min_return_time * self.tick_milliseconds * safety_factor)
 
     def calculate_minimum_return_time(self):
-        """Hitung waktu minimum untuk kembali ke base (dalam detik)"""
+        """Hitung waktu minimum untuk kembali ke base (dalam langkah)"""
         bot_position = self.player_bot.position
         home_base = self.player_bot.properties.base
         
@@ -165,7 +273,7 @@ class GreedyDiamondLogic(BaseLogic):
         # Pilih rute tercepat
         min_distance = min(direct_distance, portal_distance)
         
-        # Asumsi 1 langkah = 1 detik (adjust sesuai game speed)
+        # Satu langkah makan tick_milliseconds, lihat should_return_early
         return min_distance
 
     def evaluate_base_proximity_time_weighted(self, time_ratio):
@@ -200,12 +308,19 @@ class GreedyDiamondLogic(BaseLogic):
         direct_option = self.find_closest_diamond_direct_time_weighted(time_left_ratio)
         portal_option = self.find_closest_diamond_via_portal_time_weighted(time_left_ratio)
         button_option = self.find_closest_special_button_time_weighted(time_left_ratio)
-        
+
+        # Opsi tanpa target tidak ikut dipilih
+        direct_score = direct_option[0] if direct_option[1] else float("-inf")
+        portal_score = portal_option[0] if portal_option[1] else float("-inf")
+        button_score = button_option[0] if button_option[1] else float("-inf")
+
         # Pilih opsi dengan score tertinggi
-        if (direct_option[0] >= portal_option[0] and direct_option[0] >= button_option[0]):
+        if max(direct_score, portal_score, button_score) == float("-inf"):
+            self.shared_targets = []
+        elif (direct_score >= portal_score and direct_score >= button_score):
             self.shared_targets = [direct_option[1]]
             self.calculated_distance = abs(self.player_bot.position.x - direct_option[1].x) + abs(self.player_bot.position.y - direct_option[1].y)
-        elif (portal_option[0] >= direct_option[0] and portal_option[0] >= button_option[0]):
+        elif (portal_score >= direct_score and portal_score >= button_score):
             self.shared_targets = portal_option[1]
             self.shared_portal_target = portal_option[2]
             self.calculated_distance = abs(self.player_bot.position.x - portal_option[1][0].x) + abs(self.player_bot.position.y - portal_option[1][0].y)
@@ -227,9 +342,9 @@ class GreedyDiamondLogic(BaseLogic):
         
         # Pada awal game (time_ratio tinggi): prioritas value/distance
         # Pada akhir game (time_ratio rendah): prioritas distance (yang dekat)
-        if time_ratio > 0.7:  # Awal game (70%+ waktu tersisa)
+        if time_ratio > self.params.early_game_ratio:  # Awal game (70%+ waktu tersisa)
             time_weight = 1.0 + (points * 0.1)  # Bonus untuk diamond bernilai tinggi
-        elif time_ratio > 0.3:  # Mid game (30-70% waktu tersisa)
+        elif time_ratio > self.params.end_game_ratio:  # Mid game (30-70% waktu tersisa)
             time_weight = 1.0 + (time_urgency * 0.5)  # Moderate urgency
         else:  # End game (<30% waktu tersisa)
             distance_penalty = distance * time_urgency * 0.3
@@ -237,24 +352,32 @@ class GreedyDiamondLogic(BaseLogic):
         
         return base_score * time_weight
 
+    def score_bound(self, distance, time_ratio):
+        """Score tertinggi yang mungkin untuk diamond sejauh distance, untuk menghentikan pencarian"""
+        if distance == 0:
+            return float("inf")
+        return self.calculate_time_weighted_score(MAX_POINTS, distance, time_ratio)
+
     def find_closest_diamond_direct_time_weighted(self, time_ratio):
         """Cari diamond terdekat dengan rute langsung menggunakan time-weighted scoring"""
         bot_position = self.player_bot.position
-        best_score = 0
-        best_diamond = None
-        
-        for gem in self.available_diamonds:
+
+        def score(distance, gem):
             if not self.is_diamond_collectible(gem):
-                continue
-                
-            distance = abs(gem.position.x - bot_position.x) + abs(gem.position.y - bot_position.y)
+                return None
             score = self.calculate_time_weighted_score(gem.properties.points, distance, time_ratio)
-            
-            if score > best_score:
-                best_score = score
-                best_diamond = gem.position
-                
-        return best_score, best_diamond
+            # Utamakan diamond yang dibagikan koordinator tim ke bot ini
+            if gem.position == self.assigned_target:
+                score *= self.params.assigned_target_bonus
+            return score
+
+        bonus = max(1.0, self.params.assigned_target_bonus)
+        best_score, gem = self.diamond_index.best(
+            (bot_position.x, bot_position.y),
+            score,
+            lambda distance: self.score_bound(distance, time_ratio) * bonus,
+        )
+        return best_score, gem.position if gem else None
 
     def find_closest_diamond_via_portal_time_weighted(self, time_ratio):
         """Cari diamond terdekat via portal dengan time-weighted scoring"""
@@ -264,25 +387,22 @@ class GreedyDiamondLogic(BaseLogic):
         if not all([closest_portal_pos, distant_portal_pos, closest_portal]):
             return 0, None, None
     
-        best_score = 0
-        best_diamond_path = None
+        # Total distance via portal: cari dari teleport pasangan
+        bot_to_portal = abs(closest_portal_pos.x - bot_position.x) + abs(closest_portal_pos.y - bot_position.y)
 
-        for gem in self.available_diamonds:
+        def score(distance, gem):
             if not self.is_diamond_collectible(gem):
-                continue
-                
-            # Total distance via portal
-            portal_to_diamond = abs(gem.position.x - distant_portal_pos.x) + abs(gem.position.y - distant_portal_pos.y)
-            bot_to_portal = abs(closest_portal_pos.x - bot_position.x) + abs(closest_portal_pos.y - bot_position.y)
-            total_distance = portal_to_diamond + bot_to_portal
-            
-            score = self.calculate_time_weighted_score(gem.properties.points, total_distance, time_ratio)
-            
-            if score > best_score:
-                best_score = score
-                best_diamond_path = [closest_portal_pos, gem.position]
-                
-        return best_score, best_diamond_path, closest_portal
+                return None
+            return self.calculate_time_weighted_score(gem.properties.points, distance + bot_to_portal, time_ratio)
+
+        best_score, gem = self.diamond_index.best(
+            (distant_portal_pos.x, distant_portal_pos.y),
+            score,
+            lambda distance: self.score_bound(distance + bot_to_portal, time_ratio),
+        )
+        if gem is None:
+            return 0, None, closest_portal
+        return best_score, [closest_portal_pos, gem.position], closest_portal
 
     def find_closest_special_button_time_weighted(self, time_ratio):
         """Cari tombol merah dengan time-weighted scoring"""
@@ -293,9 +413,11 @@ class GreedyDiamondLogic(BaseLogic):
         button = self.special_buttons[0]  # Asumsi hanya ada 1 button
         distance = abs(button.position.x - bot_position.x) + abs(button.position.y - bot_position.y)
         
-        # Button memberikan banyak diamond, tapi pertimbangkan waktu juga
-        button_value = 3  # Estimasi value dari button
-        score = self.calculate_time_weighted_score(button_value, distance, time_ratio)
+        # Nilai harapan menekan tombol: diamond terdekat setelah semua diamond dibuat ulang
+        estimate = estimate_button(self.game_board, button.position)
+        if estimate is None:
+            return 0, None
+        score = self.calculate_time_weighted_score(estimate.points, distance + estimate.distance, time_ratio)
         
         return score, button.position
 
@@ -304,6 +426,14 @@ class GreedyDiamondLogic(BaseLogic):
         # Hindari red diamond (2 points) jika sudah punya 4 diamond
         if gem.properties.points == 2 and self.player_bot.properties.diamonds == 4:
             return False
+        # Diamond yang diambil rekan setim
+        if (gem.position.x, gem.position.y) in self.reserved_targets:
+            return False
+        # Diamond yang akan lebih dulu diambil lawan
+        bot_position = self.player_bot.position
+        distance = abs(gem.position.x - bot_position.x) + abs(gem.position.y - bot_position.y)
+        if self.opponents.contested((gem.position.x, gem.position.y), distance, self.params.contested_margin):
+            return False
         return True
 
     # ====== METHODS DARI KODE ORIGINAL (TIDAK DIUBAH) ======
@@ -1,7 +1,11 @@
 from typing import Optional
 from game.logic.base import BaseLogic
+from game.button import estimate_button
 from game.models import Board, GameObject, Position
-from game.util import get_direction
+from game.plan import Plan
+from game.spatial import MAX_POINTS, DiamondIndex
+from game.spawns import SpawnModel
+from game.util import MAX_REPLANS, fallback_move, get_direction, is_legal_move, legal_moves
 
 
 
@@ -14,8 +18,11 @@ class GreedyDiamondLogic(BaseLogic):
     def __init__(self) -> None:
         self.movement_vectors = [(1, 0), (0, 1), (-1, 0), (0, -1)]
         self.target_location: Optional[Position] = None
+        self.plan: Optional[Plan] = None
         self.current_heading = 0
         self.calculated_distance = 0
+        self.diamond_index = DiamondIndex()
+        self.spawns = SpawnModel()
 
     def check_path_obstacles(self, obstacle_type, start_x, start_y, target_x, target_y):
         if obstacle_type == 'teleporter':
@@ -85,15 +92,22 @@ class GreedyDiamondLogic(BaseLogic):
 
     def find_closest_diamond_direct(self) -> Optional[Position]:
         bot_position = self.player_bot.position
-        minimum_distance = float("inf")
-        best_diamond = None
-        for gem in self.available_diamonds:
-            distance = abs(gem.position.x - bot_position.x) + abs(gem.position.y - bot_position.y)
-            distance /= gem.properties.points
-            if distance < minimum_distance and ((gem.properties.points == 2 and self.player_bot.properties.diamonds != 4) or (gem.properties.points == 1)):
-                minimum_distance = distance
-                best_diamond = gem.position
-        return minimum_distance, best_diamond
+        score, gem = self.diamond_index.best(
+            (bot_position.x, bot_position.y),
+            self.points_per_step,
+            lambda distance: MAX_POINTS / distance if distance else float("inf"),
+        )
+        if gem is None:
+            return float("inf"), None
+        return 1 / score, gem.position
+
+    # Poin per langkah sebuah diamond, None jika tidak bisa diambil
+    def points_per_step(self, distance, gem, offset=0):
+        if gem.properties.points == 2 and self.player_bot.properties.diamonds == 4:
+            return None
+        if distance + offset == 0:
+            return None
+        return gem.properties.points / (distance + offset)
 
     def locate_nearest_portal(self):
         closest_portal_pos, distant_portal_pos, closest_portal_obj = None, None, None
@@ -109,10 +123,40 @@ class GreedyDiamondLogic(BaseLogic):
         return closest_portal_pos, distant_portal_pos, closest_portal_obj
 
     def next_move(self, player_bot: GameObject, game_board: Board):
+        self.spawn_grid = self.spawns.observe(game_board)
+        # Lanjutkan rencana jalan selama papan di sekitarnya dan keputusan
+        # pulang tidak berubah
+        if self.plan:
+            step = self.plan.next_step(game_board, player_bot, self.plan_conditions(player_bot, game_board))
+            if step and is_legal_move(game_board, player_bot.position, *step):
+                return step
+        self.plan = None
+        # Rencanakan ulang dengan target kosong jika langkah tidak legal, lalu
+        # ambil langkah legal pertama supaya setiap tick selesai dalam waktu terbatas
+        for _ in range(MAX_REPLANS):
+            move_x, move_y = self.plan_move(player_bot, game_board)
+            if is_legal_move(game_board, player_bot.position, move_x, move_y):
+                return move_x, move_y
+            self.reset_targets()
+        return fallback_move(game_board, player_bot.position)
+
+    def reset_targets(self):
+        self.shared_targets = []
+        self.shared_return_via_portal = False
+        self.shared_portal_target = None
+        self.shared_intermediate_target = None
+        self.target_location = None
+        self.plan = None
+
+    def current_target(self) -> Optional[Position]:
+        return self.target_location
+
+    def plan_move(self, player_bot: GameObject, game_board: Board):
         bot_stats = player_bot.properties
         self.game_board = game_board
         self.player_bot = player_bot
         self.available_diamonds = game_board.diamonds
+        self.diamond_index.update(game_board)
         self.all_bots = game_board.bots
         self.portal_objects = [obj for obj in self.game_board.game_objects if obj.type == "TeleportGameObject"]
         self.special_buttons = [obj for obj in self.game_board.game_objects if obj.type == "DiamondButtonGameObject"]
@@ -138,7 +182,7 @@ class GreedyDiamondLogic(BaseLogic):
             self.shared_intermediate_target = None
 
         # Analisis kondisi baru
-        if bot_stats.diamonds == 5 or (bot_stats.milliseconds_left < 5000 and bot_stats.diamonds > 1):
+        if bot_stats.diamonds == 5 or (bot_stats.milliseconds_left < 5 * self.tick_milliseconds and bot_stats.diamonds > 1):
             # Bergerak ke base
             self.target_location = self.determine_optimal_base_route()
             if not self.shared_return_via_portal:
@@ -147,7 +191,7 @@ class GreedyDiamondLogic(BaseLogic):
         else:
             if (len(self.shared_targets) == 0):
                 self.locate_closest_diamond()
-            self.target_location = self.shared_targets[0]
+            self.target_location = self.shared_targets[0] if self.shared_targets else None
     
 
         if (self.evaluate_base_proximity() and bot_stats.diamonds > 2):
@@ -161,6 +205,7 @@ class GreedyDiamondLogic(BaseLogic):
 
         # Hitung langkah selanjutnya
         bot_position = player_bot.position
+        idle_target = None if self.target_location else self.spawn_grid.idle_target(bot_position)
         if self.target_location:
             # Periksa apakah ada teleporter di jalur
             if (not self.shared_intermediate_target):
@@ -190,25 +235,30 @@ class GreedyDiamondLogic(BaseLogic):
                 self.target_location.x,
                 self.target_location.y,
             )
+            # Simpan sisa jalan ke target sebagai rencana untuk tick berikutnya
+            self.plan = Plan.toward(
+                game_board, player_bot, self.target_location, self.plan_conditions(player_bot, game_board)
+            )
+        elif idle_target and idle_target != bot_position:
+            # Tidak ada target, tunggu di daerah tempat diamond paling sering muncul
+            move_x, move_y = get_direction(
+                bot_position.x,
+                bot_position.y,
+                idle_target.x,
+                idle_target.y,
+            )
         else:
-            # Berkeliaran
+            # Berkeliaran, lewati arah yang keluar dari papan
+            valid_moves = legal_moves(game_board, bot_position)
             movement = self.movement_vectors[self.current_heading]
+            if valid_moves and movement not in valid_moves:
+                movement = valid_moves[0]
             move_x = movement[0]
             move_y = movement[1]
             self.current_heading = (self.current_heading + 1) % len(
                 self.movement_vectors
             )
 
-        if (move_x == 0 and move_y == 0):
-            # Reset target
-            self.shared_targets = []
-            self.shared_return_via_portal = False
-            self.shared_portal_target = None
-            self.shared_intermediate_target = None
-            self.target_location = None
-            recursive_move = self.next_move(player_bot, game_board)
-            move_x, move_y = recursive_move[0], recursive_move[1]
-
         return move_x, move_y
 
     def find_closest_diamond_via_portal(self) -> Optional[Position]:
@@ -216,19 +266,18 @@ class GreedyDiamondLogic(BaseLogic):
         closest_portal_pos, distant_portal_pos, closest_portal = self.locate_nearest_portal()
 
         if (closest_portal_pos == None and distant_portal_pos == None and closest_portal == None):
-            return float("inf")
-    
-        minimum_distance = float("inf")
-        best_diamond = None
-
-        # Hitung jarak ke diamond dengan teleport
-        for gem in self.available_diamonds:
-            distance = abs(gem.position.x - distant_portal_pos.x) + abs(gem.position.y - distant_portal_pos.y) + abs(closest_portal_pos.x - bot_position.x) + abs(closest_portal_pos.y - bot_position.y)
-            distance /= gem.properties.points
-            if distance < minimum_distance and ((gem.properties.points == 2 and self.player_bot.properties.diamonds != 4) or (gem.properties.points == 1)):
-                minimum_distance = distance
-                best_diamond = [closest_portal_pos, gem.position]
-        return minimum_distance, best_diamond, closest_portal
+            return float("inf"), None, None
+
+        # Cari dari teleport pasangan, ditambah jarak bot ke teleport terdekat
+        to_portal = abs(closest_portal_pos.x - bot_position.x) + abs(closest_portal_pos.y - bot_position.y)
+        score, gem = self.diamond_index.best(
+            (distant_portal_pos.x, distant_portal_pos.y),
+            lambda distance, gem: self.points_per_step(distance, gem, to_portal),
+            lambda distance: MAX_POINTS / (distance + to_portal) if distance + to_portal else float("inf"),
+        )
+        if gem is None:
+            return float("inf"), None, closest_portal
+        return 1 / score, [closest_portal_pos, gem.position], closest_portal
     
     # Hitung rute terbaik ke base
     def locate_closest_diamond(self) -> Optional[Position]:
@@ -242,7 +291,7 @@ class GreedyDiamondLogic(BaseLogic):
             self.shared_targets = portal_option[1]
             self.shared_portal_target = portal_option[2]
             self.calculated_distance = portal_option[0]
-        else:
+        elif button_option[1]:
             self.shared_targets = [button_option[1]]
             self.calculated_distance = button_option[0]
 
@@ -259,6 +308,18 @@ class GreedyDiamondLogic(BaseLogic):
         portal_route_distance = abs(home_base.x - distant_portal_pos.x) + abs(home_base.y - distant_portal_pos.y) + abs(closest_portal_pos.x - bot_position.x) + abs(closest_portal_pos.y - bot_position.y)
         return portal_route_distance
 
+    def plan_conditions(self, player_bot: GameObject, game_board: Board):
+        """Keputusan di luar papan yang mendasari rencana jalan: apakah saatnya pulang"""
+        self.player_bot = player_bot
+        self.game_board = game_board
+        self.portal_objects = [obj for obj in game_board.game_objects if obj.type == "TeleportGameObject"]
+        bot_stats = player_bot.properties
+        return (
+            bot_stats.diamonds == 5
+            or (bot_stats.milliseconds_left < 5 * self.tick_milliseconds and bot_stats.diamonds > 1)
+            or (self.evaluate_base_proximity() and bot_stats.diamonds > 2)
+        )
+
     def evaluate_base_proximity(self):
         bot_position = self.player_bot.position
         home_base = self.player_bot.properties.base
@@ -275,9 +336,16 @@ class GreedyDiamondLogic(BaseLogic):
         return optimal_distance <= 5 or (self.calculated_distance > 0 and optimal_distance < self.calculated_distance)
 
     def find_closest_special_button(self):
+        if not self.special_buttons:
+            return float("inf"), None
         bot_position = self.player_bot.position
-        distance = abs(self.special_buttons[0].position.x - bot_position.x) + abs(self.special_buttons[0].position.y - bot_position.y)
-        return distance, self.special_buttons[0].position
+        button = self.special_buttons[0]
+        # Tombol dihitung sejauh jalan ke tombol ditambah jarak harapan ke diamond baru terdekat
+        estimate = estimate_button(self.game_board, button.position)
+        if estimate is None:
+            return float("inf"), None
+        distance = abs(button.position.x - bot_position.x) + abs(button.position.y - bot_position.y)
+        return (distance + estimate.distance) / estimate.points, button.position
 
     def determine_optimal_base_route(self):
         bot_position = self.player_bot.position
@@ -0,0 +1,206 @@
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Dict, List, Optional
+
+# Upper bounds in seconds, roughly logarithmic from 100us to 10s
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """
+    Bucketed latencies, safe to observe from several threads. With samples
+    set to a list it also keeps every observation, for exact quantiles.
+    """
+
+    __slots__ = ("counts", "count", "sum", "max", "samples", "_lock")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples: Optional[List[float]] = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(BUCKETS, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+            if self.samples is not None:
+                self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        """
+        Exact quantile of the kept samples, or else an estimate interpolated
+        inside the quantile's bucket
+        """
+        if not self.count:
+            return 0.0
+        if self.samples:
+            with self._lock:
+                ordered = sorted(self.samples)
+            position = q * (len(ordered) - 1)
+            lower = int(position)
+            upper = min(lower + 1, len(ordered) - 1)
+            return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[index - 1] if index > 0 else 0.0
+                upper = min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(perf_counter() - self.start)
+
+
+class Metrics:
+    """Per-phase latency histograms of the game loop, or of anything else keyed by label"""
+
+    def __init__(
+        self,
+        name: str = "diamonds_tick_phase_seconds",
+        label: str = "phase",
+        description: str = "Time spent in each phase of a game tick",
+    ) -> None:
+        self.name = name
+        self.label = label
+        self.description = description
+        self.histograms: Dict[str, Histogram] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def histogram(self, phase: str) -> Histogram:
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms.setdefault(phase, Histogram())
+        return histogram
+
+    def observe(self, phase: str, seconds: float) -> None:
+        self.histogram(phase).observe(seconds)
+
+    def keep_samples(self, phase: str) -> None:
+        """Keep every observation of phase from now on, so its quantiles are exact"""
+        histogram = self.histogram(phase)
+        if histogram.samples is None:
+            histogram.samples = []
+
+    def timer(self, phase: str) -> _Timer:
+        return _Timer(self.histogram(phase))
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP {} {}".format(self.name, self.description),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        for phase, histogram in list(self.histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(
+                    '{}_bucket{{{}="{}",le="{}"}} {}'.format(
+                        self.name, self.label, phase, bound, cumulative
+                    )
+                )
+            lines.append(
+                '{}_bucket{{{}="{}",le="+Inf"}} {}'.format(
+                    self.name, self.label, phase, histogram.count
+                )
+            )
+            lines.append(
+                '{}_sum{{{}="{}"}} {}'.format(self.name, self.label, phase, histogram.sum)
+            )
+            lines.append(
+                '{}_count{{{}="{}"}} {}'.format(self.name, self.label, phase, histogram.count)
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the Prometheus text atomically so scrapers never see half a file"""
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def shutdown(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+
+    def summary(self) -> List[str]:
+        lines = [
+            "{:<10} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                self.label, "count", "mean ms", "p50 ms", "p95 ms", "p99 ms", "max ms"
+            )
+        ]
+        for phase, histogram in self.histograms.items():
+            mean = histogram.sum / histogram.count if histogram.count else 0.0
+            lines.append(
+                "{:<10} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    phase,
+                    histogram.count,
+                    mean * 1000,
+                    histogram.quantile(0.5) * 1000,
+                    histogram.quantile(0.95) * 1000,
+                    histogram.quantile(0.99) * 1000,
+                    histogram.max * 1000,
+                )
+            )
+        return lines
+
+
+metrics = Metrics()
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 from typing import List, Optional, Union
-from colorama import Fore, Style
+
+from game.log import PER_TICK, get_logger
+
+log = get_logger("models")
 
 
 @dataclass
@@ -86,31 +89,19 @@ class Board:
         self, current_position: Position, delta_x: int, delta_y: int
     ) -> bool:
         if not (-1 <= delta_x <= 1) or not (-1 <= delta_y <= 1):
-            print(
-                Fore.RED + Style.BRIGHT + "Invalid move:" + Style.RESET_ALL,
-                "Delta values must be between -1 and 1 inclusive",
-            )
+            log.debug("Invalid move: Delta values must be between -1 and 1 inclusive", extra=PER_TICK)
             return False
 
         if delta_x == delta_y:
-            print(
-                Fore.RED + Style.BRIGHT + "Invalid move:" + Style.RESET_ALL,
-                "Delta_x and delta_y cannot be equal",
-            )
+            log.debug("Invalid move: Delta_x and delta_y cannot be equal", extra=PER_TICK)
             return False
 
         if not (0 <= current_position.x + delta_x < self.width):
-            print(
-                Fore.RED + Style.BRIGHT + "Invalid move:" + Style.RESET_ALL,
-                "X-coordinate out of bounds",
-            )
+            log.debug("Invalid move: X-coordinate out of bounds", extra=PER_TICK)
             return False
 
         if not (0 <= current_position.y + delta_y < self.height):
-            print(
-                Fore.RED + Style.BRIGHT + "Invalid move:" + Style.RESET_ALL,
-                "Y-coordinate out of bounds",
-            )
+            log.debug("Invalid move: Y-coordinate out of bounds", extra=PER_TICK)
             return False
 
         return True
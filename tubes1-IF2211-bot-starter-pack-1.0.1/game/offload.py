@@ -0,0 +1,241 @@
+import struct
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+from typing import FrozenSet, List, Optional, Tuple
+
+from game.endgame import TICK_MILLISECONDS, step_towards, steps_left, waypoint
+from game.logic.base import BaseLogic
+from game.logic.registry import resolve
+from game.metrics import metrics
+from game.models import Board, Feature, GameObject, Position
+from game.replay import (
+    OBJECT_RECORD,
+    StringTable,
+    features_from_json,
+    features_to_json,
+    pack_object,
+    unpack_object,
+)
+from game.spawns import SpawnModel
+from game.team import teleporter_pairs, travel_distance
+from game.util import fallback_move
+
+# board id, width, height, minimum delay between moves, strings length
+_BOARD_HEADER = struct.Struct("<iHHiI")
+# Seconds close() waits for the worker to save the spawns it learned
+SAVE_TIMEOUT = 5.0
+
+
+def pack_board(board: Board) -> bytes:
+    """
+    Board objects as fixed-width replay records behind a small header and
+    their string table, without features
+    """
+    strings = StringTable()
+    records = b"".join(pack_object(obj, strings) for obj in board.game_objects or [])
+    names = strings.to_json()
+    header = _BOARD_HEADER.pack(
+        board.id, board.width, board.height, board.minimum_delay_between_moves, len(names)
+    )
+    return header + names + records
+
+
+def unpack_board(data: bytes, features: List[Feature]) -> Board:
+    board_id, width, height, minimum_delay, names_length = _BOARD_HEADER.unpack_from(data)
+    records = _BOARD_HEADER.size + names_length
+    strings = StringTable.from_json(data[_BOARD_HEADER.size : records])
+    return Board(
+        id=board_id,
+        width=width,
+        height=height,
+        features=features,
+        minimum_delay_between_moves=minimum_delay,
+        game_objects=[
+            unpack_object(data, strings, offset)
+            for offset in range(records, len(data), OBJECT_RECORD.size)
+        ],
+    )
+
+
+def greedy_move(
+    board: Board, board_bot: GameObject, tick_milliseconds: int = TICK_MILLISECONDS
+) -> Tuple[int, int]:
+    """
+    Cheap move for when planning is late: the diamond with the shortest walk
+    per point, or the base when nothing fits or time is running out
+    """
+    props = board_bot.properties
+    start = (board_bot.position.x, board_bot.position.y)
+    base = (props.base.x, props.base.y) if props.base else None
+    pairs = teleporter_pairs(board)
+    carried = props.diamonds or 0
+    room = (props.inventory_size or 5) - carried
+
+    goal, best_cost = None, None
+    for gem in board.diamonds:
+        if gem.properties.points > room:
+            continue
+        cell = (gem.position.x, gem.position.y)
+        cost = travel_distance(start, cell, pairs) / gem.properties.points
+        if best_cost is None or cost < best_cost:
+            goal, best_cost = cell, cost
+    if base and carried and (
+        goal is None or steps_left(props.milliseconds_left, tick_milliseconds) <= travel_distance(start, base, pairs)
+    ):
+        goal = base
+    if goal is None or goal == start:
+        return fallback_move(board, board_bot.position)
+
+    target = waypoint(start, goal, pairs)
+    avoid = [cell for pair in pairs for cell in pair]
+    return step_towards(board, board_bot.position, target, avoid)
+
+
+# Worker process state: the logic keeps its memory between ticks here
+_logic: Optional[BaseLogic] = None
+_features: List[Feature] = []
+
+
+def _start_worker(logic_name: str, spawns_path: Optional[str]) -> None:
+    global _logic
+    _logic = resolve(logic_name)()
+    if spawns_path:
+        _logic.spawns = SpawnModel.load(spawns_path)
+
+
+def _save_spawns() -> None:
+    _logic.spawns.save()
+
+
+def _ping() -> bool:
+    return _logic is not None
+
+
+def _plan(
+    data: bytes,
+    features: Optional[bytes],
+    bot_id: int,
+    assigned_target: Optional[Position],
+    reserved_targets: FrozenSet[Tuple[int, int]],
+    teammates: FrozenSet[str],
+    tick_milliseconds: int,
+) -> Tuple[Tuple[int, int], Optional[Position]]:
+    global _features
+    if features is not None:
+        _features = features_from_json(features)
+    board = unpack_board(data, _features)
+    board_bot = next(bot for bot in board.bots if bot.id == bot_id)
+    _logic.assigned_target = assigned_target
+    _logic.reserved_targets = reserved_targets
+    _logic.teammates = teammates
+    _logic.tick_milliseconds = tick_milliseconds
+    move = _logic.next_move(board_bot, board)
+    return move, _logic.current_target()
+
+
+class OffloadedLogic(BaseLogic):
+    """
+    Runs a logic in a warm worker process, so heavy planning does not hold
+    up the game loop.
+
+    The board goes over as replay records, with the features only when
+    they change; the logic itself lives in the worker and keeps its state
+    from tick to tick. submit() starts planning as soon as a board arrives,
+    overlapping the rest of the tick. next_move() then waits at most
+    deadline seconds for the result and falls back to greedy_move when the
+    worker is late or fails, or when the board cannot be packed. A late
+    worker is left to finish rather than queueing more boards behind it.
+    The worker learns diamond spawns into the file at spawns_path, when
+    given, and saves them on close(). current_target() is the target of the
+    last plan the worker finished, for the team coordinator.
+    """
+
+    def __init__(
+        self, logic_name: str, deadline: float = 0.5, spawns_path: Optional[str] = None
+    ) -> None:
+        self.logic_name = logic_name
+        self.deadline = deadline
+        self.spawns_path = spawns_path
+        self.team_aware = resolve(logic_name).team_aware
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Optional[Tuple[Board, Future]] = None
+        self._features: Optional[bytes] = None
+        self._target: Optional[Position] = None
+        self._start()
+
+    def _start(self) -> None:
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            initializer=_start_worker,
+            initargs=(self.logic_name, self.spawns_path),
+        )
+        # Start the worker and build the logic before the first tick needs it
+        self._executor.submit(_ping).result()
+        self._pending = None
+        self._features = None
+
+    def _restart(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start()
+
+    @property
+    def busy(self) -> bool:
+        return self._pending is not None and not self._pending[1].done()
+
+    def submit(self, board_bot: GameObject, board: Board) -> None:
+        """Start planning the move for board, unless the worker is still busy"""
+        if self.busy:
+            return
+        try:
+            data = pack_board(board)
+        except (ValueError, struct.error):
+            # Unknown object type or out of range values: next_move plays greedy_move
+            return
+        features = features_to_json(board.features or [])
+        changed = features if features != self._features else None
+        try:
+            future = self._executor.submit(
+                _plan,
+                data,
+                changed,
+                board_bot.id,
+                self.assigned_target,
+                self.reserved_targets,
+                self.teammates,
+                self.tick_milliseconds,
+            )
+        except BrokenProcessPool:
+            self._restart()
+            return
+        self._features = features
+        self._pending = (board, future)
+
+    def next_move(self, board_bot: GameObject, board: Board) -> Tuple[int, int]:
+        start = perf_counter()
+        if self._pending is None or self._pending[0] is not board:
+            self.submit(board_bot, board)
+        if self._pending is not None and self._pending[0] is board:
+            try:
+                move, self._target = self._pending[1].result(timeout=self.deadline)
+                return move
+            except TimeoutError:
+                pass
+            except BrokenProcessPool:
+                self._restart()
+            except Exception:
+                # The logic failed on this board, the worker itself is fine
+                pass
+        metrics.observe("offload_fallback", perf_counter() - start)
+        return greedy_move(board, board_bot, self.tick_milliseconds)
+
+    def current_target(self) -> Optional[Position]:
+        return self._target
+
+    def close(self) -> None:
+        try:
+            self._executor.submit(_save_spawns).result(timeout=SAVE_TIMEOUT)
+        except Exception:
+            # A late or broken worker loses this game's spawns, not the game
+            pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
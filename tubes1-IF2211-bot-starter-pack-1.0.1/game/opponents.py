@@ -0,0 +1,184 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AbstractSet, Deque, Dict, List, Optional, Set, Tuple
+
+from game.models import Board, GameObject
+from game.team import teleporter_pairs, travel_distance
+from game.util import get_direction
+
+Cell = Tuple[int, int]
+
+HISTORY_LENGTH = 16
+
+
+@dataclass
+class OpponentTrack:
+    id: int
+    name: Optional[str]
+    base: Optional[Cell]
+    position: Cell
+    history: Deque[Cell] = field(default_factory=lambda: deque(maxlen=HISTORY_LENGTH))
+    heading: Cell = (0, 0)
+    diamonds: int = 0
+    inventory_size: int = 5
+    can_tackle: bool = False
+    target: Optional[Cell] = None
+    ticks_to_base: int = 0
+    # Board width and height, predictions stop at the edge
+    bounds: Cell = (0, 0)
+    _predicted: List[Cell] = field(default_factory=list, repr=False)
+
+    @property
+    def returning(self) -> bool:
+        return self.target is not None and self.target == self.base
+
+    def predict(self, k: int) -> List[Cell]:
+        """
+        Expected positions for the next k ticks: straight to the estimated
+        target, or on along the current heading when it has none
+        """
+        if len(self._predicted) < k:
+            x, y = self._predicted[-1] if self._predicted else self.position
+            for _ in range(k - len(self._predicted)):
+                if self.target is not None:
+                    delta_x, delta_y = get_direction(x, y, *self.target)
+                else:
+                    delta_x, delta_y = self.heading
+                if 0 <= x + delta_x < self.bounds[0] and 0 <= y + delta_y < self.bounds[1]:
+                    x, y = x + delta_x, y + delta_y
+                self._predicted.append((x, y))
+        return self._predicted[:k]
+
+
+class OpponentTracker:
+    """
+    Per-bot history of every opponent, updated once per tick from the board.
+
+    The target of an opponent is estimated from its last move: its base when
+    its inventory is full, or when it carries diamonds and the move brought it
+    closer to the base than to any diamond; otherwise the diamond with the best
+    distance per point among those the move brought it closer to. Only the latest move is looked at, so an update
+    costs one pass over bots and diamonds. The bot itself and its teammates
+    are not tracked.
+    """
+
+    def __init__(self) -> None:
+        self.tracks: Dict[int, OpponentTrack] = {}
+        self.tick = 0
+        self._board = None
+
+    def update(
+        self, board: Board, own_id: Optional[int] = None, teammates: AbstractSet[str] = frozenset()
+    ) -> None:
+        if board is self._board:
+            return
+        self._board = board
+        self.tick += 1
+
+        diamonds = {(gem.position.x, gem.position.y): gem.properties.points for gem in board.diamonds}
+        pairs = teleporter_pairs(board)
+        seen = set()
+        for bot in board.bots:
+            if bot.id == own_id or bot.properties.name in teammates:
+                continue
+            seen.add(bot.id)
+            track = self.tracks.get(bot.id)
+            if track is None:
+                track = self.tracks[bot.id] = self._new_track(bot)
+            track.bounds = (board.width, board.height)
+            self._update_track(track, bot, diamonds, pairs)
+
+        for bot_id in set(self.tracks) - seen:
+            del self.tracks[bot_id]
+
+    @staticmethod
+    def _new_track(bot: GameObject) -> OpponentTrack:
+        props = bot.properties
+        base = (props.base.x, props.base.y) if props.base else None
+        return OpponentTrack(
+            id=bot.id,
+            name=props.name,
+            base=base,
+            position=(bot.position.x, bot.position.y),
+        )
+
+    @staticmethod
+    def _update_track(
+        track: OpponentTrack, bot: GameObject, diamonds: Dict[Cell, int], pairs
+    ) -> None:
+        props = bot.properties
+        previous = track.position
+        current = (bot.position.x, bot.position.y)
+        track.history.append(current)
+        track.position = current
+        track.diamonds = props.diamonds or 0
+        track.inventory_size = props.inventory_size or track.inventory_size
+        track.can_tackle = bool(props.can_tackle)
+        track._predicted = []
+
+        moved = (current[0] - previous[0], current[1] - previous[1])
+        if abs(moved[0]) + abs(moved[1]) == 1:
+            track.heading = moved
+        elif moved != (0, 0):
+            # Teleported or sent home by a tackle, the old heading means nothing
+            track.heading = (0, 0)
+
+        base = track.base
+        track.ticks_to_base = travel_distance(current, base, pairs) if base else 0
+        if base and track.diamonds >= track.inventory_size:
+            track.target = base
+        elif track.heading == (0, 0) or moved == (0, 0):
+            # Nothing new to go on: keep the target while it is still there
+            if track.target != base and track.target not in diamonds:
+                track.target = None
+        else:
+            gem = _approached(previous, current, diamonds)
+            towards_base = (
+                base is not None
+                and track.diamonds > 0
+                and _manhattan(current, base) < _manhattan(previous, base)
+            )
+            if towards_base and (
+                gem is None or _manhattan(current, base) <= _manhattan(current, gem)
+            ):
+                track.target = base
+            else:
+                track.target = gem
+
+    def predicted(self, k: int) -> Dict[int, List[Cell]]:
+        """Expected positions of every opponent for the next k ticks"""
+        return {bot_id: track.predict(k) for bot_id, track in self.tracks.items()}
+
+    def threat_cells(self, k: int) -> Set[Cell]:
+        """Cells a tackling opponent is expected to pass in the next k ticks"""
+        cells = set()
+        for track in self.tracks.values():
+            if track.can_tackle:
+                cells.add(track.position)
+                cells.update(track.predict(k))
+        return cells
+
+    def contested(self, cell: Cell, our_distance: int, margin: int = 0) -> bool:
+        """Whether an opponent heading for cell gets there more than margin ticks before us"""
+        for track in self.tracks.values():
+            if track.target == cell and _manhattan(track.position, cell) + margin < our_distance:
+                return True
+        return False
+
+
+def _manhattan(a: Cell, b: Cell) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def _approached(previous: Cell, current: Cell, diamonds: Dict[Cell, int]) -> Optional[Cell]:
+    """Best diamond by distance per point among those the last move got closer to"""
+    if previous == current:
+        return None
+    best, best_cost = None, None
+    for gem, points in diamonds.items():
+        if _manhattan(current, gem) >= _manhattan(previous, gem):
+            continue
+        cost = _manhattan(current, gem) / points
+        if best_cost is None or cost < best_cost:
+            best, best_cost = gem, cost
+    return best
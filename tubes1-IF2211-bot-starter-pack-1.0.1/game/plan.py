@@ -0,0 +1,117 @@
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from game.models import Board, GameObject, Position
+from game.util import get_direction
+
+Cell = Tuple[int, int]
+
+# Objects that change where a walk ends up when it crosses them
+_DETOUR_TYPES = ("TeleportGameObject", "DiamondButtonGameObject")
+
+
+def object_cells(board: Board, own_id: Optional[int] = None) -> Dict[int, Cell]:
+    """Cell of every object on the board except our own bot"""
+    return {
+        obj.id: (obj.position.x, obj.position.y)
+        for obj in board.game_objects or []
+        if obj.id != own_id
+    }
+
+
+def changed_cells(previous: Dict[int, Cell], current: Dict[int, Cell]) -> Set[Cell]:
+    """Cells an object left or entered between two object_cells snapshots"""
+    cells = set()
+    for obj_id, cell in current.items():
+        before = previous.get(obj_id)
+        if before != cell:
+            cells.add(cell)
+            if before is not None:
+                cells.add(before)
+    for obj_id, cell in previous.items():
+        if obj_id not in current:
+            cells.add(cell)
+    return cells
+
+
+class Plan:
+    """
+    A walk to a goal cell, consumed one step per tick.
+
+    The steps are the ones get_direction would take (along x, then along
+    y). The plan depends on the cells it still has to cross, the goal and
+    the teleporters, and it stays valid while no object enters or leaves
+    any of them: the target diamond vanishing, a teleporter moving or an
+    opponent stepping onto the path all end it. It also ends when the bot
+    is not where the plan left it or its inventory changed, after a tackle
+    say, or when the logic's conditions differ from those it was made on:
+    whatever else the logic decided on, such as the team's reservations or
+    whether it is time to head home. Checking costs one pass over the board
+    objects, whatever the logic's own planning costs.
+    """
+
+    def __init__(
+        self, board: Board, board_bot: GameObject, goal: Cell, conditions: Hashable = None
+    ) -> None:
+        self.goal = goal
+        self.conditions = conditions
+        self.position = (board_bot.position.x, board_bot.position.y)
+        self.diamonds = board_bot.properties.diamonds
+        self.own_id = board_bot.id
+        self.steps: List[Cell] = []
+        self.path: List[Cell] = []
+        x, y = self.position
+        while (x, y) != goal:
+            step = get_direction(x, y, *goal)
+            x, y = x + step[0], y + step[1]
+            self.steps.append(step)
+            self.path.append((x, y))
+        self.steps.reverse()
+        self.path.reverse()
+        self.dependencies = set(self.path)
+        detours = set()
+        for obj in board.game_objects or []:
+            if obj.type == "TeleportGameObject":
+                self.dependencies.add((obj.position.x, obj.position.y))
+            if obj.type in _DETOUR_TYPES:
+                detours.add((obj.position.x, obj.position.y))
+        # Crossing a teleporter or the button on the way is not a plain walk
+        self.crosses_detour = any(cell in detours for cell in self.path[1:])
+        self._objects = object_cells(board, self.own_id)
+
+    @classmethod
+    def toward(
+        cls, board: Board, board_bot: GameObject, goal: Position, conditions: Hashable = None
+    ) -> Optional["Plan"]:
+        """
+        Plan the rest of the walk to goal after the step the logic takes this
+        tick, or None when there is nothing worth keeping
+        """
+        plan = cls(board, board_bot, (goal.x, goal.y), conditions)
+        if len(plan.steps) < 2 or plan.crosses_detour:
+            return None
+        plan._advance()
+        return plan
+
+    def next_step(
+        self, board: Board, board_bot: GameObject, conditions: Hashable = None
+    ) -> Optional[Tuple[int, int]]:
+        """The next step while the plan holds, else None and the caller plans again"""
+        if not self.steps:
+            return None
+        if conditions != self.conditions:
+            return None
+        if (board_bot.position.x, board_bot.position.y) != self.position:
+            return None
+        if board_bot.properties.diamonds != self.diamonds:
+            return None
+        objects = object_cells(board, self.own_id)
+        if not changed_cells(self._objects, objects).isdisjoint(self.dependencies):
+            return None
+        self._objects = objects
+        return self._advance()
+
+    def _advance(self) -> Tuple[int, int]:
+        step = self.steps.pop()
+        self.dependencies.discard(self.position)
+        self.position = self.path.pop()
+        return step
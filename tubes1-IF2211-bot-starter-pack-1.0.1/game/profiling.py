@@ -0,0 +1,163 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+def _module_label(filename: str) -> str:
+    """Turn a source path into a dotted module name relative to the bot directory"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.path.abspath(filename)
+    if path.startswith(root + os.sep):
+        path = path[len(root) + 1 :]
+    else:
+        path = os.path.basename(path)
+    if path.endswith(".py"):
+        path = path[:-3]
+    return path.replace(os.sep, ".")
+
+
+def write_collapsed(stacks: Dict[str, int], path: str) -> None:
+    """Write stacks in the collapsed format read by flamegraph.pl and speedscope"""
+    with open(path, "w") as f:
+        for stack, value in sorted(stacks.items()):
+            if value > 0:
+                f.write("{} {}\n".format(stack, value))
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the call stack of one thread from a background thread.
+
+    Only the sampled thread's frames are walked and labels are cached per code
+    object, so the cost per sample is a handful of dictionary lookups.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None) -> None:
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = "{}:{}".format(_module_label(code.co_filename), code.co_qualname)
+            self._labels[code] = label
+        return label
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def call(self, func: Callable, *args):
+        return func(*args)
+
+    def collapsed(self) -> Dict[str, int]:
+        return dict(self.stacks)
+
+
+class CallProfiler:
+    """
+    Deterministic cProfile limited to the calls made through `call`, usually
+    just `next_move`, so network I/O and sleeping stay out of the profile.
+    """
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def call(self, func: Callable, *args):
+        self.profile.enable()
+        try:
+            return func(*args)
+        finally:
+            self.profile.disable()
+
+    @staticmethod
+    def _label(func) -> str:
+        filename, _, name = func
+        if filename == "~":
+            return name
+        return "{}:{}".format(_module_label(filename), name)
+
+    def collapsed(self) -> Dict[str, int]:
+        """
+        Rebuild call stacks from cProfile's caller/callee edges. Time of a
+        function called from several places is split between its callers in
+        proportion to the cumulative time of each edge. Values are in microseconds.
+        """
+        try:
+            stats = pstats.Stats(self.profile).stats
+        except TypeError:
+            # Nothing was profiled
+            return {}
+
+        callees = {}
+        for func, (_, _, _, _, callers) in stats.items():
+            for caller, edge in callers.items():
+                callees.setdefault(caller, []).append((func, edge[3]))
+
+        roots = [
+            func
+            for func, (_, _, _, _, callers) in stats.items()
+            if not any(caller in stats for caller in callers)
+        ]
+
+        stacks: Counter = Counter()
+
+        def walk(func, path, scale):
+            _, _, own_time, cumulative_time, _ = stats[func]
+            path = path + (func,)
+            label = ";".join(self._label(f) for f in path)
+            stacks[label] += int(own_time * scale * 1e6)
+            for callee, edge_time in callees.get(func, ()):
+                if callee in path or not stats[callee][3]:
+                    continue
+                child_scale = scale * edge_time / stats[callee][3]
+                if child_scale * stats[callee][3] * 1e6 >= 1:
+                    walk(callee, path, child_scale)
+
+        for root in roots:
+            walk(root, (), 1.0)
+        return dict(stacks)
+
+
+def create_profiler(mode: str, interval: float = 0.005):
+    if mode == "sample":
+        return SamplingProfiler(interval)
+    if mode == "cprofile":
+        return CallProfiler()
+    raise ValueError("Unknown profile mode: {}".format(mode))
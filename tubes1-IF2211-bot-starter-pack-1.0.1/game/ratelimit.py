@@ -0,0 +1,69 @@
+import heapq
+import itertools
+import threading
+from time import monotonic
+from typing import List, Tuple
+
+from game.metrics import Metrics, metrics
+
+# Lower goes first: a late move costs a tick, a late board refresh rarely does
+PRIORITY_MOVE = 0
+PRIORITY_BOARD = 1
+PRIORITY_OTHER = 2
+
+
+class RequestScheduler:
+    """
+    Requests-per-second budget shared by every bot of the process.
+
+    A token bucket refilled at rate tokens per second, holding at most
+    burst of them, pays for each request. Requests waiting for a token
+    queue by priority, then in arrival order, so a move never waits behind
+    a board refresh that came later. With the default burst of one,
+    requests that arrive together leave 1 / rate seconds apart instead of
+    hitting the server at once. The time each request spent queued is kept
+    per bot in queue_delays, and in the "queue" phase of the tick metrics.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.interval = 1 / rate
+        self.burst = max(1, burst)
+        self.queue_delays = Metrics(
+            "diamonds_request_queue_seconds",
+            label="bot",
+            description="Time requests waited for the request budget",
+        )
+        self._tokens = float(self.burst)
+        self._updated = monotonic()
+        self._waiting: List[Tuple[int, int]] = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+        self._updated = now
+
+    def acquire(self, priority: int = PRIORITY_OTHER, bot: str = "-") -> float:
+        """
+        Block until this request may be sent
+        :return: seconds spent waiting
+        """
+        start = monotonic()
+        ticket = (priority, next(self._order))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                self._refill(monotonic())
+                if self._waiting[0] == ticket and self._tokens >= 1:
+                    heapq.heappop(self._waiting)
+                    self._tokens -= 1
+                    # The next in line may have a token as well
+                    self._condition.notify_all()
+                    break
+                # Only the head of the queue watches the clock, the rest wait for it
+                timeout = (1 - self._tokens) * self.interval if self._waiting[0] == ticket else None
+                self._condition.wait(timeout)
+        waited = monotonic() - start
+        self.queue_delays.observe(bot, waited)
+        metrics.observe("queue", waited)
+        return waited
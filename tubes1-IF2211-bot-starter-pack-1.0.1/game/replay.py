@@ -0,0 +1,474 @@
+import bisect
+import json
+import mmap
+import struct
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from game.models import Base, Board, Config, Feature, GameObject, Position, Properties
+
+MAGIC = b"DIAR"
+VERSION = 2
+
+OBJECT_TYPES = (
+    "BotGameObject",
+    "BaseGameObject",
+    "DiamondGameObject",
+    "TeleportGameObject",
+    "DiamondButtonGameObject",
+)
+_TYPE_CODES = {name: code for code, name in enumerate(OBJECT_TYPES)}
+
+# id, type, flags, x, y, points, diamonds, inventory_size, score,
+# milliseconds_left, base_x, base_y, then name, pair_id and time_joined as
+# indexes into the StringTable kept beside the records
+OBJECT_RECORD = struct.Struct("<iBBhhhhhiihhiii")
+
+_HEADER = struct.Struct("<4sHH")
+_MATCH = struct.Struct("<iHHiQIQI")
+_TICK = struct.Struct("<QI")
+# magic, start of the segment, match table, tick table, strings offset,
+# strings length, match count, tick count
+_FOOTER = struct.Struct("<4sQQQQIII")
+
+_NONE = -1
+_HAS_PROPERTIES = 1
+_HAS_CAN_TACKLE = 2
+_CAN_TACKLE = 4
+
+
+def _int(value: Optional[int]) -> int:
+    return _NONE if value is None else value
+
+
+def _opt(value: int) -> Optional[int]:
+    return None if value == _NONE else value
+
+
+class StringTable:
+    """
+    Text properties of packed objects, stored once beside the fixed-width
+    records, which refer to them by index. Names of any length survive the
+    round trip, so bots are still found on an unpacked board.
+    """
+
+    def __init__(self, strings: Sequence[str] = ()) -> None:
+        self.strings = list(strings)
+        self._indexes: Dict[str, int] = {text: index for index, text in enumerate(self.strings)}
+
+    def index(self, value: Optional[str]) -> int:
+        if value is None:
+            return _NONE
+        value = str(value)
+        index = self._indexes.get(value)
+        if index is None:
+            index = self._indexes[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def text(self, index: int) -> Optional[str]:
+        return None if index == _NONE else self.strings[index]
+
+    def to_json(self) -> bytes:
+        return json.dumps(self.strings).encode("utf-8")
+
+    @classmethod
+    def from_json(cls, data) -> "StringTable":
+        return cls(json.loads(bytes(data).decode("utf-8")) if len(data) else ())
+
+
+def pack_object(obj: GameObject, strings: StringTable, buffer=None, offset: int = 0) -> Optional[bytes]:
+    """
+    Pack a game object into a fixed-width record
+    :param obj: GameObject
+    :param strings: table the object's text properties are added to
+    :param buffer: writable buffer to pack into, or None to return bytes
+    :param offset: offset into buffer
+    :return: bytes when no buffer is given
+    """
+    if obj.type not in _TYPE_CODES:
+        raise ValueError("Unknown game object type: {}".format(obj.type))
+
+    props = obj.properties
+    flags = 0
+    fields = (_NONE,) * 10
+    if props is not None:
+        flags |= _HAS_PROPERTIES
+        if props.can_tackle is not None:
+            flags |= _HAS_CAN_TACKLE
+            if props.can_tackle:
+                flags |= _CAN_TACKLE
+        base = props.base
+        fields = (
+            _int(props.points),
+            _int(props.diamonds),
+            _int(props.inventory_size),
+            _int(props.score),
+            _int(props.milliseconds_left),
+            _NONE if base is None else base.x,
+            _NONE if base is None else base.y,
+            strings.index(props.name),
+            strings.index(props.pair_id),
+            strings.index(props.time_joined),
+        )
+
+    values = (obj.id, _TYPE_CODES[obj.type], flags, obj.position.x, obj.position.y)
+    if buffer is None:
+        return OBJECT_RECORD.pack(*values, *fields)
+    OBJECT_RECORD.pack_into(buffer, offset, *values, *fields)
+    return None
+
+
+def unpack_object(buffer, strings: StringTable, offset: int = 0) -> GameObject:
+    """
+    Build a game object from a fixed-width record
+    :param buffer: buffer holding the record
+    :param strings: table the record's text properties refer to
+    :param offset: offset of the record in buffer
+    :return: GameObject
+    """
+    return _to_object(OBJECT_RECORD.unpack_from(buffer, offset), strings)
+
+
+def _to_object(values: tuple, strings: StringTable) -> GameObject:
+    (
+        id,
+        type_code,
+        flags,
+        x,
+        y,
+        points,
+        diamonds,
+        inventory_size,
+        score,
+        milliseconds_left,
+        base_x,
+        base_y,
+        name,
+        pair_id,
+        time_joined,
+    ) = values
+
+    properties = None
+    if flags & _HAS_PROPERTIES:
+        properties = Properties(
+            points=_opt(points),
+            pair_id=strings.text(pair_id),
+            diamonds=_opt(diamonds),
+            score=_opt(score),
+            name=strings.text(name),
+            inventory_size=_opt(inventory_size),
+            can_tackle=bool(flags & _CAN_TACKLE) if flags & _HAS_CAN_TACKLE else None,
+            milliseconds_left=_opt(milliseconds_left),
+            time_joined=strings.text(time_joined),
+            base=None if base_x == _NONE else Base(base_y, base_x),
+        )
+    return GameObject(
+        id=id,
+        position=Position(y, x),
+        type=OBJECT_TYPES[type_code],
+        properties=properties,
+    )
+
+
+def features_to_json(features: List[Feature]) -> bytes:
+    return json.dumps([asdict(feature) for feature in features]).encode("utf-8")
+
+
+def features_from_json(data) -> List[Feature]:
+    return [
+        Feature(
+            name=feature["name"],
+            config=Config(**feature["config"]) if feature.get("config") else None,
+        )
+        for feature in json.loads(bytes(data).decode("utf-8"))
+    ]
+
+
+class ReplayWriter:
+    """
+    Append boards to a replay corpus file.
+
+    Every writer appends one segment, so a corpus is the games of every run
+    laid end to end. Segment layout: a header, all object records back to
+    back, then the features of every match, the string table, the match
+    table, the tick index and a fixed-size footer.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "ab")
+        self._start = self._file.tell()
+        self._file.write(_HEADER.pack(MAGIC, VERSION, OBJECT_RECORD.size))
+        self._strings = StringTable()
+        self._records = 0
+        self._matches = []
+        self._ticks = []
+
+    def begin_match(self, board: Board) -> None:
+        self._matches.append((board, len(self._ticks)))
+
+    def add_tick(self, board: Board) -> None:
+        if not self._matches:
+            self.begin_match(board)
+        objects = board.game_objects or []
+        self._file.write(b"".join(pack_object(obj, self._strings) for obj in objects))
+        self._ticks.append((self._records, len(objects)))
+        self._records += len(objects)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+
+        features = []
+        for board, _ in self._matches:
+            blob = features_to_json(board.features)
+            features.append((self._file.tell(), len(blob)))
+            self._file.write(blob)
+
+        strings_offset = self._file.tell()
+        strings = self._strings.to_json()
+        self._file.write(strings)
+
+        match_table = self._file.tell()
+        for index, (board, first_tick) in enumerate(self._matches):
+            if index + 1 < len(self._matches):
+                tick_count = self._matches[index + 1][1] - first_tick
+            else:
+                tick_count = len(self._ticks) - first_tick
+            self._file.write(
+                _MATCH.pack(
+                    board.id,
+                    board.width,
+                    board.height,
+                    board.minimum_delay_between_moves,
+                    first_tick,
+                    tick_count,
+                    *features[index],
+                )
+            )
+
+        tick_table = self._file.tell()
+        for first_record, count in self._ticks:
+            self._file.write(_TICK.pack(first_record, count))
+
+        self._file.write(
+            _FOOTER.pack(
+                MAGIC,
+                self._start,
+                match_table,
+                tick_table,
+                strings_offset,
+                len(strings),
+                len(self._matches),
+                len(self._ticks),
+            )
+        )
+        self._file.close()
+
+    def __enter__(self) -> "ReplayWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass
+class _Segment:
+    start: int
+    match_table: int
+    tick_table: int
+    strings_offset: int
+    strings_length: int
+    match_count: int
+    tick_count: int
+    # Matches and ticks of the segments before this one
+    first_match: int = 0
+    first_tick: int = 0
+
+
+@dataclass
+class ReplayMatch:
+    corpus: "ReplayCorpus"
+    segment: int
+    board_id: int
+    width: int
+    height: int
+    minimum_delay_between_moves: int
+    first_tick: int
+    tick_count: int
+    features_offset: int
+    features_length: int
+
+    def __len__(self) -> int:
+        return self.tick_count
+
+    @property
+    def features(self) -> List[Feature]:
+        start = self.features_offset
+        return features_from_json(self.corpus.view[start : start + self.features_length])
+
+    def records(self, tick: int) -> memoryview:
+        """Raw object records of a tick, without copying"""
+        if not 0 <= tick < self.tick_count:
+            raise IndexError("Tick out of range")
+        return self.corpus.tick_records(self.first_tick + tick)
+
+    def objects(self, tick: int) -> Iterator[GameObject]:
+        strings = self.corpus.strings(self.segment)
+        for values in OBJECT_RECORD.iter_unpack(self.records(tick)):
+            yield _to_object(values, strings)
+
+    def board(self, tick: int, features: Optional[List[Feature]] = None) -> Board:
+        return Board(
+            id=self.board_id,
+            width=self.width,
+            height=self.height,
+            features=self.features if features is None else features,
+            minimum_delay_between_moves=self.minimum_delay_between_moves,
+            game_objects=list(self.objects(tick)),
+        )
+
+    def boards(self) -> Iterator[Board]:
+        features = self.features
+        for tick in range(self.tick_count):
+            yield self.board(tick, features)
+
+
+class ReplayCorpus:
+    """
+    Read-only, memory-mapped view of a replay corpus written by ReplayWriter.
+
+    Nothing is decoded until a match or tick is requested, so a corpus of any
+    size can be streamed with constant memory. Matches and ticks are
+    numbered across all segments of the file. A segment whose writer never
+    got to close(), because its run was killed say, has no footer and is
+    skipped, keeping the segments around it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._mmap)
+        self._strings: Dict[int, StringTable] = {}
+        try:
+            self._segments = self._read_segments()
+        except ValueError as e:
+            self.close()
+            raise ValueError("{}: {}".format(e, path)) from None
+
+        self._match_count = self._tick_count = 0
+        for segment in self._segments:
+            segment.first_match = self._match_count
+            segment.first_tick = self._tick_count
+            self._match_count += segment.match_count
+            self._tick_count += segment.tick_count
+        self._match_starts = [segment.first_match for segment in self._segments]
+        self._tick_starts = [segment.first_tick for segment in self._segments]
+
+    def _read_segments(self) -> List[_Segment]:
+        """Segments of the file, found from its end back to its start"""
+        if len(self.view) and (
+            len(self.view) < _HEADER.size or _HEADER.unpack_from(self.view)[0] != MAGIC
+        ):
+            raise ValueError("Not a replay corpus")
+        segments = []
+        end = len(self.view)
+        while end > 0:
+            segment = self._segment_ending_at(end)
+            if segment is None:
+                end = self._skip_unfinished(end)
+                continue
+            segments.append(segment)
+            end = segment.start
+        segments.reverse()
+        return segments
+
+    def _segment_ending_at(self, end: int) -> Optional[_Segment]:
+        """The segment whose footer ends at end, or None when there is no footer there"""
+        if end < _HEADER.size + _FOOTER.size:
+            return None
+        magic, *fields = _FOOTER.unpack_from(self.view, end - _FOOTER.size)
+        segment = _Segment(*fields)
+        if (
+            magic != MAGIC
+            or not 0 <= segment.start < end
+            or segment.tick_table + segment.tick_count * _TICK.size != end - _FOOTER.size
+        ):
+            return None
+        magic, version, record_size = _HEADER.unpack_from(self.view, segment.start)
+        if magic != MAGIC:
+            return None
+        if version != VERSION or record_size != OBJECT_RECORD.size:
+            raise ValueError("Not a replay corpus")
+        return segment
+
+    def _skip_unfinished(self, end: int) -> int:
+        """End of the last complete segment before an unfinished one ending at end, 0 when there is none"""
+        position = end - _FOOTER.size
+        while position > 0:
+            position = self._mmap.rfind(MAGIC, 0, position)
+            if position < 0:
+                return 0
+            if self._segment_ending_at(position + _FOOTER.size) is not None:
+                return position + _FOOTER.size
+        return 0
+
+    def __len__(self) -> int:
+        return self._match_count
+
+    def __iter__(self) -> Iterator[ReplayMatch]:
+        for index in range(self._match_count):
+            yield self.match(index)
+
+    @property
+    def tick_count(self) -> int:
+        return self._tick_count
+
+    def match(self, index: int) -> ReplayMatch:
+        if not 0 <= index < self._match_count:
+            raise IndexError("Match out of range")
+        number = bisect.bisect_right(self._match_starts, index) - 1
+        segment = self._segments[number]
+        board_id, width, height, minimum_delay, first_tick, *rest = _MATCH.unpack_from(
+            self.view, segment.match_table + (index - segment.first_match) * _MATCH.size
+        )
+        return ReplayMatch(
+            self,
+            number,
+            board_id,
+            width,
+            height,
+            minimum_delay,
+            segment.first_tick + first_tick,
+            *rest
+        )
+
+    def strings(self, segment: int) -> StringTable:
+        """Text properties the records of a segment refer to"""
+        table = self._strings.get(segment)
+        if table is None:
+            found = self._segments[segment]
+            start = found.strings_offset
+            table = self._strings[segment] = StringTable.from_json(
+                self.view[start : start + found.strings_length]
+            )
+        return table
+
+    def tick_records(self, tick: int) -> memoryview:
+        segment = self._segments[bisect.bisect_right(self._tick_starts, tick) - 1]
+        first_record, count = _TICK.unpack_from(
+            self.view, segment.tick_table + (tick - segment.first_tick) * _TICK.size
+        )
+        start = segment.start + _HEADER.size + first_record * OBJECT_RECORD.size
+        return self.view[start : start + count * OBJECT_RECORD.size]
+
+    def close(self) -> None:
+        self.view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "ReplayCorpus":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
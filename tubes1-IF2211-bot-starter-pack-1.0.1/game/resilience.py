@@ -0,0 +1,57 @@
+import random
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Iterator, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit breaker is open"""
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 3
+    base_delay: float = 0.05
+    max_delay: float = 0.4
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def delays(self) -> Iterator[float]:
+        """Full-jitter exponential backoff before each retry"""
+        for attempt in range(self.attempts - 1):
+            yield self.rng.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Stops sending requests after failure_threshold consecutive failures.
+    After reset_timeout seconds a single trial request is let through; its
+    outcome closes the breaker again or keeps it open for another period.
+    """
+
+    failure_threshold: int = 5
+    reset_timeout: float = 5.0
+    failures: int = 0
+    opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if monotonic() - self.opened_at >= self.reset_timeout:
+            # Half-open: let this request through, the next failure reopens
+            self.opened_at = monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = monotonic()
@@ -0,0 +1,282 @@
+import heapq
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from game.board_handler import BoardHandler
+from game.bot_handler import BotHandler
+from game.clock import MoveTimer
+from game.log import PER_TICK, get_logger, set_bot
+from game.logic.base import BaseLogic
+from game.metrics import metrics
+from game.models import Board, Bot, GameObject
+from game.offload import OffloadedLogic
+from game.replay import ReplayWriter
+from game.team import heading_home
+
+log = get_logger("runner")
+
+# Ticks in a row without a fresh board before the bot gives up on the server
+MAX_STALE_TICKS = 30
+# Seconds between two moves of one bot, unless they are timed by the server
+TICK_DELAY = 1
+
+
+def board_identity(name: str, email: str, board_id: int) -> Tuple[str, str]:
+    """
+    Name and email of the bot playing on board_id when one process plays on
+    several boards: a bot can only be on one board at a time
+    """
+    local, _, domain = (email or "").partition("@")
+    email = "{}+{}@{}".format(local, board_id, domain) if domain else email
+    return "{}{}".format(name, board_id) if name else name, email
+
+
+class BoardLoop:
+    """
+    The game loop of one bot on one board, driven a step at a time.
+
+    step() plays one tick: decide, send the move, read the new board. It
+    returns the seconds to wait before the next step, or None once the game
+    is over for this bot or the server stopped answering.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        board_id: int,
+        logic: BaseLogic,
+        board_handler: BoardHandler,
+        bot_handler: BotHandler,
+        recorder: Optional[ReplayWriter] = None,
+        team=None,
+        profiler=None,
+        server_timing: bool = False,
+        time_factor: int = 1,
+    ) -> None:
+        self.bot = bot
+        self.board_id = board_id
+        self.logic = logic
+        self.board_handler = board_handler
+        self.bot_handler = bot_handler
+        self.recorder = recorder
+        self.team = team
+        self.profiler = profiler
+        self.decide_seconds = 0.0
+        self.stale_ticks = 0
+        # Moves the server accepted
+        self.moves = 0
+        self.board: Board = board_handler.get_board(board_id)
+        self.timer = (
+            MoveTimer(self.board.minimum_delay_between_moves / 1000, time_factor)
+            if server_timing
+            else None
+        )
+        if recorder:
+            recorder.begin_match(self.board)
+
+    def resync_board(self) -> None:
+        """Fetch the board again after a failed or rejected move, keeping the stale one if that fails too"""
+        try:
+            fresh_board = self.board_handler.get_board(self.board_id)
+        except Exception as e:
+            log.warning("Resync failed: %s", e, extra=PER_TICK)
+            fresh_board = None
+        if fresh_board:
+            self.stale_ticks = 0
+            self.board = fresh_board
+        else:
+            self.stale_ticks += 1
+
+    def _delay(self) -> float:
+        if self.timer:
+            # Wake up in time to decide before the move may leave
+            return self.timer.delay(self.decide_seconds)
+        return TICK_DELAY
+
+    def _update_team(self, board_bot: GameObject, board: Board) -> None:
+        if not self.team:
+            return
+        logic = self.logic
+        with metrics.timer("team"):
+            logic.assigned_target, logic.reserved_targets = self.team.targets(
+                self.bot.name, board, heading_home(logic, board_bot)
+            )
+            logic.teammates = self.team.teammates(self.bot.name)
+
+    def step(self) -> Optional[float]:
+        set_bot(self.bot.name)
+        if self.stale_ticks >= MAX_STALE_TICKS:
+            log.error("No board update for %s ticks, giving up", self.stale_ticks)
+            return None
+
+        board = self.board
+        if self.recorder and not self.stale_ticks:
+            self.recorder.add_tick(board)
+
+        # Find our info among the bots on the board
+        board_bot = board.get_bot(self.bot)
+        if not board_bot:
+            # Managed to get game over
+            return None
+
+        logic = self.logic
+        if self.timer:
+            self.timer.refresh(board_bot)
+            logic.tick_milliseconds = self.timer.tick_milliseconds(logic.tick_milliseconds)
+        self._update_team(board_bot, board)
+
+        # Calculate next move
+        decide_start = monotonic()
+        with metrics.timer("next_move"):
+            if self.profiler:
+                delta_x, delta_y = self.profiler.call(logic.next_move, board_bot, board)
+            else:
+                delta_x, delta_y = logic.next_move(board_bot, board)
+        self.decide_seconds = monotonic() - decide_start
+        if not board.is_valid_move(board_bot.position, delta_x, delta_y):
+            log.warning(
+                "Invalid move will be ignored. Your move: (%s, %s). Your position: (%s, %s)",
+                delta_x,
+                delta_y,
+                board_bot.position.x,
+                board_bot.position.y,
+                extra=PER_TICK,
+            )
+            # The logic may have decided on an outdated board, so plan again on a fresh one
+            self.resync_board()
+            return self._delay()
+
+        if self.timer:
+            self.timer.wait()
+        sent = monotonic()
+        try:
+            # Try to perform move
+            new_board = self.bot_handler.move(self.bot.id, self.board_id, delta_x, delta_y)
+        except Exception as e:
+            log.warning("Move failed: %s", e, extra=PER_TICK)
+            new_board = None
+        if self.timer:
+            self.timer.record(
+                sent, monotonic(), new_board.get_bot(self.bot) if new_board else None, bool(new_board)
+            )
+
+        if new_board:
+            self.board_handler.share_board(new_board)
+            self.board = new_board
+            self.stale_ticks = 0
+            self.moves += 1
+        else:
+            # Rejected or failed move, read new board state
+            self.resync_board()
+
+        # Get new state
+        board_bot = self.board.get_bot(self.bot)
+        if not board_bot:
+            # Managed to get game over after move
+            return None
+
+        if isinstance(logic, OffloadedLogic):
+            # Plan on the new board while this bot waits, with the team
+            # targets of that board rather than of the one just played
+            self._update_team(board_bot, self.board)
+            logic.submit(board_bot, self.board)
+
+        # Don't spam the board more than it allows!
+        return self._delay()
+
+    def close(self) -> None:
+        if self.recorder:
+            self.recorder.close()
+        if self.board_handler.snapshots:
+            self.board_handler.snapshots.close()
+        close = getattr(self.logic, "close", None)
+        if close:
+            close()
+
+
+class Scheduler:
+    """
+    Runs the board loops of one process, each step at the time the previous
+    one asked for.
+
+    A single loop runs on the calling thread, exactly like the plain game
+    loop. Several loops share one pool of threads: the scheduler keeps them
+    in a heap by due time, starts every due step on the pool and then waits
+    for whichever comes first, the next due time or a step finishing. The
+    threads mostly wait on the network, so a board costs its decision time
+    and one pooled connection, not a process of its own. The loops start
+    evenly spread over `spread` seconds, so bots moving once a tick do not
+    all send their requests at the same moment.
+    """
+
+    def __init__(self, workers: Optional[int] = None, spread: float = TICK_DELAY) -> None:
+        self.workers = workers
+        self.spread = spread
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        """Let the steps under way finish and start no more, from any thread"""
+        self._stopped.set()
+
+    def run(
+        self,
+        loops: Sequence[BoardLoop],
+        on_step: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Step every loop until all of them are over
+        :param on_step: called on the calling thread after every step
+        """
+        if len(loops) == 1:
+            self._run_inline(loops[0], on_step)
+        elif loops:
+            self._run_pooled(loops, on_step)
+
+    def _run_inline(self, loop: BoardLoop, on_step: Optional[Callable[[], None]]) -> None:
+        while not self._stopped.is_set():
+            delay = loop.step()
+            if on_step:
+                on_step()
+            if delay is None:
+                return
+            with metrics.timer("sleep"):
+                self._stopped.wait(delay)
+
+    def _run_pooled(
+        self, loops: Sequence[BoardLoop], on_step: Optional[Callable[[], None]]
+    ) -> None:
+        now = monotonic()
+        # Due time, then the loop's index so ties never compare loops
+        due: List[Tuple[float, int, BoardLoop]] = [
+            (now + self.spread * index / len(loops), index, loop)
+            for index, loop in enumerate(loops)
+        ]
+        running: Dict[Future, Tuple[int, BoardLoop]] = {}
+        with ThreadPoolExecutor(
+            max_workers=self.workers or len(loops), thread_name_prefix="board"
+        ) as pool:
+            while due or running:
+                if self._stopped.is_set():
+                    due.clear()
+                now = monotonic()
+                while due and due[0][0] <= now:
+                    _, index, loop = heapq.heappop(due)
+                    running[pool.submit(loop.step)] = (index, loop)
+                timeout = max(0.0, due[0][0] - monotonic()) if due else None
+                if not running:
+                    self._stopped.wait(timeout)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, loop = running.pop(future)
+                    try:
+                        delay = future.result()
+                    except Exception:
+                        log.exception("Board %s stopped", loop.board_id)
+                        delay = None
+                    if on_step:
+                        on_step()
+                    if delay is not None and not self._stopped.is_set():
+                        heapq.heappush(due, (monotonic() + delay, index, loop))
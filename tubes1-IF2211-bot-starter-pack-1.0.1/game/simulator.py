@@ -0,0 +1,335 @@
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from game.logic.base import BaseLogic
+from game.models import Base, Board, Config, Feature, GameObject, Position, Properties
+from game.spawns import SpawnModel
+from game.team import TeamCoordinator, heading_home
+from game.util import DIRECTIONS, is_legal_move
+
+
+@dataclass
+class SimulatorConfig:
+    width: int = 15
+    height: int = 15
+    seconds: int = 60
+    inventory_size: int = 5
+    generation_ratio: float = 0.1
+    min_ratio_for_generation: float = 0.01
+    red_ratio: float = 0.2
+    pairs: int = 1
+    can_tackle: bool = True
+    minimum_delay_between_moves: int = 100
+    # Game time that passes per tick, matching TICK_DELAY in game/runner.py
+    tick_milliseconds: int = 1000
+
+
+@dataclass
+class SimulatedBot:
+    name: str
+    logic: BaseLogic
+    id: int
+    position: Position
+    base: Position
+    diamonds: int = 0
+    score: int = 0
+    # Exceptions raised by the bot's logic
+    errors: int = 0
+
+
+@dataclass
+class SimulatedGame:
+    bots: List[SimulatedBot]
+    diamonds: Dict[Tuple[int, int], int] = field(default_factory=dict)
+    diamond_ids: Dict[Tuple[int, int], int] = field(default_factory=dict)
+    teleporters: List[Tuple[int, int]] = field(default_factory=list)
+    button: Optional[Tuple[int, int]] = None
+    milliseconds_left: int = 0
+    # Spawn model shared by the logics of this game
+    spawns: Optional[SpawnModel] = None
+
+
+class Simulator:
+    """
+    Local, in-process stand-in for the game engine.
+
+    Implements the rules the bundled logics depend on: one-cell moves,
+    diamond pickup up to the inventory size, depositing at the own base,
+    teleporter pairs, the diamond button, tackling and diamond regeneration.
+    Logics receive the same Board/GameObject models as from the real API.
+
+    A logic raising an exception loses its move, like a failed request
+    would, and the exception is counted in errors(). With strict it is
+    raised instead, so a crash cannot pass for a low score.
+
+    The logics of a game share one spawn model: spawns, or a fresh one in
+    memory for every game when None, so no file and no earlier game changes
+    the result of a seed.
+    """
+
+    def __init__(
+        self,
+        logics: List[Tuple[str, BaseLogic]],
+        config: Optional[SimulatorConfig] = None,
+        seed: Optional[int] = None,
+        team: Optional[TeamCoordinator] = None,
+        board_id: int = 1,
+        strict: bool = False,
+        spawns: Optional[SpawnModel] = None,
+    ) -> None:
+        self.logics = logics
+        self.strict = strict
+        self.spawns = spawns
+        self.team = team
+        self.board_id = board_id
+        self.config = config or SimulatorConfig()
+        self.random = random.Random(seed)
+        self.game: Optional[SimulatedGame] = None
+        self._next_id = 1
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _free_cell(self, occupied) -> Tuple[int, int]:
+        while True:
+            cell = (
+                self.random.randrange(self.config.width),
+                self.random.randrange(self.config.height),
+            )
+            if cell not in occupied:
+                return cell
+
+    def _occupied(self) -> set:
+        occupied = set(self.game.diamonds)
+        occupied.update(self.game.teleporters)
+        occupied.update((bot.base.x, bot.base.y) for bot in self.game.bots)
+        occupied.update((bot.position.x, bot.position.y) for bot in self.game.bots)
+        if self.game.button:
+            occupied.add(self.game.button)
+        return occupied
+
+    def _generate_diamonds(self) -> None:
+        self.game.diamonds.clear()
+        self.game.diamond_ids.clear()
+        occupied = self._occupied()
+        target = int(self.config.width * self.config.height * self.config.generation_ratio)
+        for _ in range(target):
+            cell = self._free_cell(occupied)
+            occupied.add(cell)
+            self.game.diamonds[cell] = 2 if self.random.random() < self.config.red_ratio else 1
+            self.game.diamond_ids[cell] = self._new_id()
+
+    def _maybe_regenerate(self) -> None:
+        area = self.config.width * self.config.height
+        if len(self.game.diamonds) < max(1, area * self.config.min_ratio_for_generation):
+            self._generate_diamonds()
+
+    def reset(self) -> None:
+        self._next_id = 1
+        self.game = SimulatedGame(
+            bots=[],
+            milliseconds_left=self.config.seconds * 1000,
+            spawns=self.spawns if self.spawns is not None else SpawnModel(),
+        )
+        occupied = set()
+        for name, logic in self.logics:
+            logic.spawns = self.game.spawns
+            x, y = self._free_cell(occupied)
+            occupied.add((x, y))
+            self.game.bots.append(
+                SimulatedBot(
+                    name=name,
+                    logic=logic,
+                    id=self._new_id(),
+                    position=Position(y, x),
+                    base=Position(y, x),
+                )
+            )
+        for _ in range(self.config.pairs * 2):
+            cell = self._free_cell(occupied)
+            occupied.add(cell)
+            self.game.teleporters.append(cell)
+        self.game.button = self._free_cell(occupied)
+        self._generate_diamonds()
+
+    def board(self) -> Board:
+        game = self.game
+        objects = []
+        for bot in game.bots:
+            objects.append(
+                GameObject(
+                    id=bot.id,
+                    position=Position(bot.position.y, bot.position.x),
+                    type="BotGameObject",
+                    properties=Properties(
+                        diamonds=bot.diamonds,
+                        score=bot.score,
+                        name=bot.name,
+                        inventory_size=self.config.inventory_size,
+                        can_tackle=self.config.can_tackle,
+                        milliseconds_left=game.milliseconds_left,
+                        base=Base(bot.base.y, bot.base.x),
+                    ),
+                )
+            )
+            objects.append(
+                GameObject(
+                    id=bot.id + 100000,
+                    position=Position(bot.base.y, bot.base.x),
+                    type="BaseGameObject",
+                    properties=Properties(name=bot.name),
+                )
+            )
+        for (x, y), points in game.diamonds.items():
+            objects.append(
+                GameObject(
+                    id=game.diamond_ids[(x, y)],
+                    position=Position(y, x),
+                    type="DiamondGameObject",
+                    properties=Properties(points=points),
+                )
+            )
+        for index, (x, y) in enumerate(game.teleporters):
+            objects.append(
+                GameObject(
+                    id=200000 + index,
+                    position=Position(y, x),
+                    type="TeleportGameObject",
+                    properties=Properties(pair_id=str(index // 2)),
+                )
+            )
+        if game.button:
+            objects.append(
+                GameObject(
+                    id=300000,
+                    position=Position(game.button[1], game.button[0]),
+                    type="DiamondButtonGameObject",
+                    properties=Properties(),
+                )
+            )
+        return Board(
+            id=self.board_id,
+            width=self.config.width,
+            height=self.config.height,
+            features=[
+                Feature(name="DiamondButtonProvider"),
+                Feature(
+                    name="TeleportProvider", config=Config(pairs=self.config.pairs)
+                ),
+                Feature(
+                    name="DiamondProvider",
+                    config=Config(
+                        generation_ratio=self.config.generation_ratio,
+                        min_ratio_for_generation=self.config.min_ratio_for_generation,
+                        red_ratio=self.config.red_ratio,
+                    ),
+                ),
+                Feature(
+                    name="BotProvider",
+                    config=Config(
+                        inventory_size=self.config.inventory_size,
+                        can_tackle=self.config.can_tackle,
+                    ),
+                ),
+            ],
+            minimum_delay_between_moves=self.config.minimum_delay_between_moves,
+            game_objects=objects,
+        )
+
+    def _enter(self, bot: SimulatedBot) -> None:
+        """Resolve what happens when a bot enters its new cell"""
+        game = self.game
+        cell = (bot.position.x, bot.position.y)
+
+        if cell in game.teleporters:
+            index = game.teleporters.index(cell)
+            x, y = game.teleporters[index ^ 1]
+            bot.position = Position(y, x)
+            cell = (x, y)
+
+        for other in game.bots:
+            if other is not bot and (other.position.x, other.position.y) == cell:
+                if not self.config.can_tackle:
+                    continue
+                bot.diamonds = min(
+                    self.config.inventory_size, bot.diamonds + other.diamonds
+                )
+                other.diamonds = 0
+                other.position = Position(other.base.y, other.base.x)
+
+        points = game.diamonds.get(cell)
+        if points and bot.diamonds + points <= self.config.inventory_size:
+            bot.diamonds += points
+            del game.diamonds[cell]
+            del game.diamond_ids[cell]
+            self._maybe_regenerate()
+
+        if cell == game.button:
+            self._generate_diamonds()
+            game.button = self._free_cell(self._occupied())
+
+        if (bot.base.x, bot.base.y) == cell:
+            bot.score += bot.diamonds
+            bot.diamonds = 0
+
+    def add_bot(self, name: str, logic: Optional[BaseLogic] = None) -> SimulatedBot:
+        """Put a bot on a free cell of the running game, with its base there"""
+        if logic is not None:
+            logic.spawns = self.game.spawns
+        x, y = self._free_cell(self._occupied())
+        bot = SimulatedBot(
+            name=name, logic=logic, id=self._new_id(), position=Position(y, x), base=Position(y, x)
+        )
+        self.game.bots.append(bot)
+        return bot
+
+    def remove_bot(self, bot: SimulatedBot) -> None:
+        self.game.bots.remove(bot)
+
+    def move_bot(self, bot: SimulatedBot, delta_x: int, delta_y: int) -> bool:
+        """Apply one move of bot, False when it is not a legal move"""
+        x, y = bot.position.x + delta_x, bot.position.y + delta_y
+        if (delta_x, delta_y) not in DIRECTIONS:
+            return False
+        if not (0 <= x < self.config.width and 0 <= y < self.config.height):
+            return False
+        bot.position = Position(y, x)
+        self._enter(bot)
+        return True
+
+    def step(self) -> None:
+        order = list(self.game.bots)
+        self.random.shuffle(order)
+        for bot in order:
+            board = self.board()
+            board_bot = next(b for b in board.bots if b.id == bot.id)
+            if self.team and bot.name in self.team.members:
+                bot.logic.assigned_target, bot.logic.reserved_targets = self.team.targets(
+                    bot.name, board, heading_home(bot.logic, board_bot)
+                )
+                bot.logic.teammates = self.team.teammates(bot.name)
+            try:
+                delta_x, delta_y = bot.logic.next_move(board_bot, board)
+            except Exception:
+                if self.strict:
+                    raise
+                bot.errors += 1
+                continue
+            if not is_legal_move(board, bot.position, delta_x, delta_y):
+                continue
+            bot.position = Position(bot.position.y + delta_y, bot.position.x + delta_x)
+            self._enter(bot)
+        self.game.milliseconds_left -= self.config.tick_milliseconds
+
+    def run(self) -> Dict[str, int]:
+        self.reset()
+        while self.game.milliseconds_left > 0:
+            self.step()
+        return {bot.name: bot.score for bot in self.game.bots}
+
+    def errors(self) -> Dict[str, int]:
+        """Exceptions raised by the logic of every bot that raised any"""
+        return {bot.name: bot.errors for bot in self.game.bots if bot.errors}
+
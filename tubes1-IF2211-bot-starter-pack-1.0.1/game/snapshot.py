@@ -0,0 +1,273 @@
+import hashlib
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from time import monotonic, sleep, time
+from typing import Optional
+
+from game.log import get_logger
+from game.models import Board
+from game.replay import (
+    OBJECT_RECORD,
+    StringTable,
+    features_from_json,
+    features_to_json,
+    pack_object,
+    unpack_object,
+)
+
+MAGIC = b"DIAS"
+VERSION = 2
+MAX_OBJECTS = 1024
+FEATURES_CAPACITY = 4096
+STRINGS_CAPACITY = 16384
+
+# magic, version, record size, then the sequence counter at a fixed offset
+_HEADER = struct.Struct("<4sHH")
+_SEQUENCE = struct.Struct("<Q")
+_SEQUENCE_OFFSET = _HEADER.size
+# published at, board id, width, height, minimum delay, object count,
+# features length, strings length
+_META = struct.Struct("<diHHiIII")
+_META_OFFSET = _SEQUENCE_OFFSET + _SEQUENCE.size
+_FEATURES_OFFSET = _META_OFFSET + _META.size
+_STRINGS_OFFSET = _FEATURES_OFFSET + FEATURES_CAPACITY
+_RECORDS_OFFSET = _STRINGS_OFFSET + STRINGS_CAPACITY
+SEGMENT_SIZE = _RECORDS_OFFSET + MAX_OBJECTS * OBJECT_RECORD.size
+
+_READ_ATTEMPTS = 8
+# Seconds a process whose snapshots failed waits before sharing boards again
+RETRY_SECONDS = 10.0
+
+log = get_logger("snapshot")
+
+
+def segment_name(host: str, board_id: int) -> str:
+    # Short enough for every platform's shared memory name limit
+    key = hashlib.sha1("{}\n{}".format(host, board_id).encode("utf-8")).hexdigest()
+    return "diamonds_{}".format(key[:16])
+
+
+def attach_segment(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # Before Python 3.13 attaching also registers the segment for cleanup,
+    # which would unlink it under the writer when this process exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SnapshotWriter:
+    """
+    Single writer of a board snapshot segment.
+
+    Writes are guarded by a sequence counter (a seqlock): it is odd while a
+    write is in progress and even once the snapshot is complete, so readers
+    never need a lock shared between processes.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+        self.sequence = 0
+        self.unlinked = False
+        self._features = None
+        self._features_blob = b""
+        _HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, OBJECT_RECORD.size)
+
+    def publish(self, board: Board) -> None:
+        """
+        Publish board as the latest snapshot
+        :raises ValueError: when the board does not fit in the segment
+        """
+        objects = board.game_objects or []
+        if len(objects) > MAX_OBJECTS:
+            raise ValueError("{} objects do not fit in a snapshot".format(len(objects)))
+        if board.features != self._features:
+            blob = features_to_json(board.features)
+            if len(blob) > FEATURES_CAPACITY:
+                raise ValueError("Board features do not fit in a snapshot")
+            self._features = board.features
+            self._features_blob = blob
+        strings = StringTable()
+        records = b"".join(pack_object(obj, strings) for obj in objects)
+        strings_blob = strings.to_json()
+        if len(strings_blob) > STRINGS_CAPACITY:
+            raise ValueError("Names on the board do not fit in a snapshot")
+
+        buf = self.shm.buf
+        self.sequence += 1
+        _SEQUENCE.pack_into(buf, _SEQUENCE_OFFSET, self.sequence)
+        _META.pack_into(
+            buf,
+            _META_OFFSET,
+            time(),
+            board.id,
+            board.width,
+            board.height,
+            board.minimum_delay_between_moves,
+            len(objects),
+            len(self._features_blob),
+            len(strings_blob),
+        )
+        buf[_FEATURES_OFFSET : _FEATURES_OFFSET + len(self._features_blob)] = self._features_blob
+        buf[_STRINGS_OFFSET : _STRINGS_OFFSET + len(strings_blob)] = strings_blob
+        buf[_RECORDS_OFFSET : _RECORDS_OFFSET + len(records)] = records
+        self.sequence += 1
+        _SEQUENCE.pack_into(buf, _SEQUENCE_OFFSET, self.sequence)
+
+    def unlink(self) -> None:
+        """Free the segment's name, so another process can create it again"""
+        if not self.unlinked:
+            self.unlinked = True
+            self.shm.unlink()
+
+    def close(self) -> None:
+        self.shm.close()
+        self.unlink()
+
+
+class SnapshotReader:
+    """Lock-free reader of a segment published by a SnapshotWriter"""
+
+    def __init__(self, shm: shared_memory.SharedMemory) -> None:
+        self.shm = shm
+        self._features_blob = None
+        self._features = None
+
+    def read(self, max_age: float) -> Optional[Board]:
+        """
+        Latest board, or None when nothing recent enough has been published
+        :param max_age: maximum snapshot age in seconds
+        :return: Board
+        """
+        buf = self.shm.buf
+        if _HEADER.unpack_from(buf, 0) != (MAGIC, VERSION, OBJECT_RECORD.size):
+            return None
+
+        for _ in range(_READ_ATTEMPTS):
+            sequence = _SEQUENCE.unpack_from(buf, _SEQUENCE_OFFSET)[0]
+            if sequence == 0 or sequence % 2:
+                sleep(0)
+                continue
+
+            (
+                published_at,
+                board_id,
+                width,
+                height,
+                minimum_delay,
+                count,
+                features_length,
+                strings_length,
+            ) = _META.unpack_from(buf, _META_OFFSET)
+            count = min(count, MAX_OBJECTS)
+            features_length = min(features_length, FEATURES_CAPACITY)
+            strings_length = min(strings_length, STRINGS_CAPACITY)
+            features_blob = bytes(buf[_FEATURES_OFFSET : _FEATURES_OFFSET + features_length])
+            strings_blob = bytes(buf[_STRINGS_OFFSET : _STRINGS_OFFSET + strings_length])
+            records = bytes(buf[_RECORDS_OFFSET : _RECORDS_OFFSET + count * OBJECT_RECORD.size])
+            if _SEQUENCE.unpack_from(buf, _SEQUENCE_OFFSET)[0] != sequence:
+                # The writer started another snapshot while we were copying
+                continue
+
+            if time() - published_at > max_age:
+                return None
+            if features_blob != self._features_blob:
+                self._features = features_from_json(features_blob)
+                self._features_blob = features_blob
+            strings = StringTable.from_json(strings_blob)
+            return Board(
+                id=board_id,
+                width=width,
+                height=height,
+                features=self._features,
+                minimum_delay_between_moves=minimum_delay,
+                game_objects=[
+                    unpack_object(records, strings, offset)
+                    for offset in range(0, len(records), OBJECT_RECORD.size)
+                ],
+            )
+        return None
+
+    def close(self) -> None:
+        self.shm.close()
+
+
+class BoardSnapshots:
+    """
+    Board snapshots shared by every bot process on this host playing the same
+    board. The first process to start becomes the writer: it publishes the
+    boards it receives anyway, with its moves or when it fetches one itself,
+    so sharing costs no extra requests. The others read the shared segment
+    instead of fetching a board, and fetch it themselves only when the
+    snapshot is stale. When the writer goes away its snapshot turns stale and
+    the next reader takes over. A writer that cannot publish a board gives
+    the segment up the same way, and only shares boards again after
+    RETRY_SECONDS.
+    """
+
+    def __init__(self, host: str, board_id: int, max_age: float = 1.0) -> None:
+        self.name = segment_name(host, board_id)
+        self.board_id = board_id
+        self.max_age = max_age
+        self.writer: Optional[SnapshotWriter] = None
+        self.reader: Optional[SnapshotReader] = None
+        self._retry_at = 0.0
+        self._attach()
+
+    def _attach(self) -> None:
+        try:
+            self.writer = SnapshotWriter(self.name)
+        except FileExistsError:
+            try:
+                self.reader = SnapshotReader(attach_segment(self.name))
+            except FileNotFoundError:
+                # The writer exited between both calls
+                self.writer = SnapshotWriter(self.name)
+
+    @property
+    def is_writer(self) -> bool:
+        return self.writer is not None
+
+    def publish(self, board: Board) -> None:
+        """Share a board this process received, if it is the writer"""
+        if not self.writer:
+            return
+        try:
+            self.writer.publish(board)
+        except Exception:
+            log.exception("Cannot publish a snapshot of board %s, giving it up", self.board_id)
+            # Readers see the snapshot go stale and one of them takes over
+            self._give_up()
+
+    def get(self) -> Optional[Board]:
+        """Latest shared board, or None when the caller should fetch it itself"""
+        if self.writer is None and self.reader is None:
+            if monotonic() < self._retry_at:
+                return None
+            self._attach()
+        if self.writer:
+            # The writer fetches its boards itself and shares them
+            return None
+        board = self.reader.read(self.max_age)
+        if board is None:
+            self._take_over()
+        return board
+
+    def _take_over(self) -> None:
+        # A stale segment whose name was unlinked means the writer is gone
+        try:
+            attach_segment(self.name).close()
+        except FileNotFoundError:
+            self.reader.close()
+            self.reader = None
+            self._attach()
+
+    def _give_up(self) -> None:
+        self.writer.close()
+        self.writer = None
+        self._retry_at = monotonic() + RETRY_SECONDS
+
+    def close(self) -> None:
+        if self.writer:
+            self.writer.close()
+        elif self.reader:
+            self.reader.close()
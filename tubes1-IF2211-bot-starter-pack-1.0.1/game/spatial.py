@@ -0,0 +1,140 @@
+import heapq
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from game.models import Board, GameObject
+
+Cell = Tuple[int, int]
+
+# Red diamonds are the most valuable ones
+MAX_POINTS = 2
+
+
+class DiamondIndex:
+    """
+    Diamonds bucketed by position on a grid of cell_size x cell_size
+    blocks, for nearest-diamond queries that do not scan the whole board.
+
+    update() applies the difference with the previous board: diamonds that
+    vanished or moved leave their bucket, new ones join theirs. Queries
+    walk the buckets in square rings around the origin's bucket. Every
+    diamond outside the first r rings is more than r * cell_size steps away,
+    so the walk stops as soon as nothing further out can matter.
+    """
+
+    def __init__(self, cell_size: int = 4) -> None:
+        self.cell_size = cell_size
+        self.buckets: Dict[Cell, Dict[int, GameObject]] = {}
+        self._cells: Dict[int, Cell] = {}
+        self._rings = 0
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def _bucket(self, cell: Cell) -> Cell:
+        return (cell[0] // self.cell_size, cell[1] // self.cell_size)
+
+    def update(self, board: Board) -> None:
+        current = {}
+        for gem in board.diamonds:
+            cell = (gem.position.x, gem.position.y)
+            current[gem.id] = cell
+            if self._cells.get(gem.id) != cell:
+                self._remove(gem.id)
+                self.buckets.setdefault(self._bucket(cell), {})[gem.id] = gem
+        for gem_id in [gem_id for gem_id in self._cells if gem_id not in current]:
+            self._remove(gem_id)
+        self._cells = current
+        self._rings = max(
+            (board.width + self.cell_size - 1) // self.cell_size,
+            (board.height + self.cell_size - 1) // self.cell_size,
+        )
+
+    def _remove(self, gem_id: int) -> None:
+        cell = self._cells.get(gem_id)
+        if cell is None:
+            return
+        key = self._bucket(cell)
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            bucket.pop(gem_id, None)
+            if not bucket:
+                del self.buckets[key]
+
+    def nearby(self, origin: Cell) -> Iterator[Tuple[int, GameObject]]:
+        """Diamonds with their distance from origin, nearest first"""
+        center_x, center_y = self._bucket(origin)
+        heap: List[Tuple[int, int, GameObject]] = []
+        for ring in range(self._rings + 1):
+            for key in self._ring(center_x, center_y, ring):
+                for gem_id, gem in self.buckets.get(key, {}).items():
+                    distance = abs(gem.position.x - origin[0]) + abs(gem.position.y - origin[1])
+                    heapq.heappush(heap, (distance, gem_id, gem))
+            # Diamonds beyond this ring are further away than this
+            reach = ring * self.cell_size
+            while heap and heap[0][0] <= reach:
+                distance, _, gem = heapq.heappop(heap)
+                yield distance, gem
+        while heap:
+            distance, _, gem = heapq.heappop(heap)
+            yield distance, gem
+
+    @staticmethod
+    def _ring(center_x: int, center_y: int, ring: int) -> Iterator[Cell]:
+        if ring == 0:
+            yield (center_x, center_y)
+            return
+        for x in range(center_x - ring, center_x + ring + 1):
+            yield (x, center_y - ring)
+            yield (x, center_y + ring)
+        for y in range(center_y - ring + 1, center_y + ring):
+            yield (center_x - ring, y)
+            yield (center_x + ring, y)
+
+    def k_nearest(
+        self,
+        origin: Cell,
+        k: int,
+        predicate: Optional[Callable[[GameObject], bool]] = None,
+    ) -> List[Tuple[int, GameObject]]:
+        """The k diamonds closest to origin that satisfy predicate"""
+        found = []
+        if k <= 0:
+            return found
+        for distance, gem in self.nearby(origin):
+            if predicate is None or predicate(gem):
+                found.append((distance, gem))
+                if len(found) == k:
+                    break
+        return found
+
+    def within(self, origin: Cell, radius: int) -> List[Tuple[int, GameObject]]:
+        """Diamonds at most radius steps from origin, nearest first"""
+        found = []
+        for distance, gem in self.nearby(origin):
+            if distance > radius:
+                break
+            found.append((distance, gem))
+        return found
+
+    def best(
+        self,
+        origin: Cell,
+        score: Callable[[int, GameObject], Optional[float]],
+        bound: Callable[[int], float],
+    ) -> Tuple[float, Optional[GameObject]]:
+        """
+        Highest scoring diamond, like a scan over every diamond keeping the
+        first strictly better one
+        :param score: score of a diamond at a distance from origin, None to skip it
+        :param bound: highest score any diamond at a distance can get, not
+            increasing with the distance
+        :return: best score (0 when nothing scores) and its diamond
+        """
+        best_score, best_gem = 0, None
+        for distance, gem in self.nearby(origin):
+            if best_gem is not None and bound(distance) <= best_score:
+                break
+            value = score(distance, gem)
+            if value is not None and value > best_score:
+                best_score, best_gem = value, gem
+        return best_score, best_gem
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; saves then merge without a lock
+    fcntl = None
+
+from game.models import Board, Position
+
+SPAWNS_FILE = os.environ.get("DIAMONDS_SPAWNS_FILE", "spawns.json")
+
+Cell = Tuple[int, int]
+
+# Pseudo-count of every cell, so an unseen board starts out uniform
+PRIOR = 1.0
+# Halve every count once the spawns seen outweigh this many, so the grid
+# follows a board whose provider changes
+MAX_WEIGHT = 20000.0
+# Cells around a candidate that count towards its value
+RADIUS = 2
+
+
+class SpawnGrid:
+    """Where diamonds of one board size have appeared, as decayed counts per cell"""
+
+    def __init__(self, width: int, height: int, counts: Optional[List[float]] = None) -> None:
+        self.width = width
+        self.height = height
+        self.counts = counts if counts and len(counts) == width * height else [0.0] * (width * height)
+        self.total = sum(self.counts)
+        # Spawns seen since the grid was last saved, merged into the file then
+        self.added = [0.0] * (width * height)
+        # Diamonds on the last board seen, per board id
+        self._seen: Dict[int, FrozenSet[Tuple[int, int, int]]] = {}
+        self._values: Optional[List[float]] = None
+
+    def observe(self, board: Board) -> int:
+        """
+        Count the diamonds that were not on the previous board seen with the
+        same id. The first board of an id only tells what was there already.
+        :return: number of new diamonds
+        """
+        current = frozenset(
+            (gem.id, gem.position.x, gem.position.y) for gem in board.diamonds
+        )
+        seen = self._seen.get(board.id)
+        self._seen[board.id] = current
+        if seen is None or current == seen:
+            return 0
+        new = current - seen
+        for _, x, y in new:
+            if 0 <= x < self.width and 0 <= y < self.height:
+                self.counts[y * self.width + x] += 1
+                self.added[y * self.width + x] += 1
+                self.total += 1
+        if self.total > MAX_WEIGHT:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+        if new:
+            self._values = None
+        return len(new)
+
+    def density(self, x: int, y: int) -> float:
+        """Chance the next diamond appears at (x, y)"""
+        return (self.counts[y * self.width + x] + PRIOR) / (
+            self.total + PRIOR * self.width * self.height
+        )
+
+    def values(self) -> List[float]:
+        """Expected share of new diamonds within RADIUS of every cell"""
+        if self._values is None:
+            width, height = self.width, self.height
+            density = [self.density(x, y) for y in range(height) for x in range(width)]
+            values = [0.0] * (width * height)
+            for y in range(height):
+                for x in range(width):
+                    value = 0.0
+                    for other_y in range(max(0, y - RADIUS), min(height, y + RADIUS + 1)):
+                        reach = RADIUS - abs(other_y - y)
+                        row = other_y * width
+                        for other_x in range(max(0, x - reach), min(width, x + reach + 1)):
+                            value += density[row + other_x]
+                    values[y * width + x] = value
+            self._values = values
+        return self._values
+
+    def idle_target(self, position: Position) -> Optional[Position]:
+        """
+        Cell to wait at while nothing is worth collecting: the most spawns
+        expected around it per step of getting there
+        """
+        if self.total <= 0:
+            return None
+        values = self.values()
+        best, best_value = None, 0.0
+        for index, value in enumerate(values):
+            x, y = index % self.width, index // self.width
+            value /= abs(x - position.x) + abs(y - position.y) + RADIUS + 1
+            if value > best_value:
+                best, best_value = (x, y), value
+        if best is None:
+            return None
+        return Position(best[1], best[0])
+
+
+def _merge(counts: Optional[List[float]], added: List[float]) -> List[float]:
+    """Counts saved by other processes plus the spawns seen here since the last save"""
+    if not counts or len(counts) != len(added):
+        counts = [0.0] * len(added)
+    merged = [count + new for count, new in zip(counts, added)]
+    total = sum(merged)
+    while total > MAX_WEIGHT:
+        merged = [count / 2 for count in merged]
+        total /= 2
+    return merged
+
+
+class SpawnModel:
+    """
+    Spawn grids of every board size, learned online from the boards the bots
+    see. A model loaded from a JSON file is kept across games in it; one
+    created without a path lives only in memory, like the fresh model every
+    simulated game gets. Bot processes sharing the file merge what they saw
+    into it under a lock, so no process overwrites the others' counts.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.grids: Dict[str, SpawnGrid] = {}
+        self.dirty = False
+        # Bots on several boards of one process observe from their own threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(width: int, height: int) -> str:
+        return "{}x{}".format(width, height)
+
+    @classmethod
+    def load(cls, path: str = SPAWNS_FILE) -> "SpawnModel":
+        model = cls(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        for key, counts in data.items():
+            try:
+                width, height = (int(part) for part in key.split("x"))
+            except ValueError:
+                continue
+            model.grids[key] = SpawnGrid(width, height, counts)
+        return model
+
+    def save(self) -> None:
+        if not self.dirty or self.path is None:
+            return
+        with open("{}.lock".format(self.path), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            with self._lock:
+                for key, grid in self.grids.items():
+                    data[key] = grid.counts = _merge(data.get(key), grid.added)
+                    grid.total = sum(grid.counts)
+                    grid.added = [0.0] * len(grid.counts)
+                    grid._values = None
+                self.dirty = False
+            tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def grid(self, board: Board) -> SpawnGrid:
+        key = self._key(board.width, board.height)
+        grid = self.grids.get(key)
+        if grid is None:
+            grid = self.grids[key] = SpawnGrid(board.width, board.height)
+        return grid
+
+    def observe(self, board: Board) -> SpawnGrid:
+        with self._lock:
+            grid = self.grid(board)
+            if grid.observe(board):
+                self.dirty = True
+        return grid
@@ -0,0 +1,253 @@
+import json
+import re
+import threading
+from dataclasses import dataclass, fields, is_dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+from typing import Dict, Optional, Tuple
+
+from game.models import Board
+from game.simulator import SimulatedBot, Simulator, SimulatorConfig
+
+_DIRECTIONS = {"NORTH": (0, -1), "SOUTH": (0, 1), "EAST": (1, 0), "WEST": (-1, 0)}
+
+
+@lru_cache(maxsize=None)
+def _camel_case(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+def encode(value):
+    """Models as the server's JSON: camel case keys, unset fields left out"""
+    if is_dataclass(value):
+        encoded = {}
+        for field in fields(value):
+            item = getattr(value, field.name)
+            if item is not None:
+                encoded[_camel_case(field.name)] = encode(item)
+        return encoded
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    return value
+
+
+@dataclass
+class _Session:
+    board_id: int
+    bot: SimulatedBot
+    ends_at: float
+    last_move: float = float("-inf")
+
+
+class _Game:
+    """One board and its lock; requests for different boards never wait on each other"""
+
+    def __init__(self, simulator: Simulator) -> None:
+        self.simulator = simulator
+        self.lock = threading.Lock()
+        # token -> session of the bots on this board
+        self.sessions: Dict[str, _Session] = {}
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Hundreds of bots connect at once; the default backlog of 5 would
+    # leave most of them retrying their connection
+    request_queue_size = 1024
+
+
+class StandInServer:
+    """
+    Local stand-in for the game server, speaking its HTTP API on top of the
+    simulator, for load tests and for trying main.py without the real one.
+
+    Every board id a bot joins gets its own simulated game. As on the real
+    server, a bot plays for config.seconds from the moment it joins and then
+    leaves the board, and a move arriving less than
+    minimum_delay_between_moves after the bot's previous one is rejected.
+    latency seconds are added before handling each request and again before
+    answering it, like a network in each direction. moves and rejected count
+    the move requests accepted and refused.
+    """
+
+    def __init__(
+        self,
+        config: Optional[SimulatorConfig] = None,
+        seed: int = 0,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.config = config or SimulatorConfig()
+        self.seed = seed
+        self.latency = latency
+        self.moves = 0
+        self.rejected = 0
+        self._games: Dict[int, _Game] = {}
+        # token -> name, email
+        self._accounts: Dict[str, Tuple[str, str]] = {}
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._server = _HTTPServer((host, port), self._handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/api".format(host, port)
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _game(self, board_id: int) -> _Game:
+        with self._lock:
+            game = self._games.get(board_id)
+            if game is None:
+                simulator = Simulator([], self.config, seed=self.seed + board_id, board_id=board_id)
+                simulator.reset()
+                game = self._games[board_id] = _Game(simulator)
+            return game
+
+    def _board(self, game: _Game) -> Board:
+        """Board of a game as its bots see it now; call with the game's lock held"""
+        now = monotonic()
+        for token, session in list(game.sessions.items()):
+            if now >= session.ends_at:
+                game.simulator.remove_bot(session.bot)
+                del game.sessions[token]
+                self._sessions.pop(token, None)
+        board = game.simulator.board()
+        left = {
+            session.bot.id: int((session.ends_at - now) * 1000)
+            for session in game.sessions.values()
+        }
+        board.game_objects = [
+            obj
+            for obj in board.game_objects
+            if obj.type != "BotGameObject" or obj.id in left
+        ]
+        for obj in board.bots:
+            obj.properties.milliseconds_left = left[obj.id]
+        return board
+
+    def handle(self, method: str, path: str, body: dict) -> Tuple[int, object]:
+        """Answer one API request with a status and the payload of its "data" field"""
+        match = re.fullmatch(r"/api/boards/(\d+)", path)
+        if method == "GET" and match:
+            game = self._game(int(match.group(1)))
+            with game.lock:
+                return 200, encode(self._board(game))
+        if method == "GET" and path == "/api/boards":
+            games = list(self._games.values()) or [self._game(1)]
+            boards = []
+            for game in games:
+                with game.lock:
+                    boards.append(encode(self._board(game)))
+            return 200, boards
+
+        match = re.fullmatch(r"/api/bots/([^/]+)(?:/(join|move))?", path)
+        if method == "POST" and path == "/api/bots":
+            with self._lock:
+                if any(email == body.get("email") for _, email in self._accounts.values()):
+                    return 409, {"message": "Email already registered"}
+                token = "standin-{}".format(len(self._accounts) + 1)
+                self._accounts[token] = (body.get("name"), body.get("email"))
+            return 200, {"id": token, "name": body.get("name"), "email": body.get("email")}
+        if method == "POST" and path == "/api/bots/recover":
+            with self._lock:
+                for token, (_, email) in self._accounts.items():
+                    if email == body.get("email"):
+                        return 201, {"id": token}
+            return 404, {"message": "No such bot"}
+        if not match or match.group(1) not in self._accounts:
+            return 404, {"message": "Not found"}
+
+        token, action = match.groups()
+        name, email = self._accounts[token]
+        if method == "GET" and action is None:
+            return 200, {"id": token, "name": name, "email": email}
+        if method == "POST" and action == "join":
+            board_id = int(body.get("preferredBoardId") or 1)
+            game = self._game(board_id)
+            with game.lock:
+                if token in self._sessions:
+                    return 409, {"message": "Bot already on a board"}
+                session = _Session(
+                    board_id, game.simulator.add_bot(name), monotonic() + self.config.seconds
+                )
+                game.sessions[token] = self._sessions[token] = session
+            return 200, {}
+        if method == "POST" and action == "move":
+            session = self._sessions.get(token)
+            if session is None:
+                return 403, {"message": "Bot is not on a board"}
+            game = self._game(session.board_id)
+            direction = _DIRECTIONS.get(body.get("direction"))
+            with game.lock:
+                now = monotonic()
+                delay = self.config.minimum_delay_between_moves / 1000
+                accepted = (
+                    direction is not None
+                    and now < session.ends_at
+                    and now - session.last_move >= delay
+                    and token in game.sessions
+                    and game.simulator.move_bot(session.bot, *direction)
+                )
+                with self._lock:
+                    if accepted:
+                        self.moves += 1
+                    else:
+                        self.rejected += 1
+                if not accepted:
+                    return 403, {"message": "Move not allowed"}
+                session.last_move = now
+                return 200, encode(self._board(game))
+        return 404, {"message": "Not found"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open, as the client's session pool expects
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes, which Nagle's
+            # algorithm would hold back for the client's delayed ack
+            disable_nagle_algorithm = True
+
+            def _respond(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+                if server.latency:
+                    sleep(server.latency)
+                status, data = server.handle(self.command, self.path, body or {})
+                payload = json.dumps({"data": data}).encode("utf-8")
+                if server.latency:
+                    sleep(server.latency)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from game.models import Board, GameObject
+from game.opponents import OpponentTracker
+from game.team import teleporter_pairs, travel_distance
+
+Cell = Tuple[int, int]
+
+
+@dataclass
+class TackleOption:
+    target_id: int
+    intercept: Cell
+    steps: int
+    # Diamonds we would take, discounted by how likely the opponent is there
+    expected_stolen: float
+
+    @property
+    def value(self) -> float:
+        return self.expected_stolen / self.steps
+
+
+def tackling_enabled(board: Board, bot: GameObject) -> bool:
+    if bot.properties.can_tackle is not None:
+        return bot.properties.can_tackle
+    for feature in board.features or []:
+        if feature.name == "BotProvider" and feature.config:
+            return bool(feature.config.can_tackle)
+    return False
+
+
+class TacklePlanner:
+    """
+    Scores tackling the opponents that carry diamonds.
+
+    Moving onto an opponent's cell sends it home and hands us its diamonds,
+    up to our inventory size. For every opponent the planner looks for the
+    first predicted position we can reach no later than it does, stopping
+    once it reaches its base. The stolen diamonds per step of an
+    intercept are weighed against the points per step we make collecting
+    ourselves, tracked as a moving average.
+    """
+
+    def __init__(
+        self,
+        horizon: int = 6,
+        confidence: float = 0.65,
+        collection_rate: float = 0.2,
+        smoothing: float = 0.05,
+    ) -> None:
+        self.horizon = horizon
+        # Chance a one-step prediction is right, compounded per step
+        self.confidence = confidence
+        self.collection_rate = collection_rate
+        self.smoothing = smoothing
+        self._last_total: Optional[int] = None
+
+    def observe(self, bot: GameObject) -> None:
+        """Update our collection rate from the bot's score and inventory"""
+        total = (bot.properties.score or 0) + (bot.properties.diamonds or 0)
+        if self._last_total is not None:
+            gain = max(0, total - self._last_total)
+            self.collection_rate += self.smoothing * (gain - self.collection_rate)
+        self._last_total = total
+
+    def options(
+        self, bot: GameObject, board: Board, opponents: OpponentTracker
+    ) -> List[TackleOption]:
+        room = (bot.properties.inventory_size or 0) - (bot.properties.diamonds or 0)
+        if room <= 0:
+            return []
+
+        start = (bot.position.x, bot.position.y)
+        pairs = teleporter_pairs(board)
+        options = []
+        for track in opponents.tracks.values():
+            if track.diamonds <= 0:
+                continue
+            stolen = min(track.diamonds, room)
+            for steps, cell in enumerate(track.predict(self.horizon), 1):
+                if cell == track.base:
+                    # Deposited before we get there
+                    break
+                distance = travel_distance(start, cell, pairs)
+                # Arriving early meets it head-on along its path
+                if distance <= steps:
+                    options.append(
+                        TackleOption(
+                            target_id=track.id,
+                            intercept=cell,
+                            steps=steps,
+                            expected_stolen=stolen * self.confidence**steps,
+                        )
+                    )
+                    break
+        return options
+
+    def best(
+        self,
+        bot: GameObject,
+        board: Board,
+        opponents: OpponentTracker,
+        margin: float = 1.0,
+    ) -> Optional[TackleOption]:
+        """
+        The most valuable tackle, if it beats collecting diamonds ourselves
+        :param margin: how many times our collection rate a tackle must yield
+        """
+        if not tackling_enabled(board, bot):
+            return None
+        options = self.options(bot, board, opponents)
+        if not options:
+            return None
+        option = max(options, key=lambda option: option.value)
+        if option.value > self.collection_rate * margin:
+            return option
+        return None
@@ -0,0 +1,330 @@
+import base64
+import json
+import socket
+import socketserver
+import struct
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from game.models import Board, GameObject, Position
+from game.replay import OBJECT_RECORD, StringTable, pack_object, unpack_object
+
+Cell = Tuple[int, int]
+Targets = Tuple[Optional[Position], FrozenSet[Cell]]
+
+NO_TARGETS: Targets = (None, frozenset())
+
+# Cost of a diamond that does not fit in a bot's inventory
+_UNREACHABLE = 1e9
+
+# board id, width, height, strings length
+_BOARD_HEADER = struct.Struct("<iHHI")
+
+
+def _manhattan(a: Cell, b: Cell) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def teleporter_pairs(board: Board) -> List[Tuple[Cell, Cell]]:
+    ends: Dict[Optional[str], List[Cell]] = {}
+    for obj in board.game_objects or []:
+        if obj.type == "TeleportGameObject":
+            pair_id = obj.properties.pair_id if obj.properties else None
+            ends.setdefault(pair_id, []).append((obj.position.x, obj.position.y))
+    return [(cells[0], cells[1]) for cells in ends.values() if len(cells) == 2]
+
+
+def travel_distance(a: Cell, b: Cell, pairs: Sequence[Tuple[Cell, Cell]]) -> int:
+    """
+    Steps from a to b. The board has no walls, so this is the Manhattan
+    distance unless walking through one teleporter pair is shorter.
+    """
+    best = _manhattan(a, b)
+    for first, second in pairs:
+        best = min(
+            best,
+            _manhattan(a, first) + _manhattan(second, b),
+            _manhattan(a, second) + _manhattan(first, b),
+        )
+    return best
+
+
+def heading_home(logic, board_bot: GameObject) -> bool:
+    """Whether the logic's current target is the bot's own base"""
+    target = logic.current_target()
+    base = board_bot.properties.base
+    return target is not None and base is not None and (target.x, target.y) == (base.x, base.y)
+
+
+def min_cost_assignment(cost: List[List[float]]) -> List[Optional[int]]:
+    """
+    Hungarian algorithm for a rectangular cost matrix
+    :param cost: cost[row][column]
+    :return: assigned column of every row, None for rows left over
+    """
+    if not cost or not cost[0]:
+        return [None] * len(cost)
+    transposed = len(cost) > len(cost[0])
+    if transposed:
+        cost = [list(column) for column in zip(*cost)]
+    n, m = len(cost), len(cost[0])
+
+    # Potentials and matching are 1-indexed, column 0 is a virtual start
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_slack = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while match[column]:
+            used[column] = True
+            current_row = match[column]
+            delta = float("inf")
+            next_column = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                slack = cost[current_row - 1][j - 1] - u[current_row] - v[j]
+                if slack < min_slack[j]:
+                    min_slack[j] = slack
+                    way[j] = column
+                if min_slack[j] < delta:
+                    delta = min_slack[j]
+                    next_column = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            column = next_column
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    if transposed:
+        result: List[Optional[int]] = [None] * m
+        for j in range(1, m + 1):
+            if match[j]:
+                result[j - 1] = match[j] - 1
+        return result
+    result = [None] * n
+    for j in range(1, m + 1):
+        if match[j]:
+            result[match[j] - 1] = j - 1
+    return result
+
+
+class TeamCoordinator:
+    """
+    Assigns diamonds to the bots of one team so teammates do not chase the
+    same diamond. The cost of a diamond is its travel distance per point.
+    Every teammate asks once per tick; the assignment is computed once per
+    board state and shared. Teammates heading home get no diamond, so they
+    do not hold one back from the others.
+    """
+
+    def __init__(self, members: Iterable[str] = ()) -> None:
+        self.members = set(members)
+        self.returning: Set[str] = set()
+        self._lock = threading.Lock()
+        self._key = None
+        self._targets: Dict[str, Position] = {}
+
+    def join(self, name: str, returning: bool = False) -> None:
+        with self._lock:
+            self.members.add(name)
+            if returning:
+                self.returning.add(name)
+            else:
+                self.returning.discard(name)
+
+    def assign(self, board: Board) -> Dict[str, Position]:
+        """
+        :param board: current board
+        :return: assigned diamond position of every teammate that got one
+        """
+        bots = [
+            bot
+            for bot in board.bots
+            if bot.properties.name in self.members
+            and bot.properties.name not in self.returning
+            and (bot.properties.inventory_size or 0) > (bot.properties.diamonds or 0)
+        ]
+        diamonds = board.diamonds
+        key = (
+            tuple((bot.id, bot.position.x, bot.position.y, bot.properties.diamonds) for bot in bots),
+            tuple((gem.id, gem.position.x, gem.position.y) for gem in diamonds),
+        )
+        with self._lock:
+            if key == self._key:
+                return self._targets
+
+            pairs = teleporter_pairs(board)
+            cost = []
+            for bot in bots:
+                room = bot.properties.inventory_size - bot.properties.diamonds
+                start = (bot.position.x, bot.position.y)
+                cost.append(
+                    [
+                        travel_distance(start, (gem.position.x, gem.position.y), pairs)
+                        / gem.properties.points
+                        if gem.properties.points <= room
+                        else _UNREACHABLE
+                        for gem in diamonds
+                    ]
+                )
+
+            targets = {}
+            for bot, index, row in zip(bots, min_cost_assignment(cost), cost):
+                if index is not None and row[index] < _UNREACHABLE:
+                    targets[bot.properties.name] = diamonds[index].position
+            self._key, self._targets = key, targets
+            return targets
+
+    def targets(self, name: str, board: Board, returning: bool = False) -> Targets:
+        """
+        :param name: bot name
+        :param board: current board
+        :param returning: whether the bot is heading home
+        :return: diamond assigned to the bot, and the cells reserved by its teammates
+        """
+        self.join(name, returning)
+        assigned = self.assign(board)
+        reserved = frozenset(
+            (position.x, position.y)
+            for member, position in assigned.items()
+            if member != name
+        )
+        return assigned.get(name), reserved
+
+    def teammates(self, name: str) -> FrozenSet[str]:
+        """Names of the other members of the bot's team"""
+        with self._lock:
+            return frozenset(self.members - {name})
+
+
+def encode_board(board: Board) -> str:
+    objects = [
+        obj
+        for obj in board.game_objects or []
+        if obj.type in ("BotGameObject", "DiamondGameObject", "TeleportGameObject")
+    ]
+    strings = StringTable()
+    records = b"".join(pack_object(obj, strings) for obj in objects)
+    names = strings.to_json()
+    data = _BOARD_HEADER.pack(board.id, board.width, board.height, len(names)) + names + records
+    return base64.b64encode(data).decode("ascii")
+
+
+def decode_board(text: str) -> Board:
+    data = base64.b64decode(text)
+    board_id, width, height, names_length = _BOARD_HEADER.unpack_from(data)
+    records = _BOARD_HEADER.size + names_length
+    strings = StringTable.from_json(data[_BOARD_HEADER.size : records])
+    return Board(
+        id=board_id,
+        width=width,
+        height=height,
+        features=[],
+        minimum_delay_between_moves=0,
+        game_objects=[
+            unpack_object(data, strings, offset)
+            for offset in range(records, len(data), OBJECT_RECORD.size)
+        ],
+    )
+
+
+class _TeamRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            request = json.loads(line)
+            target, reserved = self.server.coordinator.targets(
+                request["name"], decode_board(request["board"]), request.get("returning", False)
+            )
+            response = {
+                "target": [target.x, target.y] if target else None,
+                "reserved": sorted(reserved),
+                "members": sorted(self.server.coordinator.members),
+            }
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class TeamServer(socketserver.ThreadingTCPServer):
+    """Serves a TeamCoordinator to teammates in other processes on this host"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, coordinator: Optional[TeamCoordinator] = None) -> None:
+        self.coordinator = coordinator or TeamCoordinator()
+        super().__init__(("127.0.0.1", port), _TeamRequestHandler)
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class TeamClient:
+    """
+    Asks a TeamServer for targets, one JSON line per tick. Plays on without
+    reservations while the server cannot be reached.
+    """
+
+    def __init__(self, port: int, timeout: float = 0.2) -> None:
+        self.port = port
+        self.timeout = timeout
+        self._socket: Optional[socket.socket] = None
+        self._file = None
+        self._members: FrozenSet[str] = frozenset()
+
+    def _connect(self) -> None:
+        self._socket = socket.create_connection(("127.0.0.1", self.port), self.timeout)
+        self._file = self._socket.makefile("rwb")
+
+    def targets(self, name: str, board: Board, returning: bool = False) -> Targets:
+        request = {"name": name, "board": encode_board(board), "returning": returning}
+        try:
+            if self._socket is None:
+                self._connect()
+            self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+            self._file.flush()
+            response = json.loads(self._file.readline())
+        except (OSError, ValueError):
+            self.close()
+            return NO_TARGETS
+
+        self._members = frozenset(response.get("members", ()))
+        target = response["target"]
+        return (
+            Position(target[1], target[0]) if target else None,
+            frozenset(tuple(cell) for cell in response["reserved"]),
+        )
+
+    def teammates(self, name: str) -> FrozenSet[str]:
+        """Names of the other team members, as of the last answer of the server"""
+        return self._members - {name}
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+        self._socket = None
+        self._file = None
+
+
+def join_team(port: int):
+    """
+    Host the team coordinator on port, or connect to the teammate already
+    hosting it
+    :return: TeamCoordinator or TeamClient, both providing targets(name, board,
+        returning) and teammates(name)
+    """
+    try:
+        server = TeamServer(port)
+    except OSError:
+        return TeamClient(port)
+    server.start()
+    return server.coordinator
@@ -0,0 +1,41 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+TOKEN_CACHE_DIR = "token"
+
+
+@dataclass
+class TokenCache:
+    """
+    Bot tokens stored on disk, one file per email and host, so bots started
+    together never rewrite each other's entries
+    """
+
+    directory: str = TOKEN_CACHE_DIR
+
+    def _path(self, email: str, host: str) -> str:
+        key = hashlib.sha1("{}\n{}".format(host, email).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def get(self, email: str, host: str) -> Optional[str]:
+        try:
+            with open(self._path(email, host)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def put(self, email: str, host: str, token: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(email, host)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            f.write(token)
+        os.replace(tmp_path, path)
+
+    def remove(self, email: str, host: str) -> None:
+        try:
+            os.remove(self._path(email, host))
+        except OSError:
+            pass
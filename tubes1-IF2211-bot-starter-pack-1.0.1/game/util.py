@@ -1,4 +1,13 @@
-from .models import Position
+from functools import lru_cache
+from typing import AbstractSet, List, Tuple
+
+from .models import Board, Position
+
+# Every move the server accepts, in the order fallbacks try them
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+# Plans a logic may make in one tick before settling for fallback_move
+MAX_REPLANS = 2
 
 
 def clamp(n, smallest, largest):
@@ -15,3 +24,79 @@ def get_direction(current_x, current_y, dest_x, dest_y):
 
 def position_equals(a: Position, b: Position):
     return a.x == b.x and a.y == b.y
+
+
+@lru_cache(maxsize=None)
+def legal_move_mask(width: int, height: int) -> bytes:
+    """
+    Bit i of mask[y * width + x] is set when DIRECTIONS[i] stays on the board
+    from (x, y). Computed once per board size.
+    """
+    mask = bytearray(width * height)
+    for y in range(height):
+        for x in range(width):
+            bits = 0
+            for i, (delta_x, delta_y) in enumerate(DIRECTIONS):
+                if 0 <= x + delta_x < width and 0 <= y + delta_y < height:
+                    bits |= 1 << i
+            mask[y * width + x] = bits
+    return bytes(mask)
+
+
+def legal_moves(
+    board: Board,
+    position: Position,
+    blocked: AbstractSet[Tuple[int, int]] = frozenset(),
+) -> List[Tuple[int, int]]:
+    """
+    Moves from position that stay on the board
+    :param board: current board
+    :param position: position to move from
+    :param blocked: (x, y) cells to stay out of
+    :return: legal (delta_x, delta_y) moves in DIRECTIONS order
+    """
+    if not (0 <= position.x < board.width and 0 <= position.y < board.height):
+        return []
+    bits = legal_move_mask(board.width, board.height)[
+        position.y * board.width + position.x
+    ]
+    return [
+        (delta_x, delta_y)
+        for i, (delta_x, delta_y) in enumerate(DIRECTIONS)
+        if bits >> i & 1
+        and (position.x + delta_x, position.y + delta_y) not in blocked
+    ]
+
+
+def is_legal_move(
+    board: Board,
+    position: Position,
+    delta_x: int,
+    delta_y: int,
+    blocked: AbstractSet[Tuple[int, int]] = frozenset(),
+) -> bool:
+    """Same check as Board.is_valid_move, without printing, plus blocked cells"""
+    if (delta_x, delta_y) not in DIRECTIONS:
+        return False
+    if not (0 <= position.x < board.width and 0 <= position.y < board.height):
+        return False
+    bits = legal_move_mask(board.width, board.height)[
+        position.y * board.width + position.x
+    ]
+    return bool(bits >> DIRECTIONS.index((delta_x, delta_y)) & 1) and (
+        position.x + delta_x,
+        position.y + delta_y,
+    ) not in blocked
+
+
+def fallback_move(
+    board: Board,
+    position: Position,
+    blocked: AbstractSet[Tuple[int, int]] = frozenset(),
+) -> Tuple[int, int]:
+    """
+    A legal move for when a logic could not decide on one, preferring moves
+    that avoid blocked cells
+    """
+    moves = legal_moves(board, position, blocked) or legal_moves(board, position)
+    return moves[0] if moves else (0, 0)
@@ -0,0 +1,336 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from game.button import expected_nearest_distance
+from game.logic.params import TwParams
+from game.simulator import SimulatorConfig
+
+# Same order as the movement_vectors of the greedy logics
+DIRECTIONS = np.array([(1, 0), (0, 1), (-1, 0), (0, -1)], dtype=np.int32)
+
+
+def _same_cell(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Cheaper than (a == b).all(-1) over an axis of length two
+    return (a[..., 0] == b[..., 0]) & (a[..., 1] == b[..., 1])
+
+
+def _manhattan(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.abs(a[..., 0] - b[..., 0]) + np.abs(a[..., 1] - b[..., 1])
+
+
+@dataclass
+class BatchState:
+    """Stacked state of N games with B bots each. Positions are (x, y)."""
+
+    position: np.ndarray  # (N, B, 2)
+    base: np.ndarray  # (N, B, 2)
+    diamonds: np.ndarray  # (N, B)
+    score: np.ndarray  # (N, B)
+    diamond_x: np.ndarray  # (N, D) fixed diamond slots per game
+    diamond_y: np.ndarray  # (N, D)
+    diamond_cell: np.ndarray  # (N, D) y * width + x of each slot, -1 once picked up
+    diamond_points: np.ndarray  # (N, D) points of each slot, 0 once picked up
+    teleporters: np.ndarray  # (N, 2, 2) one teleporter pair per game
+    button: np.ndarray  # (N, 2)
+    milliseconds_left: int
+
+
+class VectorSimulator:
+    """
+    Advances N independent games in lockstep with array operations.
+
+    Follows the rules of game.simulator.Simulator, except that all bots of a
+    tick decide on the state at the start of the tick and a single teleporter
+    pair is supported.
+    """
+
+    def __init__(
+        self,
+        games: int,
+        bots: int,
+        config: Optional[SimulatorConfig] = None,
+        params: Optional[TwParams] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.games = games
+        self.bots = bots
+        self.config = config or SimulatorConfig()
+        self.params = params or TwParams()
+        self.random = np.random.default_rng(seed)
+        height, width = self.config.height, self.config.width
+        self.slots = max(1, int(width * height * self.config.generation_ratio))
+        self._games = np.arange(games)
+        # Expected steps from each cell to the nearest of 0..slots diamonds,
+        # indexed [count, y, x], for valuing the button like estimate_button
+        self._nearest_distance = np.array(
+            [
+                [
+                    [expected_nearest_distance(width, height, count, x, y) for x in range(width)]
+                    for y in range(height)
+                ]
+                for count in range(self.slots + 1)
+            ],
+            dtype=np.float32,
+        )
+        self.state: Optional[BatchState] = None
+
+    def _random_cells(self, shape: Tuple[int, ...]) -> np.ndarray:
+        return np.stack(
+            [
+                self.random.integers(0, self.config.width, shape),
+                self.random.integers(0, self.config.height, shape),
+            ],
+            axis=-1,
+        ).astype(np.int32)
+
+    def _generate_diamonds(self, mask: np.ndarray) -> None:
+        state, config = self.state, self.config
+        # Index arrays are much cheaper than boolean masks when few games match
+        mask = np.flatnonzero(mask)
+        count = len(mask)
+        if not count:
+            return
+        width = config.width
+
+        # Keep bases, teleporters and the button free of diamonds
+        blocked = np.concatenate(
+            [state.base[mask], state.teleporters[mask], state.button[mask][:, None]],
+            axis=1,
+        )
+        keys = self.random.random((count, width * config.height))
+        keys[np.arange(count)[:, None], blocked[..., 1] * width + blocked[..., 0]] = 2.0
+        cells = np.argpartition(keys, self.slots - 1, axis=1)[:, : self.slots]
+        state.diamond_cell[mask] = cells
+        state.diamond_x[mask] = cells % width
+        state.diamond_y[mask] = cells // width
+        red = self.random.random((count, self.slots)) < config.red_ratio
+        state.diamond_points[mask] = np.where(red, 2, 1)
+
+    def reset(self) -> BatchState:
+        config = self.config
+        base = self._random_cells((self.games, self.bots))
+        self.state = BatchState(
+            position=base.copy(),
+            base=base,
+            diamonds=np.zeros((self.games, self.bots), dtype=np.int32),
+            score=np.zeros((self.games, self.bots), dtype=np.int32),
+            diamond_x=np.zeros((self.games, self.slots), dtype=np.int16),
+            diamond_y=np.zeros((self.games, self.slots), dtype=np.int16),
+            diamond_cell=np.full((self.games, self.slots), -1, dtype=np.int16),
+            diamond_points=np.zeros((self.games, self.slots), dtype=np.int32),
+            teleporters=self._random_cells((self.games, 2)),
+            button=self._random_cells((self.games,)),
+            milliseconds_left=config.seconds * 1000,
+        )
+        self._generate_diamonds(np.ones(self.games, dtype=bool))
+        return self.state
+
+    def _distance(self, origin: np.ndarray) -> np.ndarray:
+        """Manhattan distance from (N, B, 2) origins to every diamond slot, (N, B, D)"""
+        state = self.state
+        origin = origin.astype(np.int16)
+        distance = np.abs(state.diamond_x[:, None] - origin[:, :, 0, None])
+        distance += np.abs(state.diamond_y[:, None] - origin[:, :, 1, None])
+        return distance
+
+    def policy(self) -> np.ndarray:
+        """
+        Vectorized counterpart of tw's time-weighted greedy choice.
+        Returns (N, B, 2) moves.
+        """
+        state, params, config = self.state, self.params, self.config
+        games = self._games
+        position = state.position
+        diamonds = state.diamonds
+        milliseconds_left = state.milliseconds_left
+        time_ratio = milliseconds_left / 30000.0
+        time_urgency = 1.0 - time_ratio
+
+        # Nearest teleporter of the pair and where it leads
+        teleporters = state.teleporters[:, None, :, :]
+        to_teleporter = _manhattan(teleporters, position[:, :, None, :])
+        near = np.argmin(to_teleporter, axis=-1)
+        near_cell = np.take_along_axis(teleporters, near[..., None, None], 2)[:, :, 0]
+        far_cell = np.take_along_axis(teleporters, (1 - near)[..., None, None], 2)[:, :, 0]
+        to_near = np.take_along_axis(to_teleporter, near[..., None], -1)[..., 0]
+        # Standing on a teleporter disables the portal route, like locate_nearest_portal
+        to_near = np.where(to_near == 0, 1 << 20, to_near)
+
+        # Diamond scores over every slot. Everything of shape (N, B, D) is
+        # int16/float32 and computed with as few passes as possible.
+        direct = self._distance(position)
+        via_portal = self._distance(far_cell)
+        via_portal += np.minimum(to_near, 1 << 14).astype(np.int16)[..., None]
+        distance = np.minimum(direct, via_portal)
+        np.maximum(distance, 1, out=distance)
+
+        # A slot is collectible when its points fit in the inventory and it is
+        # not a red diamond while carrying four (is_diamond_collectible).
+        # Empty slots get points that never fit.
+        points = state.diamond_points
+        fit = np.where(points > 0, points, 99).astype(np.int16)[:, None, :]
+        capacity = np.minimum(config.inventory_size - diamonds, 2)
+        capacity = np.where(diamonds == 4, 1, capacity).astype(np.int16)[..., None]
+        collectible = fit <= capacity
+
+        score = self._time_weighted(points.astype(np.float32)[:, None, :], distance, time_ratio)
+        score = np.where(collectible, score, np.float32(-1.0))
+
+        best = np.argmax(score, axis=-1)
+        best_score = np.take_along_axis(score, best[..., None], -1)[..., 0]
+        target = np.stack(
+            [state.diamond_x[games[:, None], best], state.diamond_y[games[:, None], best]],
+            axis=-1,
+        )
+
+        # Diamond button valued like tw's estimate_button: the regenerated
+        # layout's nearest diamond minus what the current one yields over
+        # the same walk, worthless once the diamonds regenerate by themselves
+        remaining = np.count_nonzero(points, axis=-1)
+        current_points = points.sum(axis=-1) / np.maximum(remaining, 1)
+        button_x, button_y = state.button[:, 0], state.button[:, 1]
+        after_button = self._nearest_distance[self.slots, button_y, button_x]
+        current_distance = self._nearest_distance[remaining, button_y, button_x]
+        button_points = (
+            np.float32(1 + config.red_ratio) - current_points * after_button / current_distance
+        ).astype(np.float32)
+        area = config.width * config.height
+        pressable = (remaining > max(1, area * config.min_ratio_for_generation)) & (button_points > 0)
+        button = state.button[:, None, :]
+        to_button = _manhattan(button, position)
+        button_score = self._time_weighted(
+            button_points[:, None], to_button + after_button[:, None], time_ratio
+        )
+        use_button = pressable[:, None] & (button_score > best_score)
+        target = np.where(use_button[..., None], button, target)
+        has_target = (best_score > 0) | use_button
+
+        # Return to base, mirroring calculate_urgency_threshold,
+        # should_return_early and evaluate_base_proximity_time_weighted
+        to_base_direct = _manhattan(state.base, position)
+        to_base_portal = to_near + _manhattan(state.base, far_cell)
+        to_base = np.minimum(to_base_direct, to_base_portal)
+        urgency_threshold = (
+            params.base_threshold
+            * (1.0 + diamonds * params.diamond_multiplier)
+            * (1.0 + time_urgency * 0.5)
+        )
+        safety = params.safety_factor + diamonds * params.safety_factor_per_diamond
+        go_base = (diamonds >= config.inventory_size) | (
+            (diamonds > 0)
+            & (
+                (milliseconds_left < urgency_threshold)
+                | (milliseconds_left < to_base * config.tick_milliseconds * safety)
+            )
+        )
+        go_base |= (diamonds > 1) & (to_base > 0) & (to_base <= 3 + time_urgency * 7)
+        # Nothing left to collect: deposit what the bot carries
+        go_base |= (diamonds > 0) & ~has_target
+        target = np.where(go_base[..., None], state.base, target)
+        has_target |= go_base
+
+        # Enter the portal when it is the shorter way to the target
+        target_direct = _manhattan(target, position)
+        target_portal = to_near + _manhattan(target, far_cell)
+        target = np.where((target_portal < target_direct)[..., None], near_cell, target)
+
+        # get_direction: move along x first, then y
+        delta = np.clip(target - position, -1, 1)
+        delta[..., 1] = np.where(delta[..., 0] != 0, 0, delta[..., 1])
+
+        # Wander when there is nothing to do, stepping away from the edges
+        idle = ~has_target | ((delta[..., 0] == 0) & (delta[..., 1] == 0))
+        if idle.any():
+            wander = DIRECTIONS[self.random.integers(0, 4, idle.shape)]
+            delta = np.where(idle[..., None], wander, delta)
+        return delta
+
+    def _time_weighted(self, value: np.ndarray, distance: np.ndarray, time_ratio: float) -> np.ndarray:
+        """tw's calculate_time_weighted_score over arrays of points and distances"""
+        params = self.params
+        time_urgency = 1.0 - time_ratio
+        if time_ratio > params.early_game_ratio:
+            return (value * (value * np.float32(0.1) + 1)) / distance
+        if time_ratio > params.end_game_ratio:
+            return value * np.float32(1.0 + time_urgency * 0.5) / distance
+        penalty = distance.astype(np.float32) * np.float32(time_urgency * 0.3)
+        return value * np.maximum(np.float32(0.1), 1 - penalty) / distance
+
+    def step(self, moves: Optional[np.ndarray] = None) -> None:
+        state, config = self.state, self.config
+        if moves is None:
+            moves = self.policy()
+        games = self._games
+        limits = np.array([config.width - 1, config.height - 1], dtype=np.int32)
+
+        # Bots move one after another, each over all games at once
+        for bot in range(self.bots):
+            position = state.position[:, bot] + moves[:, bot]
+            np.minimum(np.maximum(position, 0, out=position), limits, out=position)
+
+            # Teleport to the other end of the pair
+            on_first = _same_cell(position, state.teleporters[:, 0])
+            on_second = _same_cell(position, state.teleporters[:, 1])
+            position = np.where(on_first[:, None], state.teleporters[:, 1], position)
+            position = np.where(on_second[:, None], state.teleporters[:, 0], position)
+            state.position[:, bot] = position
+
+            # Tackle bots standing on the new cell
+            if config.can_tackle:
+                for other in range(self.bots):
+                    if other == bot:
+                        continue
+                    hit = _same_cell(state.position[:, other], position)
+                    if hit.any():
+                        state.diamonds[:, bot] = np.where(
+                            hit,
+                            np.minimum(
+                                config.inventory_size,
+                                state.diamonds[:, bot] + state.diamonds[:, other],
+                            ),
+                            state.diamonds[:, bot],
+                        )
+                        state.diamonds[:, other] = np.where(hit, 0, state.diamonds[:, other])
+                        state.position[:, other] = np.where(
+                            hit[:, None], state.base[:, other], state.position[:, other]
+                        )
+
+            # Pick up diamonds. Slots never share a cell, so one match per game.
+            cell = (position[:, 1] * config.width + position[:, 0]).astype(np.int16)
+            here = state.diamond_cell == cell[:, None]
+            slot = here.argmax(-1)
+            points = np.where(here[games, slot], state.diamond_points[games, slot], 0)
+            picked = (points > 0) & (state.diamonds[:, bot] + points <= config.inventory_size)
+            state.diamonds[:, bot] += np.where(picked, points, 0)
+            state.diamond_points[games, slot] = np.where(
+                picked, 0, state.diamond_points[games, slot]
+            )
+            state.diamond_cell[games, slot] = np.where(
+                picked, -1, state.diamond_cell[games, slot]
+            )
+
+            # Diamond button regenerates the board and moves away
+            pressed = _same_cell(position, state.button)
+            if pressed.any():
+                self._generate_diamonds(pressed)
+                pressed = np.flatnonzero(pressed)
+                state.button[pressed] = self._random_cells((len(pressed),))
+
+            # Deposit at the own base
+            home = _same_cell(position, state.base[:, bot])
+            state.score[:, bot] += np.where(home, state.diamonds[:, bot], 0)
+            state.diamonds[:, bot] = np.where(home, 0, state.diamonds[:, bot])
+
+        area = config.width * config.height
+        remaining = np.count_nonzero(state.diamond_points, axis=-1)
+        self._generate_diamonds(remaining < max(1, area * config.min_ratio_for_generation))
+        state.milliseconds_left -= config.tick_milliseconds
+
+    def run(self) -> np.ndarray:
+        """Play every game to the end and return the (N, B) final scores"""
+        self.reset()
+        while self.state.milliseconds_left > 0:
+            self.step()
+        return self.state.score
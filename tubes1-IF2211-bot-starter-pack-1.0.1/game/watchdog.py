@@ -0,0 +1,84 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from time import perf_counter
+from typing import Optional, Tuple
+
+from game.endgame import step_towards
+from game.log import PER_TICK, get_logger
+from game.logic.base import BaseLogic
+from game.metrics import metrics
+from game.models import Board, GameObject, Position
+from game.offload import greedy_move
+from game.team import teleporter_pairs
+from game.util import is_legal_move
+
+log = get_logger("watchdog")
+
+
+class Watchdog(BaseLogic):
+    """
+    Bounds the time a logic's next_move may take.
+
+    next_move runs on a helper thread and the tick waits at most deadline
+    seconds for it. A logic that overruns, raises or returns an illegal move
+    is replaced for that tick by the next step towards the target of its
+    last good plan (see BaseLogic.current_target), or by greedy_move when
+    there is none. An overrunning call is left to finish; until it does,
+    every tick falls back without calling the logic again. fallback_ticks
+    counts the ticks decided this way, and the watchdog_fallback metric
+    records how long each of them waited. Overruns and exceptions are
+    logged, and counted in the watchdog_timeout and watchdog_error metrics.
+    """
+
+    def __init__(self, logic: BaseLogic, deadline: float = 0.5) -> None:
+        self.logic = logic
+        self.deadline = deadline
+        self.team_aware = logic.team_aware
+        self.fallback_ticks = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="next_move")
+        self._running: Optional[Future] = None
+        self._target: Optional[Position] = None
+
+    def next_move(self, board_bot: GameObject, board: Board) -> Tuple[int, int]:
+        start = perf_counter()
+        if self._running is None or self._running.done():
+            self.logic.assigned_target = self.assigned_target
+            self.logic.reserved_targets = self.reserved_targets
+            self.logic.teammates = self.teammates
+            self.logic.tick_milliseconds = self.tick_milliseconds
+            self._running = self._executor.submit(self.logic.next_move, board_bot, board)
+            try:
+                move = self._running.result(timeout=self.deadline)
+            except TimeoutError:
+                log.warning(
+                    "next_move overran its %.3fs deadline, playing the fallback",
+                    self.deadline,
+                    extra=PER_TICK,
+                )
+                metrics.observe("watchdog_timeout", perf_counter() - start)
+                move = None
+            except Exception:
+                log.exception("next_move failed, playing the fallback", extra=PER_TICK)
+                metrics.observe("watchdog_error", perf_counter() - start)
+                move = None
+            if move is not None and is_legal_move(board, board_bot.position, *move):
+                self._target = self.logic.current_target()
+                return move
+
+        self.fallback_ticks += 1
+        metrics.observe("watchdog_fallback", perf_counter() - start)
+        return self.fallback_move(board_bot, board)
+
+    def fallback_move(self, board_bot: GameObject, board: Board) -> Tuple[int, int]:
+        position = board_bot.position
+        target = self._target
+        if target is None or (target.x, target.y) == (position.x, position.y):
+            return greedy_move(board, board_bot, self.tick_milliseconds)
+        # Keep off teleporters unless the plan was to take one
+        avoid = [cell for pair in teleporter_pairs(board) for cell in pair]
+        return step_towards(board, position, (target.x, target.y), avoid)
+
+    def current_target(self) -> Optional[Position]:
+        return self._target
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
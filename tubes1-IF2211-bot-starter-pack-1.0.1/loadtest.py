@@ -0,0 +1,223 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import monotonic
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; memory is then left out of the report
+    resource = None
+
+from game.logic.registry import controller_names, resolve
+from game.simulator import SimulatorConfig
+from game.standin import StandInServer
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+# Games on the stand-in last this much longer than the measured part, so
+# bots signed up first are still playing when the last one joins
+SIGNUP_SECONDS = 120
+# Board ids of each step start this far apart, so no step shares a board
+# with bots left over from the previous one
+BOARDS_PER_STEP = 10000
+
+
+def _peak_rss() -> int:
+    """Peak resident memory of this process in bytes, 0 when unknown"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system
+
+
+def run_step(job) -> dict:
+    """
+    Play bots bots against the stand-in at url in this process, through the
+    same Api, handlers and board loops as main.py, and measure them for
+    options["seconds"] once they all joined
+    """
+    url, bots, step, options = job
+    from game.api import Api
+    from game.board_handler import BoardHandler
+    from game.bot_handler import BotHandler
+    from game.metrics import metrics
+    from game.ratelimit import RequestScheduler
+    from game.runner import BoardLoop, Scheduler
+
+    logic_class = resolve(options["logic"])
+    limiter = RequestScheduler(options["max_rps"]) if options["max_rps"] > 0 else None
+    api = Api(url, pool_size=max(10, bots), limiter=limiter)
+    bot_handler = BotHandler(api)
+    rss_before = _peak_rss()
+
+    def start(index: int) -> BoardLoop:
+        name = "load{}-{}".format(step, index)
+        bot = bot_handler.register(name, "{}@loadtest".format(name), "loadtest", "loadtest")
+        board_id = step * BOARDS_PER_STEP + index // options["bots_per_board"] + 1
+        if not bot or not bot_handler.join(bot.id, board_id):
+            raise RuntimeError("Bot {} could not join board {}".format(name, board_id))
+        return BoardLoop(
+            bot,
+            board_id,
+            logic_class(),
+            BoardHandler(api),
+            bot_handler,
+            server_timing=options["server_timing"],
+        )
+
+    with ThreadPoolExecutor(max_workers=min(bots, 32)) as pool:
+        loops = list(pool.map(start, range(bots)))
+
+    # Only the game itself is measured, not signing the bots up, and with
+    # every request latency kept for exact percentiles
+    metrics.histograms.clear()
+    metrics.keep_samples("http")
+    scheduler = Scheduler()
+    timer = threading.Timer(options["seconds"], scheduler.stop)
+    cpu_start = _cpu_seconds()
+    start_time = monotonic()
+    timer.start()
+    scheduler.run(loops)
+    elapsed = monotonic() - start_time
+    cpu = _cpu_seconds() - cpu_start
+
+    http = metrics.histogram("http")
+    moves = sum(loop.moves for loop in loops)
+    return {
+        "bots": bots,
+        "seconds": elapsed,
+        "moves": moves,
+        "moves_per_second": moves / elapsed,
+        "p50_ms": http.quantile(0.5) * 1000,
+        "p95_ms": http.quantile(0.95) * 1000,
+        "p99_ms": http.quantile(0.99) * 1000,
+        "cpu_percent_per_bot": cpu / elapsed / bots * 100,
+        "rss_kb_per_bot": max(0, _peak_rss() - rss_before) / bots / 1024,
+    }
+
+
+parser = argparse.ArgumentParser(
+    description="Drive growing numbers of bots against a local stand-in server and report the client's capacity"
+)
+parser.add_argument(
+    "--bots",
+    help="Number of bots at each step of the ramp",
+    nargs="+",
+    default=[1, 10, 50, 100, 200],
+    type=int,
+)
+parser.add_argument("--seconds", help="Seconds each step is measured for", default=20, type=int)
+parser.add_argument(
+    "--logic",
+    help="Logic controller of every bot. Valid options are: {}".format(", ".join(controller_names())),
+    default="Random",
+)
+parser.add_argument(
+    "--bots-per-board",
+    help="Bots sharing each simulated board",
+    default=8,
+    type=int,
+)
+parser.add_argument(
+    "--latency",
+    help="Milliseconds the stand-in adds in each direction, like a network",
+    default=0,
+    type=float,
+)
+parser.add_argument(
+    "--server-timing",
+    help="Move as often as the board's minimum delay allows, like main.py --server-timing",
+    action="store_true",
+)
+parser.add_argument(
+    "--max-rps",
+    help="Shared request budget of the bots, like main.py --max-rps. 0 means no limit",
+    default=0,
+    type=float,
+)
+parser.add_argument("--seed", default=0, type=int)
+parser.add_argument(
+    "--output",
+    help="Append every step's results to this file, one JSON object per line, to track capacity over time",
+    action="store",
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    try:
+        resolve(args.logic)
+    except KeyError:
+        parser.error("Invalid logic controller: {}".format(args.logic))
+
+    server = StandInServer(
+        SimulatorConfig(seconds=args.seconds + SIGNUP_SECONDS),
+        seed=args.seed,
+        latency=args.latency / 1000,
+    ).start()
+    options = {
+        "seconds": args.seconds,
+        "logic": args.logic,
+        "bots_per_board": args.bots_per_board,
+        "server_timing": args.server_timing,
+        "max_rps": args.max_rps,
+    }
+    run_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    print(
+        "{:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10} {:>10} {:>9} {:>9}".format(
+            "bots",
+            "moves/s",
+            "per bot",
+            "p50 ms",
+            "p95 ms",
+            "p99 ms",
+            "cpu %/bot",
+            "rss kB/bot",
+            "rejected",
+            "server %",
+        )
+    )
+    # Each step gets a fresh process so its CPU time and memory are its own
+    context = multiprocessing.get_context("spawn")
+    for step, bots in enumerate(args.bots):
+        rejected_before = server.rejected
+        server_cpu = _cpu_seconds()
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_step, (server.url, bots, step, options)).result()
+        result["rejected"] = server.rejected - rejected_before
+        result["server_cpu_percent"] = (_cpu_seconds() - server_cpu) / result["seconds"] * 100
+        print(
+            "{:>6} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.2f} {:>10.0f} {:>9} {:>9.0f}".format(
+                bots,
+                result["moves_per_second"],
+                result["moves_per_second"] / bots,
+                result["p50_ms"],
+                result["p95_ms"],
+                result["p99_ms"],
+                result["cpu_percent_per_bot"],
+                result["rss_kb_per_bot"],
+                result["rejected"],
+                result["server_cpu_percent"],
+            )
+        )
+        if args.output:
+            record = dict(
+                result,
+                run_at=run_at,
+                logic=args.logic,
+                latency_ms=args.latency,
+                server_timing=args.server_timing,
+                max_rps=args.max_rps,
+            )
+            with open(args.output, "a") as f:
+                f.write(json.dumps(record) + "\n")
+    server.close()
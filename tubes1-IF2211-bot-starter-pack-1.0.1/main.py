@@ -1,33 +1,15 @@
 import argparse
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Optional, Tuple
 
-from colorama import Back, Fore, Style, init
-from game.api import Api
-from game.board_handler import BoardHandler
-from game.bot_handler import BotHandler
-from game.logic.random import RandomLogic
-from game.util import *
-from game.logic.base import BaseLogic
-import game.logic.cep as cep
-from game.logic.cep import GreedyDiamondLogic
-import game.logic.vtd as vtd
-from game.logic.vtd import GreedyDiamondLogic
-import game.logic.tw as tw
-from game.logic.tw import GreedyDiamondLogic
-import game.logic.ra as ra
-from game.logic.ra import GreedyDiamondLogic
+# Only what is needed to parse arguments is imported up front, so --help
+# and argument errors do not pay for requests, dacite or the logic modules
+from game.logic.registry import CONTROLLERS, ENTRY_POINT_GROUP, resolve
+from game.profiling import PROFILE_MODES
 
-
-init()
 BASE_URL = "http://localhost:3000/api"
 DEFAULT_BOARD_ID = 1
-CONTROLLERS = {
-    "Random": RandomLogic,
-    "cep": cep.GreedyDiamondLogic,
-    "vtd": vtd.GreedyDiamondLogic,
-    "tw": tw.GreedyDiamondLogic,
-    "ra": ra.GreedyDiamondLogic,
-}
 
 ###############################################################################
 #
@@ -50,66 +32,135 @@ parser.add_argument("--team", help="The team of the bot to register", action="st
 parser.add_argument(
     "--board", help="Id of the board to join", default=DEFAULT_BOARD_ID, action="store"
 )
+parser.add_argument(
+    "--boards",
+    help="Comma separated ids of boards to play on at once from this process, one bot per board. Each bot's name and email get the board id appended",
+    action="store",
+)
 parser.add_argument(
     "--time-factor",
     help="A factor to multiply each move command with. If you want to run the bot in a slower mode e.g. use --time-factor=5 to multiply each delay with 5.",
     default=1,
     action="store",
 )
+parser.add_argument(
+    "--server-timing",
+    help="Move as often as the board's minimum delay between moves allows (times --time-factor) instead of once a second, timing each move by the server's clock and the measured latency",
+    action="store_true",
+)
 parser.add_argument(
     "--logic",
-    help="The logic controller to use. Valid options are: {}".format(
-        ", ".join(list(CONTROLLERS.keys()))
+    help="The logic controller to use. Valid options are: {}, or any controller installed under the '{}' entry point group".format(
+        ", ".join(list(CONTROLLERS.keys())), ENTRY_POINT_GROUP
     ),
     action="store",
 )
+parser.add_argument(
+    "--record",
+    help="Append every board seen during the game to this replay corpus file",
+    action="store",
+)
+parser.add_argument(
+    "--metrics-file",
+    help="Periodically write per-tick phase timings to this file in Prometheus text format",
+    action="store",
+)
+parser.add_argument(
+    "--metrics-port",
+    help="Serve per-tick phase timings in Prometheus text format on this local port",
+    type=int,
+    action="store",
+)
+parser.add_argument(
+    "--profile",
+    help="Profile the game loop: 'sample' samples the call stack at a fixed interval, 'cprofile' traces only next_move calls",
+    choices=PROFILE_MODES,
+    action="store",
+)
+parser.add_argument(
+    "--profile-output",
+    help="File to write collapsed stacks to for flamegraphs. Default: profile-<mode>.folded",
+    action="store",
+)
+parser.add_argument(
+    "--profile-interval",
+    help="Sampling interval in milliseconds for --profile=sample",
+    default=5,
+    type=float,
+    action="store",
+)
+parser.add_argument(
+    "--shared-board",
+    help="Share board state with other bots on this host through shared memory, so only one of them fetches it from the server",
+    action="store_true",
+)
+parser.add_argument(
+    "--team-port",
+    help="Split diamonds with teammates on this host: the first bot hosts a coordinator on this local port, the others connect to it",
+    type=int,
+    action="store",
+)
+parser.add_argument(
+    "--offload",
+    help="Plan moves in a separate worker process, overlapping the network requests, and fall back to a greedy move when it is late",
+    action="store_true",
+)
+parser.add_argument(
+    "--offload-deadline",
+    help="Seconds to wait for the worker's move with --offload",
+    default=0.5,
+    type=float,
+    action="store",
+)
+parser.add_argument(
+    "--move-deadline",
+    help="Seconds next_move may take before the bot falls back to its last plan. 0 disables the watchdog, as does --profile so the logic's own stacks are profiled",
+    default=0.5,
+    type=float,
+    action="store",
+)
+parser.add_argument(
+    "--no-token-cache",
+    help="Always recover or register the bot instead of reusing its cached token",
+    action="store_true",
+)
+parser.add_argument(
+    "--log-level",
+    help="Lowest level to log. DEBUG logs every request and rejected move. Default: INFO",
+    choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+    default="INFO",
+    action="store",
+)
+parser.add_argument(
+    "--log-sample",
+    help="Log only one in this many of each per-tick message",
+    default=10,
+    type=int,
+    action="store",
+)
 group = parser.add_argument_group("API connection")
 group.add_argument(
     "--host", action="store", default=BASE_URL, help="Default: {}".format(BASE_URL)
 )
+group.add_argument(
+    "--max-rps",
+    help="Requests per second all bots of this process may send together, moves first. 0 means no limit",
+    default=0,
+    type=float,
+    action="store",
+)
 args = parser.parse_args()
 
-time_factor = int(args.time_factor)
-api = Api(args.host)
-bot_handler = BotHandler(api)
-board_handler = BoardHandler(api)
+from colorama import Back, Fore, Style, init
+from game.log import add_secret, set_bot, setup_logging
 
-###############################################################################
-#
-# (Try and) Register a new bot if we have not supplied a token
-#
-###############################################################################
-if not args.token:
-    recovered_token = bot_handler.recover(args.email, args.password)
-    args.token = recovered_token
-    if not recovered_token:
-        bot = bot_handler.register(args.name, args.email, args.password, args.team)
-        if bot:
-            print("")
-            print(
-                Style.BRIGHT
-                + "Bot registered. Token: {}".format(bot.id)
-                + Style.RESET_ALL
-            )
-            args.token = bot.id
-        else:
-            print(
-                Fore.RED
-                + Style.BRIGHT
-                + "Error: "
-                + Style.RESET_ALL
-                + "Unable to register bot"
-            )
-            exit(1)
+init()
+setup_logging(args.log_level, args.log_sample)
+add_secret(args.password)
 
-###############################################################################
-#
-# Setup bot using token and play game
-#
-###############################################################################
-bot = bot_handler.get_my_info(args.token)
-logic_controller = args.logic
-if logic_controller not in CONTROLLERS:
+try:
+    logic_class = resolve(args.logic)
+except KeyError:
     print(
         Fore.RED
         + Style.BRIGHT
@@ -119,104 +170,248 @@ if logic_controller not in CONTROLLERS:
     )
     exit(1)
 
-if not bot.name:
-    print(Fore.RED + Style.BRIGHT + "Error: " + Style.RESET_ALL + "Bot does not exist")
-    exit(1)
-print(Fore.BLUE + Style.BRIGHT + "Welcome back, " + Style.RESET_ALL + bot.name)
-
-# Setup variables
-logic_class = CONTROLLERS[logic_controller]
-bot_logic: BaseLogic = logic_class()
-
-###############################################################################
-#
-# Find a board to join
-#
-###############################################################################
-current_board_id = int(args.board)
 
-if not current_board_id:
-    # List active boards to find one we can join if we haven't specified one
-    boards = board_handler.list_boards()
-    for board in boards:
-        # Try to join board
-        board_joined = False
-        current_board_id = board.id
-        success = bot_handler.join(bot.id, current_board_id)
-        if success:
-            board_joined = True
-            break
-
-    if not board_joined:
-        exit()
-else:
-    # Try to join the one we specified
-    success = bot_handler.join(bot.id, current_board_id)
-    if not success:
-        current_board_id = None
-
-# Did we manage to join a board?
-if not current_board_id:
+board_ids = (
+    [int(board_id) for board_id in args.boards.split(",") if board_id.strip()]
+    if args.boards
+    else [int(args.board)]
+)
+if len(board_ids) > 1 and (args.token or args.profile or args.team_port):
     print(
         Fore.RED
         + Style.BRIGHT
         + "Error: "
         + Style.RESET_ALL
-        + "Unable to find any boards to join"
+        + "--boards needs a bot per board and cannot be used with --token, --profile or --team-port"
     )
     exit(1)
 
+from game.api import Api
+from game.board_handler import BoardHandler
+from game.bot_handler import BotHandler
+from game.metrics import metrics
+from game.models import Bot
+from game.offload import OffloadedLogic
+from game.profiling import create_profiler, write_collapsed
+from game.ratelimit import RequestScheduler
+from game.replay import ReplayWriter
+from game.runner import BoardLoop, Scheduler, board_identity
+from game.snapshot import BoardSnapshots
+from game.spawns import SpawnModel
+from game.team import join_team
+from game.token_cache import TokenCache
+from game.watchdog import Watchdog
+from game.util import *
+from game.logic.base import BaseLogic
+
+time_factor = int(args.time_factor)
+# One connection pool, circuit breaker and request budget for every board played
+limiter = RequestScheduler(args.max_rps) if args.max_rps > 0 else None
+api = Api(args.host, pool_size=max(10, len(board_ids)), limiter=limiter)
+if args.metrics_port:
+    metrics.serve(args.metrics_port)
+bot_handler = BotHandler(api)
+board_handler = BoardHandler(api)
+token_cache = TokenCache() if args.email and not args.no_token_cache else None
+
+
 ###############################################################################
 #
-# Prepare state from current board
+# Reuse a cached token, validating it while already joining the board
 #
 ###############################################################################
-board = board_handler.get_board(current_board_id)
-move_delay = board.minimum_delay_between_moves / 1000
+def sign_in(
+    token: Optional[str], name: str, email: str, board_id: int
+) -> Tuple[Bot, Optional[bool]]:
+    """
+    Find the bot of token, or of a cached, recovered or newly registered token
+    :return: the bot, and whether it already joined board_id (None if it did not try)
+    """
+    bot = None
+    joined = None
+
+    if not token and token_cache:
+        cached_token = token_cache.get(email, args.host)
+        if cached_token:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                info = pool.submit(bot_handler.get_my_info, cached_token)
+                join = (
+                    pool.submit(bot_handler.join, cached_token, board_id)
+                    if board_id
+                    else None
+                )
+            bot = info.result()
+            if bot and bot.name:
+                token = cached_token
+                joined = join.result() if join else None
+            else:
+                bot = None
+                token_cache.remove(email, args.host)
+
+    ###########################################################################
+    #
+    # (Try and) Register a new bot if we have not supplied a token
+    #
+    ###########################################################################
+    if not token:
+        recovered_token = bot_handler.recover(email, args.password)
+        token = recovered_token
+        if not recovered_token:
+            bot = bot_handler.register(name, email, args.password, args.team)
+            if bot:
+                print("")
+                print(
+                    Style.BRIGHT
+                    + "Bot registered. Token: {}".format(bot.id)
+                    + Style.RESET_ALL
+                )
+                token = bot.id
+            else:
+                print(
+                    Fore.RED
+                    + Style.BRIGHT
+                    + "Error: "
+                    + Style.RESET_ALL
+                    + "Unable to register bot"
+                )
+                exit(1)
+        if token_cache:
+            token_cache.put(email, args.host, token)
+
+    ###########################################################################
+    #
+    # Setup bot using token
+    #
+    ###########################################################################
+    add_secret(token)
+    if not bot:
+        bot = bot_handler.get_my_info(token)
+
+    if not bot or not bot.name:
+        print(Fore.RED + Style.BRIGHT + "Error: " + Style.RESET_ALL + "Bot does not exist")
+        exit(1)
+    print(Fore.BLUE + Style.BRIGHT + "Welcome back, " + Style.RESET_ALL + bot.name)
+    return bot, joined
+
 
 ###############################################################################
 #
-# Game play loop
+# Find a board to join
 #
 ###############################################################################
-while True:
-    # Find our info among the bots on the board
-    board_bot = board.get_bot(bot)
-    if not board_bot:
-        # Managed to get game over
-        break
-
-    # Calculate next move
-    delta_x, delta_y = bot_logic.next_move(board_bot, board)
-    # delta_x, delta_y = (1, 0)
-    if not board.is_valid_move(board_bot.position, delta_x, delta_y):
+def join_board(bot: Bot, board_id: int, joined: Optional[bool]) -> int:
+    if not board_id:
+        # List active boards to find one we can join if we haven't specified one
+        boards = board_handler.list_boards()
+        board_joined = False
+        for board in boards:
+            # Try to join board
+            board_id = board.id
+            success = bot_handler.join(bot.id, board_id)
+            if success:
+                board_joined = True
+                break
+
+        if not board_joined:
+            exit()
+    else:
+        # Try to join the one we specified, unless that already happened with the cached token
+        success = joined if joined is not None else bot_handler.join(bot.id, board_id)
+        if not success:
+            board_id = None
+
+    # Did we manage to join a board?
+    if not board_id:
         print(
-            Fore.YELLOW + Style.BRIGHT + "Warn:" + Style.RESET_ALL,
-            "Invalid move will be ignored."
-            + f" Your move: ({delta_x}, {delta_y}). Your position: ({board_bot.position.x}, {board_bot.position.y})",
+            Fore.RED
+            + Style.BRIGHT
+            + "Error: "
+            + Style.RESET_ALL
+            + "Unable to find any boards to join"
+        )
+        exit(1)
+    return board_id
+
+
+###############################################################################
+#
+# Prepare a game loop per board
+#
+###############################################################################
+profiler = (
+    create_profiler(args.profile, args.profile_interval / 1000) if args.profile else None
+)
+# Diamond spawns learned in earlier games, shared by the bots of this process
+spawns = SpawnModel.load()
+loops = []
+for board_id in board_ids:
+    if len(board_ids) > 1:
+        name, email = board_identity(args.name, args.email, board_id)
+    else:
+        name, email = args.name, args.email
+    bot, joined = sign_in(args.token, name, email, board_id)
+    set_bot(bot.name)
+    board_id = join_board(bot, board_id, joined)
+
+    if args.offload:
+        bot_logic: BaseLogic = OffloadedLogic(args.logic, args.offload_deadline, spawns.path)
+    else:
+        bot_logic = logic_class()
+        bot_logic.spawns = spawns
+    if args.move_deadline > 0 and not profiler and not args.offload:
+        # The offloaded logic bounds its own wait
+        bot_logic = Watchdog(bot_logic, args.move_deadline)
+
+    loop_board_handler = BoardHandler(api)
+    if args.shared_board:
+        loop_board_handler.snapshots = BoardSnapshots(args.host, board_id)
+    record = args.record
+    if record and len(board_ids) > 1:
+        record = "{}.{}".format(record, board_id)
+    loops.append(
+        BoardLoop(
+            bot,
+            board_id,
+            bot_logic,
+            loop_board_handler,
+            bot_handler,
+            recorder=ReplayWriter(record) if record else None,
+            team=join_team(args.team_port) if args.team_port and bot_logic.team_aware else None,
+            profiler=profiler,
+            server_timing=args.server_timing,
+            time_factor=time_factor,
         )
-        sleep(1)
-        continue
+    )
+# Each loop tags its own messages, the rest of main is about every board
+set_bot(loops[0].bot.name if len(loops) == 1 else None)
+
+###############################################################################
+#
+# Game play loop
+#
+###############################################################################
+METRICS_WRITE_INTERVAL = 5
+metrics_written_at = monotonic()
 
-    try:
-        # Try to perform move
-        board = bot_handler.move(bot.id, current_board_id, delta_x, delta_y)
-    except Exception as e:
-        break
 
-    if not board:
-        # Read new board state
-        board = board_handler.get_board(current_board_id)
+def write_metrics() -> None:
+    global metrics_written_at
+    if args.metrics_file and monotonic() - metrics_written_at >= METRICS_WRITE_INTERVAL:
+        metrics.write(args.metrics_file)
+        metrics_written_at = monotonic()
 
-    # Get new state
-    board_bot = board.get_bot(bot)
-    if not board_bot:
-        # Managed to get game over after move
-        break
 
-    # Don't spam the board more than it allows!
-    # sleep(move_delay * time_factor)
-    sleep(1)
+if profiler:
+    profiler.start()
+try:
+    Scheduler().run(loops, on_step=write_metrics)
+finally:
+    # Close every loop even when the run is interrupted, so the replay
+    # segments get their footers and the worker processes stop
+    for loop in loops:
+        loop.close()
+    # Keep the diamond spawns seen this game for the next one
+    spawns.save()
 
 
 ###############################################################################
@@ -224,4 +419,25 @@ while True:
 # Game over!
 #
 ###############################################################################
+if args.metrics_file:
+    metrics.write(args.metrics_file)
+if profiler:
+    profiler.stop()
+    profile_output = args.profile_output or "profile-{}.folded".format(args.profile)
+    write_collapsed(profiler.collapsed(), profile_output)
+    print("Profile written to {}".format(profile_output))
+metrics.shutdown()
 print(Fore.BLUE + Style.BRIGHT + "Game over!" + Style.RESET_ALL)
+for loop in loops:
+    if isinstance(loop.logic, Watchdog) and loop.logic.fallback_ticks:
+        print(
+            "Ticks decided by the watchdog fallback for {}: {}".format(
+                loop.bot.name, loop.logic.fallback_ticks
+            )
+        )
+for line in metrics.summary():
+    print(line)
+if limiter:
+    print("Request queue delay per bot:")
+    for line in limiter.queue_delays.summary():
+        print(line)
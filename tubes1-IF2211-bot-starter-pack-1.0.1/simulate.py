@@ -0,0 +1,124 @@
+import argparse
+import sys
+from functools import partial
+from time import perf_counter
+
+from game.logic.registry import controller_names, resolve
+from game.profiling import PROFILE_MODES, create_profiler, write_collapsed
+from game.simulator import Simulator, SimulatorConfig
+from game.team import TeamCoordinator
+
+parser = argparse.ArgumentParser(description="Play local games between logic controllers")
+parser.add_argument(
+    "--logic",
+    help="Logic controllers to put on the board. Valid options are: {}".format(
+        ", ".join(controller_names())
+    ),
+    nargs="+",
+    default=["tw", "ra", "cep", "vtd"],
+)
+parser.add_argument("--games", help="Number of games to play", default=10, type=int)
+parser.add_argument("--seed", help="Seed of the first game", default=0, type=int)
+parser.add_argument("--seconds", help="Length of a game", default=60, type=int)
+parser.add_argument("--width", default=15, type=int)
+parser.add_argument("--height", default=15, type=int)
+parser.add_argument(
+    "--team",
+    help="Coordinate diamond targets between the first N bots, like bots sharing --team-port",
+    default=0,
+    type=int,
+)
+parser.add_argument(
+    "--vectorized",
+    help="Play all games in lockstep with the NumPy simulator and the vectorized tw policy",
+    action="store_true",
+)
+parser.add_argument(
+    "--profile",
+    help="Profile the games: 'sample' samples the call stack at a fixed interval, 'cprofile' traces only next_move calls",
+    choices=PROFILE_MODES,
+    action="store",
+)
+parser.add_argument(
+    "--profile-output",
+    help="File to write collapsed stacks to for flamegraphs. Default: profile-<mode>.folded",
+    action="store",
+)
+parser.add_argument(
+    "--profile-interval",
+    help="Sampling interval in milliseconds for --profile=sample",
+    default=5,
+    type=float,
+    action="store",
+)
+args = parser.parse_args()
+
+logic_classes = {}
+for name in args.logic:
+    try:
+        logic_classes[name] = resolve(name)
+    except KeyError:
+        print("Invalid logic controller: {}".format(name))
+        sys.exit(1)
+
+config = SimulatorConfig(width=args.width, height=args.height, seconds=args.seconds)
+
+if args.vectorized:
+    if set(args.logic) != {"tw"}:
+        print("Only the tw policy is vectorized, use e.g. --logic tw tw tw tw")
+        sys.exit(1)
+    from game.logic.params import load_params
+    from game.vecsim import VectorSimulator
+
+    simulator = VectorSimulator(
+        args.games, len(args.logic), config, load_params("tw"), seed=args.seed
+    )
+    start = perf_counter()
+    scores = simulator.run()
+    elapsed = perf_counter() - start
+    bot_steps = args.games * len(args.logic) * (config.seconds * 1000 // config.tick_milliseconds)
+    print("Average score per bot: {:.2f}".format(scores.mean()))
+    print(
+        "{} bot-steps in {:.2f}s ({:.0f} bot-steps/s)".format(
+            bot_steps, elapsed, bot_steps / elapsed
+        )
+    )
+    sys.exit(0)
+
+profiler = (
+    create_profiler(args.profile, args.profile_interval / 1000) if args.profile else None
+)
+if profiler:
+    profiler.start()
+
+totals = {}
+for game in range(args.games):
+    logics = []
+    for index, name in enumerate(args.logic):
+        logic = logic_classes[name]()
+        if profiler:
+            # Shadow the method on the instance so the logic keeps its attributes
+            logic.next_move = partial(profiler.call, logic.next_move)
+        logics.append(("{}-{}".format(name, index), logic))
+    team = (
+        TeamCoordinator(name for name, logic in logics[: args.team] if logic.team_aware)
+        if args.team
+        else None
+    )
+    simulator = Simulator(logics, config, seed=args.seed + game, team=team)
+    scores = simulator.run()
+    print("Game {}: {}".format(game + 1, scores))
+    for name, count in simulator.errors().items():
+        print("  {} raised {} exceptions and lost those moves".format(name, count))
+    for name, score in scores.items():
+        totals[name] = totals.get(name, 0) + score
+
+print("Average score per game:")
+for name, total in sorted(totals.items(), key=lambda item: -item[1]):
+    print("  {:<12} {:.2f}".format(name, total / args.games))
+
+if profiler:
+    profiler.stop()
+    profile_output = args.profile_output or "profile-{}.folded".format(args.profile)
+    write_collapsed(profiler.collapsed(), profile_output)
+    print("Profile written to {}".format(profile_output))
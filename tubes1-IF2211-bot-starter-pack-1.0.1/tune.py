@@ -0,0 +1,165 @@
+import argparse
+import os
+import random
+from dataclasses import asdict, fields
+from multiprocessing import Pool
+from statistics import mean, pstdev
+
+from game.logic.registry import controller_names, resolve
+from game.logic.params import LOGIC_PARAMS, PARAMS_FILE, load_params, params_from_dict, save_params
+from game.simulator import Simulator, SimulatorConfig
+
+# Bounds of every tunable parameter. Nested dict entries use "field.key".
+SEARCH_SPACE = {
+    "tw": {
+        "base_threshold": (2000, 20000),
+        "diamond_multiplier": (0.0, 1.0),
+        "safety_factor": (1.0, 2.0),
+        "safety_factor_per_diamond": (0.0, 0.3),
+        "early_game_ratio": (0.5, 0.9),
+        "end_game_ratio": (0.1, 0.5),
+        "contested_margin": (0, 4),
+        "tackle_margin": (1.0, 10.0),
+        "endgame_steps": (0, 30),
+    },
+    "ra": {
+        "ambang_batas.1": (0.2, 1.0),
+        "ambang_batas.2": (0.2, 1.0),
+        "ambang_batas.3": (0.2, 1.0),
+        "ambang_batas.4": (0.2, 1.0),
+        "ambang_batas_default": (0.2, 1.0),
+        "risiko_darurat": (0.4, 1.0),
+        "faktor_portal": (0.5, 1.0),
+    },
+}
+
+
+def flatten(params) -> dict:
+    flat = {}
+    for key, value in asdict(params).items():
+        if isinstance(value, dict):
+            for inner_key, inner_value in value.items():
+                flat["{}.{}".format(key, inner_key)] = inner_value
+        else:
+            flat[key] = value
+    return flat
+
+
+def unflatten(logic: str, flat: dict):
+    data = {}
+    for key, value in flat.items():
+        if "." in key:
+            key, inner_key = key.split(".", 1)
+            data.setdefault(key, {})[int(inner_key)] = value
+        else:
+            data[key] = value
+    return params_from_dict(logic, data)
+
+
+def evaluate(job) -> float:
+    """Average score of the tuned logic over a fixed set of seeded games"""
+    logic, flat, opponents, seeds, seconds = job
+    params = unflatten(logic, flat)
+    config = SimulatorConfig(seconds=seconds)
+    scores = []
+    for seed in seeds:
+        logics = [("tuned", resolve(logic)(params))]
+        logics += [
+            ("{}-{}".format(name, index), resolve(name)())
+            for index, name in enumerate(opponents)
+        ]
+        # A crashing candidate must stop the search, not just score low
+        scores.append(Simulator(logics, config, seed=seed, strict=True).run()["tuned"])
+    return mean(scores)
+
+
+def integer_keys(logic: str) -> set:
+    """Parameters of the logic declared as int"""
+    return {f.name for f in fields(LOGIC_PARAMS[logic]) if f.type is int}
+
+
+def sample(rng: random.Random, space: dict, center: dict, spread: dict, integers: set = frozenset()) -> dict:
+    candidate = {}
+    for key, (low, high) in space.items():
+        value = min(high, max(low, rng.gauss(center[key], spread[key])))
+        candidate[key] = round(value) if key in integers else value
+    return candidate
+
+
+parser = argparse.ArgumentParser(
+    description="Search tw/ra parameters in the local simulator"
+)
+parser.add_argument("--logic", choices=list(SEARCH_SPACE), default="tw")
+parser.add_argument(
+    "--opponents",
+    help="Logic controllers to play against",
+    nargs="+",
+    default=["cep", "vtd", "ra"],
+)
+parser.add_argument("--rounds", help="Search rounds", default=5, type=int)
+parser.add_argument("--candidates", help="Candidates per round", default=32, type=int)
+parser.add_argument("--games", help="Games per candidate", default=20, type=int)
+parser.add_argument("--seconds", help="Length of a game", default=60, type=int)
+parser.add_argument("--seed", default=0, type=int)
+parser.add_argument("--workers", default=os.cpu_count(), type=int)
+parser.add_argument(
+    "--output", help="Parameter file to update", default=PARAMS_FILE, action="store"
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for name in args.opponents:
+        if name not in controller_names():
+            parser.error("Invalid logic controller: {}".format(name))
+
+    rng = random.Random(args.seed)
+    space = SEARCH_SPACE[args.logic]
+    # Every candidate plays the same games so scores are directly comparable
+    seeds = [args.seed * 100000 + game for game in range(args.games)]
+
+    current = flatten(load_params(args.logic, args.output))
+    center = {key: current[key] for key in space}
+    spread = {key: (high - low) / 2 for key, (low, high) in space.items()}
+    elite_count = max(2, args.candidates // 4)
+    integers = integer_keys(args.logic)
+
+    with Pool(args.workers) as pool:
+        baseline = pool.apply(
+            evaluate, ((args.logic, current, args.opponents, seeds, args.seconds),)
+        )
+        print("Current parameters: {:.2f}".format(baseline))
+        best, best_score = current, baseline
+
+        for search_round in range(args.rounds):
+            candidates = [
+                dict(current, **sample(rng, space, center, spread, integers))
+                for _ in range(args.candidates)
+            ]
+            scores = pool.map(
+                evaluate,
+                [
+                    (args.logic, candidate, args.opponents, seeds, args.seconds)
+                    for candidate in candidates
+                ],
+            )
+            ranked = sorted(zip(scores, range(len(candidates))), reverse=True)
+            if ranked[0][0] > best_score:
+                best_score, best = ranked[0][0], candidates[ranked[0][1]]
+
+            # Refit the sampling distribution to the elite candidates
+            elites = [candidates[index] for _, index in ranked[:elite_count]]
+            for key, (low, high) in space.items():
+                values = [elite[key] for elite in elites]
+                center[key] = mean(values)
+                spread[key] = max(pstdev(values), (high - low) * 0.01)
+            print(
+                "Round {}: best {:.2f}, round best {:.2f}".format(
+                    search_round + 1, best_score, ranked[0][0]
+                )
+            )
+
+    if best_score > baseline:
+        save_params(args.logic, unflatten(args.logic, best), args.output)
+        print("Saved {} parameters to {}: {}".format(args.logic, args.output, best))
+    else:
+        print("No candidate beat the current parameters")